@@ -1,10 +1,31 @@
+import os
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+from utils.metrics import stage
+
+# Reverse proxies in front of the app that append to X-Forwarded-For. Only that
+# many right-most hops are trusted; anything further left is client-supplied.
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 0))
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """jsonify with its encoding time recorded as the 'serialize' stage."""
+
+    def dumps(self, obj, **kwargs):
+        with stage('serialize'):
+            return super().dumps(obj, **kwargs)
+
 
 def create_app():
     """Create and configure an instance of the Flask application."""
     app = Flask(__name__)
+    app.json = TimedJSONProvider(app)
     CORS(app)
+    if TRUSTED_PROXY_HOPS > 0:
+        # request.remote_addr becomes the address our own proxy saw, used for rate limits and budgets
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
 
     with app.app_context():
         # Import parts of our application
@@ -1,29 +1,352 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context, g
+from werkzeug.wsgi import wrap_file
+import json
+import time
+import hashlib
+import threading
 import traceback
-from gemini_service import get_health_assistant
 
 app = Blueprint('health_routes', __name__)
 
 from . import services
+from . import warmup
 import traceback
 import sys
 import os
 
 
-# Add parent directory to path to import groq_service
+# Add parent directory to path to import the service modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from groq_service import get_health_assistant
+from llm_router import get_health_assistant, INSIGHT_BATCH_MAX
 from patient_chat_service import get_patient_service
+from utils import metrics as telemetry
+from utils.job_queue import FINISHED
+from utils.admission import get_admission_controller, Rejected
+from utils import token_ledger
+from utils import deadline
+from utils.profiling import get_profiler
+from utils.logger import get_logger
+
+logger = get_logger('routes')
+
+
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.before_request
+def _start_profile():
+    """Profile a sampled fraction of requests, or any carrying the admin X-Profile-Token."""
+    profiler = get_profiler()
+    if not profiler.enabled or request.endpoint is None or request.endpoint.rsplit('.', 1)[-1] in PROFILE_EXEMPT:
+        return None
+    trigger = profiler.trigger_for(request.headers.get('X-Profile-Token'))
+    if trigger is not None:
+        g.profile = profiler.start(request.url_rule.rule, request.method, trigger)
+    return None
+
+
+# Admission class per view; anything unlisted is treated as cheap static data
+ROUTE_CLASS = {
+    'analyze_report': 'vlm',
+    'process_analyzer_report': 'vlm',
+    'health_assistant_chat': 'llm',
+    'patient_chat_reply': 'llm',
+    'get_disease_insight': 'llm',
+    'get_disease_insight_batch': 'llm',
+}
+
+
+def _client_id():
+    # Never the raw X-Forwarded-For: clients can set it. ProxyFix (TRUSTED_PROXY_HOPS) resolves it safely.
+    return request.remote_addr or 'unknown'
+
+
+# Views outside admission control: scrapes, and long-lived streams with their own subscriber cap
+ADMISSION_EXEMPT = {'get_metrics', 'stream_disease_trends'}
+# Views never profiled: the profiler's own endpoints, and streams that stay open for minutes
+PROFILE_EXEMPT = {'list_profiles', 'get_profile', 'stream_disease_trends'}
+
+
+@app.before_request
+def _start_deadline():
+    """
+    Bind the request's time budget: its route class default, shortened by an
+    X-Request-Timeout header (seconds). LLM and VLM requests are also watched
+    for client disconnects, which cancel the remaining upstream work.
+    """
+    if request.method == 'OPTIONS' or request.endpoint is None:
+        return None
+    view = request.endpoint.rsplit('.', 1)[-1]
+    if view in ADMISSION_EXEMPT:
+        return None
+    route_class = ROUTE_CLASS.get(view, 'static')
+    budget = deadline.REQUEST_DEADLINES.get(route_class, 0)
+    requested = request.headers.get('X-Request-Timeout', type=float)
+    if requested is not None and requested > 0:
+        budget = min(budget, requested) if budget > 0 else requested
+    if budget <= 0:
+        return None
+    g.deadline_token = deadline.bind(budget)
+    sock = request.environ.get('gunicorn.socket') or request.environ.get('werkzeug.socket')
+    if route_class != 'static' and sock is not None:
+        deadline.get_disconnect_watcher().register(sock, deadline.current())
+        g.deadline_socket = sock
+    return None
+
+
+@app.before_request
+def _admit():
+    """Per-class concurrency limit with a bounded wait queue, plus per-client rate limits."""
+    if request.method == 'OPTIONS' or request.endpoint is None:
+        return None
+    view = request.endpoint.rsplit('.', 1)[-1]
+    if view in ADMISSION_EXEMPT:
+        return None
+    route_class = ROUTE_CLASS.get(view, 'static')
+    client = _client_id()
+    if route_class != 'static':
+        rejected = _bind_usage(view, client)
+        if rejected is not None:
+            return rejected
+    try:
+        g.admission_ticket = get_admission_controller().admit(route_class, client, _request_cost(view))
+    except Rejected as e:
+        return _too_many("Server busy, please retry shortly", e.reason, e.retry_after)
+    return None
+
+
+def _request_cost(view):
+    """Rate-limit tokens a request uses: one per insight in a batch, otherwise one."""
+    if view != 'get_disease_insight_batch':
+        return 1
+    data = request.get_json(silent=True) if request.is_json else None
+    items = data.get('items') if isinstance(data, dict) else None
+    # Oversized batches are refused by the view; charge them once
+    return len(items) if isinstance(items, list) and 0 < len(items) <= INSIGHT_BATCH_MAX else 1
+
+
+def _too_many(message, reason, retry_after):
+    response = jsonify({"error": message, "reason": reason})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def _bind_usage(view, client):
+    """Attribute this request's LLM tokens and refuse it if the client or conversation is over budget."""
+    data = request.get_json(silent=True) if request.is_json else None
+    conversation = data.get('conversation_id') if isinstance(data, dict) else None
+    g.usage_token = token_ledger.bind(client=client, route=view, conversation=conversation)
+    verdict, retry_after = token_ledger.get_token_ledger().check()
+    if verdict == token_ledger.THROTTLE:
+        return _too_many("Token budget exhausted, please retry later", 'token_budget', retry_after)
+    return None
+
+
+@app.teardown_request
+def _finish_deadline(exc):
+    sock = g.pop('deadline_socket', None)
+    if sock is not None:
+        deadline.get_disconnect_watcher().unregister(sock)
+    token = g.pop('deadline_token', None)
+    if token is not None:
+        deadline.unbind(token)
+
+
+def _out_of_time(reason, body):
+    """504 for work stopped by the request deadline, or because the client left."""
+    if reason == deadline.DeadlineExceeded.reason:
+        deadline.DEADLINE_OUTCOMES.inc(reason)
+    return jsonify(body), 504
+
+
+@app.teardown_request
+def _finish_profile(exc):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        get_profiler().finish(profile)
+
+
+@app.teardown_request
+def _release_admission(exc):
+    ticket = g.pop('admission_ticket', None)
+    if ticket is not None:
+        get_admission_controller().release(ticket)
+    usage_token = g.pop('usage_token', None)
+    if usage_token is not None:
+        token_ledger.unbind(usage_token)
+
+
+@app.after_request
+def _record_latency(response):
+    start = getattr(g, 'request_start', None)
+    if start is not None and request.url_rule is not None:
+        elapsed = time.perf_counter() - start
+        telemetry.HTTP_LATENCY.observe(elapsed, request.url_rule.rule, request.method, response.status_code)
+        warmup.note_request(elapsed)
+    profile = g.get('profile')
+    if profile is not None:
+        profile.status = response.status_code
+        response.headers['X-Profile-Id'] = profile.id
+    return response
+
+
+def _record_upload(file):
+    """Count uploaded bytes without reading the stream twice."""
+    try:
+        position = file.stream.tell()
+        file.stream.seek(0, os.SEEK_END)
+        size = file.stream.tell()
+        file.stream.seek(position)
+    except Exception:
+        size = request.content_length or 0
+    telemetry.UPLOAD_BYTES.observe(size, request.url_rule.rule)
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of route, LLM and cache metrics."""
+    return Response(telemetry.registry.render(), mimetype='text/plain; version=0.0.4')
+
+def _admin_access_error():
+    """None if the request carries the admin X-Profile-Token (profiles, token usage); otherwise the error response."""
+    profiler = get_profiler()
+    if not profiler.token:
+        return jsonify({"error": "Admin endpoints are disabled (set PROFILE_TOKEN)"}), 404
+    if not profiler.authorized(request.headers.get('X-Profile-Token')):
+        return jsonify({"error": "Invalid or missing X-Profile-Token"}), 403
+    return None
+
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """Recent request profiles (newest first) with per-stage timings."""
+    error = _admin_access_error()
+    if error is not None:
+        return error
+    return jsonify({'profiles': get_profiler().list()})
+
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """One profile as collapsed stacks for flamegraph.pl / speedscope, or its summary with ?format=json."""
+    error = _admin_access_error()
+    if error is not None:
+        return error
+    profiler = get_profiler()
+    if request.args.get('format') == 'json':
+        summary = profiler.get(profile_id)
+        if summary is None:
+            return jsonify({"error": "Profile not found"}), 404
+        return jsonify(summary)
+    folded = profiler.folded(profile_id)
+    if folded is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return Response(folded, mimetype='text/plain')
+
 
 @app.route('/api/disease-trends', methods=['GET'])
 def get_disease_trends():
     try:
-        trends = services.get_trends_data()
-        return jsonify(trends)
+        snapshot = services.get_trends_snapshot()
+        if snapshot is None:
+            return jsonify(services.get_trends_data())
+        # Serve the shared pre-serialised bytes; no per-request parse or encode.
+        # Passed as the file itself, gunicorn sendfile()s it without copying it
+        # into Python (its write() only takes bytes, so not the mapped memoryview).
+        body = snapshot.open_body()
+        if body is None:
+            response = Response(snapshot.to_bytes(), mimetype='application/json')
+        else:
+            response = Response(wrap_file(request.environ, body), mimetype='application/json', direct_passthrough=True)
+            response.content_length = len(snapshot.body)
+        response.headers['X-Snapshot-Version'] = str(snapshot.version)
+        return response
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": f"An error occurred: {e}"}), 500
 
+@app.route('/api/disease-trends/changes', methods=['GET'])
+def get_disease_trends_changes():
+    """Diseases added, changed or removed since trends version `since` (see X-Snapshot-Version)."""
+    since = request.args.get('since', type=int)
+    if since is None or since < 0:
+        return jsonify({"error": "since must be a non-negative snapshot version"}), 400
+    delta = services.get_trends_changes(since)
+    if delta is None:
+        return jsonify({"error": "Trends data unavailable"}), 503
+    response = jsonify(delta)
+    response.headers['X-Snapshot-Version'] = str(delta['version'])
+    return response
+
+
+_trend_streams = threading.BoundedSemaphore(services.TRENDS_STREAM_MAX_SUBSCRIBERS)
+
+
+@app.route('/api/disease-trends/stream', methods=['GET'])
+def stream_disease_trends():
+    """
+    Server-sent events: a `trends` event carrying the new version whenever the
+    snapshot is republished, then fetch /api/disease-trends/changes?since=<old>.
+    Resumes from Last-Event-ID (or ?since=) so a reconnect never misses a version.
+    """
+    if not _trend_streams.acquire(blocking=False):
+        response = jsonify({"error": "Too many open streams, poll /api/disease-trends/changes instead"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(int(services.TRENDS_STREAM_HEARTBEAT))
+        return response
+    last_seen = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', type=int)
+
+    def generate():
+        seen = last_seen
+        stream_deadline = time.monotonic() + services.TRENDS_STREAM_MAX_SECONDS
+        yield f"retry: {int(services.TRENDS_STREAM_HEARTBEAT * 1000)}\n\n"
+        while time.monotonic() < stream_deadline:
+            snapshot = services.wait_for_trends(seen, services.TRENDS_STREAM_HEARTBEAT)
+            if snapshot is not None and snapshot.version != seen:
+                payload = json.dumps({'version': snapshot.version, 'since': seen})
+                yield f"id: {snapshot.version}\nevent: trends\ndata: {payload}\n\n"
+                seen = snapshot.version
+            else:
+                yield ": keep-alive\n\n"
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    # Released when the server closes the response, even if the client left before the first event
+    response.call_on_close(_trend_streams.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/api/disease-narratives', methods=['GET'])
+def get_disease_narratives():
+    """Precomputed summary and Patient/Doctor insight per tracked disease, served from the narrative store."""
+    try:
+        return jsonify(services.get_disease_narratives())
+    except Exception as e:
+        logger.error("Narratives unavailable", extra={'error': str(e)})
+        return jsonify({"error": "Data unavailable"}), 500
+
+
+@app.route('/api/disease-narratives/<disease_id>', methods=['GET'])
+def get_disease_narrative(disease_id):
+    """One disease's narrative; 202 with Retry-After while it has not been generated yet."""
+    try:
+        result = services.get_disease_narratives(disease_id)
+    except Exception as e:
+        logger.error("Narratives unavailable", extra={'error': str(e)})
+        return jsonify({"error": "Data unavailable"}), 500
+    if result['narratives']:
+        return jsonify(result['narratives'][0])
+    if not result['pending']:
+        return jsonify({"error": "Unknown disease"}), 404
+    response = jsonify({"id": disease_id, "status": "pending"})
+    response.status_code = 202
+    response.headers['Retry-After'] = '30'
+    return response
+
 @app.route('/api/analyze-report', methods=['POST'])
 def analyze_report():
     try:
@@ -36,14 +359,19 @@ def analyze_report():
             return jsonify({"error": "No file selected for uploading"}), 400
 
         if file:
-            # New Step: Direct VLM Analysis (OCR + Extraction in one pass)
-            analysis_results = services.analyze_with_vlm(file.stream)
+            _record_upload(file)
+
+            # Direct VLM Analysis (OCR + Extraction in one pass), or local OCR first in tiered mode
+            mode = request.args.get('mode') or request.form.get('mode')
+            analysis_results = services.extract_report(file.stream, mode=mode)
             
             return jsonify({
-                "raw_text": "Extracted via VLM", # VLM combines text and analysis
+                "raw_text": analysis_results.pop('raw_text', "Extracted via VLM"), # VLM combines text and analysis
                 "analysis": analysis_results
             })
             
+    except deadline.DeadlineExceeded as e:
+        return _out_of_time(e.reason, {"error": str(e), "reason": e.reason})
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": f"An error occurred during analysis: {e}"}), 500
@@ -60,25 +388,130 @@ def process_analyzer_report():
             return jsonify({"error": "No file selected for uploading"}), 400
 
         if file:
+            _record_upload(file)
+
             # Step: Comprehensive Analysis (Extraction + Summary)
-            results = services.analyze_comprehensive(file.stream)
+            mode = request.args.get('mode') or request.form.get('mode')
+            if _wants_job():
+                return _submit_analyzer_job(file, mode)
+            results = services.analyze_comprehensive(file.stream, mode=mode)
             
             return jsonify(results)
             
+    except deadline.DeadlineExceeded as e:
+        return _out_of_time(e.reason, {"error": str(e), "reason": e.reason})
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": f"An error occurred during comprehensive analysis: {e}"}), 500
 
+def _wants_job():
+    flag = request.args.get('async') or request.form.get('async') or ''
+    return flag.lower() in ('1', 'true', 'yes') or 'respond-async' in request.headers.get('Prefer', '')
+
+
+def _submit_analyzer_job(file, mode):
+    """Queue the analysis and answer 202 straight away; duplicate uploads map to the existing job."""
+    payload = file.stream.read()
+    key = request.headers.get('Idempotency-Key')
+    if not key:
+        # Retries of the same upload without an explicit key still collapse onto one run
+        key = hashlib.sha256(payload + f"|{mode or ''}".encode()).hexdigest()
+    # Keys and jobs belong to the submitting client; another client's key never returns its report
+    job, created = services.get_analysis_jobs().submit(
+        services.ANALYZER_JOB, payload, params={'mode': mode}, idempotency_key=f"analyzer:{key}", client=_client_id()
+    )
+    response = jsonify({**job, 'status_url': f"/api/jobs/{job['job_id']}", 'duplicate': not created})
+    response.headers['Location'] = f"/api/jobs/{job['job_id']}"
+    return response, 202
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll a job (only the client that submitted it can). `wait=<seconds>` (max 30) long-polls until it finishes."""
+    jobs = services.get_analysis_jobs()
+    try:
+        wait = min(float(request.args.get('wait', 0)), 30.0)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    client = _client_id()
+    job = jobs.wait(job_id, wait, client) if wait > 0 else jobs.get(job_id, client)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200 if job['status'] in FINISHED else 202
+
+
+@app.route('/api/bootstrap', methods=['GET'])
+def get_dashboard_bootstrap():
+    """
+    Dashboard first load in one round trip: disease trends, assistant context
+    and resource distribution. Query: sections=trends,context,resources and
+    <section>_fields=a,b,c to trim items. Honours If-None-Match when the
+    trends snapshot is available.
+    """
+    sections = _list_arg('sections') or list(services.BOOTSTRAP_SECTIONS)
+    unknown = [name for name in sections if name not in services.BOOTSTRAP_SECTIONS]
+    if unknown:
+        return jsonify({"error": f"Unknown sections: {', '.join(unknown)}"}), 400
+    fields = {name: _list_arg(f"{name}_fields") for name in sections}
+    try:
+        etag, body = services.get_dashboard_bootstrap(sections, fields, request.if_none_match)
+    except Exception as e:
+        logger.error("Bootstrap failed", extra={'error': str(e)})
+        return jsonify({"error": "Data unavailable"}), 500
+    response = Response(status=304) if body is None else Response(body, mimetype='application/json')
+    if etag is not None:
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 @app.route('/api/resource-distribution', methods=['GET'])
 def get_resource_distribution():
+    from utils.resource_analytics import get_resource_analytics  # Deferred: numpy
+
     try:
-        import json
-        file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'resource_distribution.json')
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        return jsonify(data)
+        return jsonify(get_resource_analytics().table('state').rows)
     except Exception as e:
-        print(f"Error loading resource data: {e}")
+        logger.error("Error loading resource data", extra={'error': str(e)})
+        return jsonify({"error": "Data unavailable"}), 500
+
+
+def _list_arg(name):
+    return [v.strip() for v in request.args.get(name, '').split(',') if v.strip()]
+
+
+@app.route('/api/resource-distribution/analytics', methods=['GET'])
+def get_resource_analytics_view():
+    """
+    Precomputed gap indices, cost ratios, per-year ranks and percentiles.
+    Query: level=state|district, state, district, year, sort, order=asc|desc,
+    limit, offset, fields (comma-separated metrics), format=columns, summary=1.
+    """
+    from utils.resource_analytics import get_resource_analytics  # Deferred: numpy
+
+    try:
+        table = get_resource_analytics().table(request.args.get('level', 'state'))
+        order = request.args.get('order')
+        result = table.query(
+            states=_list_arg('state'),
+            districts=_list_arg('district'),
+            year=request.args.get('year'),
+            sort=request.args.get('sort'),
+            descending=None if order is None else order.lower() == 'desc',
+            limit=request.args.get('limit', type=int),
+            offset=request.args.get('offset', 0, type=int),
+            fields=_list_arg('fields') or None,
+            columnar=request.args.get('format') == 'columns',
+        )
+        if request.args.get('summary') in ('1', 'true'):
+            result['summary'] = table.summary
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        logger.error("Resource analytics failed", extra={'error': str(e)})
         return jsonify({"error": "Data unavailable"}), 500
 
 
@@ -101,11 +534,15 @@ def health_assistant_chat():
         # Generate response
         result = assistant.generate_response(user_message, conversation_id)
         
+        reason = result.get('reason')
+        if reason in (deadline.DeadlineExceeded.reason, deadline.Cancelled.reason):
+            return _out_of_time(reason, result)
         return jsonify(result)
     
+    except deadline.DeadlineExceeded as e:
+        return _out_of_time(e.reason, {"error": str(e), "reason": e.reason})
     except Exception as e:
-        print(f"Health Assistant Error: {e}")
-        traceback.print_exc()
+        logger.exception("Health Assistant Error")
         return jsonify({
             'success': False,
             'error': str(e),
@@ -116,17 +553,38 @@ def health_assistant_chat():
 def health_assistant_context():
     """Get current disease trends context."""
     try:
-        assistant = get_health_assistant()
-        result = assistant.get_disease_context()
-        return jsonify(result)
+        return jsonify(services.get_assistant_context())
     
     except Exception as e:
-        print(f"Context Error: {e}")
+        logger.error("Context Error", extra={'error': str(e)})
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/api/health-assistant/providers', methods=['GET'])
+def health_assistant_providers():
+    """Live latency and health of each LLM provider behind the router."""
+    return jsonify({'providers': get_health_assistant().status()})
+
+@app.route('/api/usage', methods=['GET'])
+def get_token_usage():
+    """Token usage per conversation, client and route (top consumers in the budget window). Admin only: it lists conversation IDs and client IPs."""
+    error = _admin_access_error()
+    if error is not None:
+        return error
+    ledger = token_ledger.get_token_ledger()
+    limit = min(request.args.get('limit', 20, type=int), 200)
+    conversation = request.args.get('conversation_id')
+    client = request.args.get('client')
+    return jsonify({
+        'window_seconds': token_ledger.BUDGET_WINDOW,
+        'budgets': ledger.budgets,
+        'conversations': ledger.report('conversation', conversation, limit),
+        'clients': ledger.report('client', client, limit),
+        'routes': ledger.report('route', limit=limit),
+    })
+
 @app.route('/api/health-assistant/clear', methods=['POST'])
 def clear_conversation():
     """Clear conversation history."""
@@ -143,7 +601,7 @@ def clear_conversation():
         return jsonify({'success': success})
     
     except Exception as e:
-        print(f"Clear Conversation Error: {e}")
+        logger.error("Clear Conversation Error", extra={'error': str(e)})
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/chat/patient-reply', methods=['POST'])
@@ -158,6 +616,8 @@ def patient_chat_reply():
         reply = service.generate_patient_reply(history, patient_context)
         
         return jsonify({'reply': reply})
+    except deadline.DeadlineExceeded as e:
+        return _out_of_time(e.reason, {"error": str(e), "reason": e.reason})
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
@@ -177,6 +637,42 @@ def get_disease_insight():
         result = assistant.analyze_disease_progress(disease.get('name'), metrics)
         
         return jsonify(result)
+    except deadline.DeadlineExceeded as e:
+        return _out_of_time(e.reason, {"error": str(e), "reason": e.reason})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/disease-insight/batch', methods=['POST'])
+def get_disease_insight_batch():
+    """
+    Generate AI insights for several tracked conditions in one round-trip.
+    Body: {"items": [{"disease": {...}, "metrics": [...]}, ...], "stream": false}
+    At most INSIGHT_BATCH_MAX items; each counts against the client's LLM rate
+    limit like a single insight request. With stream=true results are sent as NDJSON lines as each item completes.
+    """
+    try:
+        data = request.get_json() or {}
+        items = data.get('items')
+
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'items must be a non-empty list'}), 400
+        if len(items) > INSIGHT_BATCH_MAX:
+            return jsonify({'error': f'At most {INSIGHT_BATCH_MAX} items per batch'}), 400
+
+        assistant = get_health_assistant()
+
+        if data.get('stream'):
+            def generate():
+                for result in assistant.iter_disease_progress(items):
+                    yield json.dumps(result) + '\n'
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+        results = [None] * len(items)
+        for result in assistant.iter_disease_progress(items):
+            results[result['index']] = result
+        return jsonify({'results': results})
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
@@ -1,22 +1,40 @@
-import requests
-import pandas as pd
-import pytesseract
-from PIL import Image
 import re
 import os
 import json
+import io
 import time
 import base64
-from groq import Groq
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
 from dotenv import load_dotenv
+from utils.metrics import timed_completion, stage
+from utils import metrics as telemetry
+from utils import deadline
+from utils.logger import get_logger
+from utils.medical_extractor import extract_medical_entities
+from utils.job_queue import get_job_queue
+from utils.shared_snapshot import SharedSnapshot
+from utils.single_flight import SingleFlight, canonical_key
+from utils.structured_output import Field, structured_completion
+from utils.report_tiles import plan_bands, render_band, merge_extractions
+from utils.report_summary import LOCAL_SUMMARY, REPORT_SUMMARIES, complete_summary, summarize_report
+from utils.narrative_store import NARRATIVE_PRECOMPUTE, NarrativePrecomputer, get_narrative_store, trend_fingerprint
 
 # Load environment variables
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
 
+logger = get_logger('services')
+
 # --- Cache Configuration ---
-_TRENDS_CACHE = None
-_CACHE_TIMESTAMP = 0
 CACHE_DURATION = 3600  # 1 hour
+EPIDEMIOLOGY_STORE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'india_epidemiology_data.json')
+TRENDS_DELTA_CACHE_SIZE = 32  # (since, version) diffs kept; dashboards tend to sit on the same few versions
+TRENDS_STREAM_MAX_SUBSCRIBERS = int(os.getenv('TRENDS_STREAM_MAX_SUBSCRIBERS', 4))  # Open SSE streams per worker process (each holds a thread)
+TRENDS_STREAM_HEARTBEAT = float(os.getenv('TRENDS_STREAM_HEARTBEAT', 20))  # Seconds between keep-alive comments
+TRENDS_STREAM_MAX_SECONDS = float(os.getenv('TRENDS_STREAM_MAX_SECONDS', 300))  # Streams end after this; EventSource reconnects
 
 
 # --- Constants ---
@@ -32,139 +50,316 @@ DEFAULT_AGE_GROUPS = {
 }
 
 def analyze_report_text(text):
-    detected_diseases = []
-    detected_medications = []
-    lines = text.lower().split('\n')
-    for i, line in enumerate(lines):
-        match = re.match(r'^\s*\d+\.\s*(\w+)', line)
-        if match:
-            med_name = match.group(1).capitalize()
-            med_info = {"name": med_name, "dosage": "", "frequency": ""}
-            detected_medications.append(med_info)
-    return {"diseases": detected_diseases, "medications": detected_medications}
+    """Local extraction of medications (with dosage/frequency) and conditions from OCR text."""
+    return extract_medical_entities(text)
+
+_trends_snapshot = None
+_trends_snapshot_lock = threading.Lock()
+
+
+def get_trends_snapshot():
+    """
+    Mapped trends snapshot shared by every worker process (see utils/shared_snapshot.py).
+    Holds the pre-serialised response bytes; None if no version could be published or mapped.
+    """
+    global _trends_snapshot
+    if _trends_snapshot is None:
+        with _trends_snapshot_lock:
+            if _trends_snapshot is None:
+                # Republished on expiry, or as soon as the epidemiology store is edited
+                _trends_snapshot = SharedSnapshot('trends', build_trends_data, CACHE_DURATION,
+                                                  sources=(EPIDEMIOLOGY_STORE,))
+    return _trends_snapshot.get()
+
+
+def wait_for_trends(after, timeout):
+    """Block until a trends version other than `after` is current (or timeout); returns the snapshot."""
+    get_trends_snapshot()
+    return _trends_snapshot.wait(after, timeout)
+
+
+_trends_deltas = OrderedDict()
+_trends_deltas_lock = threading.Lock()
+
+
+def _trend_key(item):
+    return item.get('id') or item.get('disease')
+
+
+def get_trends_changes(since):
+    """
+    Diseases added, changed or removed between trends version `since` and the
+    current one. When `since` is unknown (pruned, from a previous store, or in
+    the future) the result has reset=True and lists every disease as added.
+    Returns None if no snapshot is available.
+    """
+    snapshot = get_trends_snapshot()
+    if snapshot is None:
+        return None
+    cache_key = (since, snapshot.version)
+    with _trends_deltas_lock:
+        cached = _trends_deltas.get(cache_key)
+        if cached is not None:
+            _trends_deltas.move_to_end(cache_key)
+            return cached
+
+    current = snapshot.decode()
+    previous = None
+    if since == snapshot.version:
+        previous = current
+    elif 0 < since < snapshot.version:
+        old = _trends_snapshot.load(since)
+        previous = old.decode() if old is not None else None
+
+    if previous is None:
+        delta = {'version': snapshot.version, 'since': since, 'reset': True,
+                 'added': current, 'changed': [], 'removed': []}
+    else:
+        before = {_trend_key(item): item for item in previous}
+        after = {_trend_key(item): item for item in current}
+        delta = {
+            'version': snapshot.version, 'since': since, 'reset': False,
+            'added': [item for key, item in after.items() if key not in before],
+            'changed': [item for key, item in after.items() if key in before and before[key] != item],
+            'removed': [key for key in before if key not in after],
+        }
+
+    with _trends_deltas_lock:
+        _trends_deltas[cache_key] = delta
+        while len(_trends_deltas) > TRENDS_DELTA_CACHE_SIZE:
+            _trends_deltas.popitem(last=False)
+    return delta
+
 
 def get_trends_data():
     """Authoritative Intelligence Source with Hardened Mapping."""
-    global _TRENDS_CACHE, _CACHE_TIMESTAMP
-    
-    # Check cache
-    if _TRENDS_CACHE and (time.time() - _CACHE_TIMESTAMP < CACHE_DURATION):
-        # Optional: Print cache hit debug if needed, but keeping it clean
-        return _TRENDS_CACHE
-
-    instance_id = int(time.time() % 1000)
-    print(f"--- [SURVEILLANCE PIPELINE v2.2] Instance {instance_id} Active at {time.strftime('%H:%M:%S')} ---")
-    EPIDEMIOLOGY_STORE = os.path.join(os.path.dirname(__file__), '..', 'india_epidemiology_data.json')
-    
-    if not os.path.exists(EPIDEMIOLOGY_STORE):
-        print(f"CRITICAL: Epidemiology store not found at {EPIDEMIOLOGY_STORE}")
+    snapshot = get_trends_snapshot()
+    if snapshot is not None:
+        with stage('trends_decode'):
+            return snapshot.decode()
+    try:
+        with stage('trends_build'):
+            return build_trends_data()
+    except Exception as e:
+        logger.error("Trends mapping failed", extra={'error': str(e)})
         return []
 
-    try:
-        with open(EPIDEMIOLOGY_STORE, 'r') as f:
-            intel_data = json.load(f)
+
+def build_trends_data():
+    """Map the epidemiology store into trend cards. Raises if the store is missing or unreadable."""
+    started = time.perf_counter()
+    logger.info("Surveillance pipeline refresh", extra={'pipeline': 'v2.2'})
+
+    if not os.path.exists(EPIDEMIOLOGY_STORE):
+        logger.critical("Epidemiology store not found", extra={'path': EPIDEMIOLOGY_STORE})
+        raise FileNotFoundError(EPIDEMIOLOGY_STORE)
+
+    with open(EPIDEMIOLOGY_STORE, 'r') as f:
+        intel_data = json.load(f)
+    
+    raw_diseases = intel_data.get('diseases', [])
+    result = []
+
+    for disease in raw_diseases:
+        metrics = disease.get('metrics', {})
+        d_name = str(disease.get('name', ''))
+        segment = disease.get('segment', 'Uncategorized')
         
-        raw_diseases = intel_data.get('diseases', [])
-        result = []
-
-        for disease in raw_diseases:
-            metrics = disease.get('metrics', {})
-            d_name = str(disease.get('name', ''))
-            segment = disease.get('segment', 'Uncategorized')
-            
-            # 1. Metric Extraction (Robusted for % and strings)
-            raw_val = metrics.get('weekly_reported_cases') or metrics.get('weekly_notified_cases') or metrics.get('prevalence', 0)
-            try:
-                if isinstance(raw_val, str):
-                    numeric_val = float(raw_val.replace('%', '').replace(',', '').strip().split(' ')[0])
-                else:
-                    numeric_val = float(raw_val)
-            except:
-                numeric_val = 0
-
-            # 2. Hardened Medicine Mapping (Explicit match for Section D)
-            d_lower = d_name.lower().strip()
-            if 'tuberculosis' in d_lower or 'tb' in d_lower:
-                meds = ['Rifampicin', 'Isoniazid', 'Pyrazinamide', 'Ethambutol']
-            elif 'diabetes' in d_lower:
-                meds = ['Metformin', 'Insulin', 'Sitagliptin']
-            elif 'hypertension' in d_lower:
-                meds = ['Telmisartan', 'Amlodipine', 'Losartan']
-            elif 'respiratory' in d_lower or 'ari' in d_lower:
-                meds = ['Amoxicillin', 'Azithromycin', 'Paracetamol']
-            elif 'diarrheal' in d_lower or 'add' in d_lower:
-                meds = ['ORS', 'Zinc', 'Loperamide']
-            elif 'fever' in d_lower:
-                meds = ['Paracetamol', 'Fluids', 'Supportive Care']
-            elif 'cardiac' in d_lower or 'ischemic' in d_lower:
-                meds = ['Aspirin', 'Atorvastatin', 'Clopidogrel']
-            elif 'renal' in d_lower or 'kidney' in d_lower:
-                meds = ['Furosemide', 'Erythropoietin', 'Calcium Supplements']
-            elif 'mental' in d_lower or 'anxiety' in d_lower:
-                meds = ['Sertraline', 'Escitalopram', 'CBT']
+        # 1. Metric Extraction (Robusted for % and strings)
+        raw_val = metrics.get('weekly_reported_cases') or metrics.get('weekly_notified_cases') or metrics.get('prevalence', 0)
+        try:
+            if isinstance(raw_val, str):
+                numeric_val = float(raw_val.replace('%', '').replace(',', '').strip().split(' ')[0])
             else:
-                meds = ['Supportive Care', 'Fluids']
-
-            # 3. Demographic Extraction (Forcing defaults if missing or non-specific)
-            age_data = disease.get('age_demographics', {})
-            if not age_data or 'all' in age_data or len(age_data) == 0:
-                age_data = DEFAULT_AGE_GROUPS
-            
-            item = {
-                'id': disease.get('id'),
-                'disease': d_name,
-                'segment': segment,
-                'outbreaks': raw_val,
-                'annual_count': metrics.get('annual_confirmed_cases', 0),
-                'burden_estimate': metrics.get('estimated_national_burden', ''),
-                'risk_level': disease.get('risk_level', 'Unknown'),
-                'severity': disease.get('severity', 'Moderate'),
-                'seasonality': disease.get('seasonality', 'Year-round'),
-                'confidence': metrics.get('confidence', 'Medium'),
-                'timeframe': metrics.get('timeframe', 'Monthly Estimate'),
-                'description': disease.get('about', ''),
-                'trends_context': disease.get('trends', ''),
-                'recovery_rate': disease.get('recovery_metrics', {}).get('rate', '95%'),
-                'avg_recovery': disease.get('recovery_metrics', {}).get('avg_time', '7 days'),
-                'age_groups': [{'name': k, 'value': v} for k, v in age_data.items()],
-                'gender_split': [{'name': 'Male', 'value': 52}, {'name': 'Female', 'value': 48}],
-                'source': 'Public Health Intelligence (Curebird Store)',
-                'source_label': 'IDSP + MoHFW Surveillance Metrics',
-                'sources': disease.get('sources', []),
-                'top_medicines': meds,
-                'med_source': 'Clinical Protocols & Intelligence. Disclaimer: Always consult a healthcare professional before starting any medication or treatment.',
-                'v2_fingerprint': 'AUTH_PIPELINE_22'
-            }
+                numeric_val = float(raw_val)
+        except:
+            numeric_val = 0
+
+        # 2. Hardened Medicine Mapping (Explicit match for Section D)
+        d_lower = d_name.lower().strip()
+        if 'tuberculosis' in d_lower or 'tb' in d_lower:
+            meds = ['Rifampicin', 'Isoniazid', 'Pyrazinamide', 'Ethambutol']
+        elif 'diabetes' in d_lower:
+            meds = ['Metformin', 'Insulin', 'Sitagliptin']
+        elif 'hypertension' in d_lower:
+            meds = ['Telmisartan', 'Amlodipine', 'Losartan']
+        elif 'respiratory' in d_lower or 'ari' in d_lower:
+            meds = ['Amoxicillin', 'Azithromycin', 'Paracetamol']
+        elif 'diarrheal' in d_lower or 'add' in d_lower:
+            meds = ['ORS', 'Zinc', 'Loperamide']
+        elif 'fever' in d_lower:
+            meds = ['Paracetamol', 'Fluids', 'Supportive Care']
+        elif 'cardiac' in d_lower or 'ischemic' in d_lower:
+            meds = ['Aspirin', 'Atorvastatin', 'Clopidogrel']
+        elif 'renal' in d_lower or 'kidney' in d_lower:
+            meds = ['Furosemide', 'Erythropoietin', 'Calcium Supplements']
+        elif 'mental' in d_lower or 'anxiety' in d_lower:
+            meds = ['Sertraline', 'Escitalopram', 'CBT']
+        else:
+            meds = ['Supportive Care', 'Fluids']
+
+        # 3. Demographic Extraction (Forcing defaults if missing or non-specific)
+        age_data = disease.get('age_demographics', {})
+        if not age_data or 'all' in age_data or len(age_data) == 0:
+            age_data = DEFAULT_AGE_GROUPS
+        
+        item = {
+            'id': disease.get('id'),
+            'disease': d_name,
+            'segment': segment,
+            'outbreaks': raw_val,
+            'annual_count': metrics.get('annual_confirmed_cases', 0),
+            'burden_estimate': metrics.get('estimated_national_burden', ''),
+            'risk_level': disease.get('risk_level', 'Unknown'),
+            'severity': disease.get('severity', 'Moderate'),
+            'seasonality': disease.get('seasonality', 'Year-round'),
+            'confidence': metrics.get('confidence', 'Medium'),
+            'timeframe': metrics.get('timeframe', 'Monthly Estimate'),
+            'description': disease.get('about', ''),
+            'trends_context': disease.get('trends', ''),
+            'recovery_rate': disease.get('recovery_metrics', {}).get('rate', '95%'),
+            'avg_recovery': disease.get('recovery_metrics', {}).get('avg_time', '7 days'),
+            'age_groups': [{'name': k, 'value': v} for k, v in age_data.items()],
+            'gender_split': [{'name': 'Male', 'value': 52}, {'name': 'Female', 'value': 48}],
+            'source': 'Public Health Intelligence (Curebird Store)',
+            'source_label': 'IDSP + MoHFW Surveillance Metrics',
+            'sources': disease.get('sources', []),
+            'top_medicines': meds,
+            'med_source': 'Clinical Protocols & Intelligence. Disclaimer: Always consult a healthcare professional before starting any medication or treatment.',
+            'v2_fingerprint': 'AUTH_PIPELINE_22'
+        }
 
-            # 4. History Generation
-            item['history'] = [
-                {'year': 2021, 'count': round(numeric_val * 0.9, 1)},
-                {'year': 2022, 'count': round(numeric_val * 0.95, 1)},
-                {'year': 2023, 'count': round(numeric_val * 1.05, 1)},
-                {'year': 2024, 'count': round(numeric_val * 0.98, 1)},
-                {'year': 2025, 'count': numeric_val}
-            ]
-            
-            result.append(item)
+        # 4. History Generation
+        item['history'] = [
+            {'year': 2021, 'count': round(numeric_val * 0.9, 1)},
+            {'year': 2022, 'count': round(numeric_val * 0.95, 1)},
+            {'year': 2023, 'count': round(numeric_val * 1.05, 1)},
+            {'year': 2024, 'count': round(numeric_val * 0.98, 1)},
+            {'year': 2025, 'count': numeric_val}
+        ]
         
-        # Update cache (Outside Loop)
-        _TRENDS_CACHE = result
-        _CACHE_TIMESTAMP = time.time()
-        print(f"--- Cache Updated with {len(result)} items at {time.strftime('%H:%M:%S')} ---")
+        result.append(item)
+    
+    logger.info("Trends mapped", extra={'items': len(result), 'duration_ms': round((time.perf_counter() - started) * 1000, 2)})
 
-        return result
+    return result
+
+# --- Dashboard Bootstrap ---
+BOOTSTRAP_SECTIONS = ('trends', 'context', 'resources')
+BOOTSTRAP_CACHE_SIZE = 16  # Serialised bodies kept per (data versions, selection)
+CONTEXT_TOP_N = 10
+
+_bootstrap_bodies = OrderedDict()
+_bootstrap_lock = threading.Lock()
+
+
+def _numeric(value):
+    """'12,450 cases' / '3.2%' / 900 -> float, as the trends mapper reads metric values; 0 if unreadable."""
+    try:
+        if isinstance(value, str):
+            return float(value.replace('%', '').replace(',', '').strip().split(' ')[0])
+        return float(value)
+    except (TypeError, ValueError, IndexError):
+        return 0
+
+
+def _assistant_context(trends):
+    """
+    The /api/health-assistant/context shape, derived from the trends snapshot.
+    Risk is graded on `outbreaks`, the same field reported as `cases`.
+    """
+    diseases = []
+    for item in trends[:CONTEXT_TOP_N]:
+        history = item.get('history') or []
+        latest = history[-1] if history else {}
+        cases = _numeric(item.get('outbreaks', 0))
+        diseases.append({
+            'name': item.get('disease', 'Unknown'),
+            'cases': item.get('outbreaks', 0),
+            'risk_level': 'High' if cases > 100000 else 'Medium' if cases > 10000 else 'Low',
+            'year': latest.get('year', 'N/A'),
+        })
+    return {'success': True, 'diseases': diseases, 'last_updated': 'Recently'}
+
+
+def get_assistant_context():
+    """Top diseases for /api/health-assistant/context, from the same trends data as the bootstrap."""
+    return _assistant_context(get_trends_data())
+
+
+def _select(rows, fields):
+    if not fields:
+        return rows
+    return [{k: row[k] for k in fields if k in row} for row in rows]
+
+
+def get_dashboard_bootstrap(sections, fields, if_none_match=()):
+    """
+    (etag, body) for the dashboard's first load: trends, assistant context and
+    state resource rows in one JSON document, built from the shared snapshots.
+    `fields` maps a section to the item keys to keep. The ETag covers the data
+    versions and the selection, and bodies are cached under it, so repeat loads
+    of an unchanged dashboard neither rebuild nor re-serialise. When the ETag
+    is in `if_none_match` the body is None: nothing is looked up or built.
+    Without a trends snapshot the data has no version, so a live build has no
+    ETag (None) and is never revalidated.
+    """
+    from utils.resource_analytics import get_resource_analytics
+
+    snapshot = get_trends_snapshot()
+    trends_version = snapshot.version if snapshot is not None else 'live'
+    resources = get_resource_analytics().table('state') if 'resources' in sections else None
+    etag = None
+    if snapshot is not None:
+        selection = {name: sorted(fields.get(name) or ()) for name in sections}
+        etag = canonical_key(trends_version, resources.version if resources else None, selection)[:32]
+        if etag in if_none_match:
+            return etag, None
+        with _bootstrap_lock:
+            body = _bootstrap_bodies.get(etag)
+            if body is not None:
+                _bootstrap_bodies.move_to_end(etag)
+                return etag, body
+
+    document = {'versions': {'trends': trends_version}}
+    trends = get_trends_data() if {'trends', 'context'} & set(sections) else []
+    if 'trends' in sections:
+        document['trends'] = _select(trends, fields.get('trends'))
+    if 'context' in sections:
+        context = _assistant_context(trends)
+        context['diseases'] = _select(context['diseases'], fields.get('context'))
+        document['context'] = context
+    if resources is not None:
+        document['versions']['resources'] = resources.version
+        document['resources'] = _select(resources.rows, fields.get('resources'))
+    with stage('serialize'):
+        body = json.dumps(document, separators=(',', ':')).encode() + b'\n'
+
+    # A live build (no snapshot) may differ next time, so only versioned bodies are cached
+    if etag is not None:
+        with _bootstrap_lock:
+            _bootstrap_bodies[etag] = body
+            while len(_bootstrap_bodies) > BOOTSTRAP_CACHE_SIZE:
+                _bootstrap_bodies.popitem(last=False)
+    return etag, body
 
-    except Exception as e:
-        print(f"ERROR: Mapping failed: {e}")
-        return []
 
 # --- OCR Configuration ---
 TESSERACT_PATH = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-if os.path.exists(TESSERACT_PATH):
-    pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+
+
+def _load_ocr():
+    """Import PIL and pytesseract on first use; only the OCR paths need them."""
+    import pytesseract
+    from PIL import Image
+    if os.path.exists(TESSERACT_PATH):
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+    return pytesseract, Image
+
 
 def perform_ocr(file_stream):
     try:
+        pytesseract, Image = _load_ocr()
         image = Image.open(file_stream)
         # Ensure image is in RGB for best OCR results
         if image.mode != 'RGB':
@@ -172,120 +367,505 @@ def perform_ocr(file_stream):
         
         extracted_text = pytesseract.image_to_string(image)
         if not extracted_text.strip():
-            print("OCR WARNING: No text extracted from image.")
+            logger.warning("OCR extracted no text")
         return extracted_text
     except Exception as e:
-        print(f"OCR ERROR: Failed to perform extraction: {e}")
+        logger.error("OCR extraction failed", extra={'error': str(e)})
         return ""
 
+# --- Tiered Extraction Configuration ---
+ANALYZER_MODE = os.getenv('ANALYZER_MODE', 'vlm')  # 'vlm' (remote only), 'tiered' (local OCR first) or 'tiled' (large pages in bands)
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+OCR_TIMEOUT = float(os.getenv('OCR_TIMEOUT', 20))  # Seconds before escalating to the VLM
+OCR_MIN_CONFIDENCE = float(os.getenv('OCR_MIN_CONFIDENCE', 75))  # Mean Tesseract word confidence (0-100)
+OCR_MIN_MEDICAL_SCORE = int(os.getenv('OCR_MIN_MEDICAL_SCORE', 3))  # Medical cue hits required to stay local
+
+MEDICAL_CUES = re.compile(
+    r"\b(rx|tab|tabs|tablet|cap|caps|capsule|syp|syrup|inj|injection|mg|mcg|ml|iu|od|bd|bid|tds|tid|qid|hs|sos|"
+    r"prn|before food|after food|dr\.?|mbbs|md|diagnosis|dx|prescription|patient|hb|hba1c|glucose|creatinine|"
+    r"cholesterol|bp|mmhg|mg/dl|report|clinic|hospital)\b",
+    re.IGNORECASE,
+)
+
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+
+def _get_ocr_pool():
+    """Process pool so Tesseract's CPU work stays off the request threads."""
+    global _ocr_pool
+    if _ocr_pool is None:
+        with _ocr_pool_lock:
+            if _ocr_pool is None:
+                _ocr_pool = ProcessPoolExecutor(max_workers=OCR_WORKERS)
+    return _ocr_pool
+
+
+def _ocr_worker(image_bytes):
+    """Runs in a pool process: OCR text plus mean word confidence."""
+    try:
+        pytesseract, Image = _load_ocr()
+        image = Image.open(io.BytesIO(image_bytes))
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+    except Exception as e:
+        # pytesseract errors do not unpickle cleanly and would break the pool
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data['text']):
+        word = word.strip()
+        conf = float(data['conf'][i])
+        if not word or conf < 0:
+            continue
+        confidences.append(conf)
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        lines.setdefault(key, []).append(word)
+
+    text = '\n'.join(' '.join(words) for _, words in sorted(lines.items()))
+    mean_conf = sum(confidences) / len(confidences) if confidences else 0.0
+    return text, mean_conf, len(confidences)
+
+
+def medical_score(text):
+    """Number of prescription/lab-report cues in the text."""
+    return len(MEDICAL_CUES.findall(text or ''))
+
+
+def perform_local_ocr(image_bytes):
+    """OCR in the process pool. Returns {'text', 'confidence', 'words'}; empty on failure or timeout."""
+    global _ocr_pool
+    try:
+        timeout = deadline.attempt_timeout(OCR_TIMEOUT)
+        future = _get_ocr_pool().submit(_ocr_worker, image_bytes)
+        text, confidence, words = deadline.wait_result(future, timeout)
+        return {'text': text, 'confidence': confidence, 'words': words}
+    except deadline.DeadlineExceeded:
+        raise
+    except FutureTimeout:
+        logger.warning("Local OCR timed out", extra={'timeout_s': timeout})
+    except BrokenProcessPool as e:
+        logger.error("OCR pool broken, recreating", extra={'error': str(e)})
+        with _ocr_pool_lock:
+            _ocr_pool = None
+    except Exception as e:
+        logger.error("Local OCR failed", extra={'error': str(e)})
+    return {'text': '', 'confidence': 0.0, 'words': 0}
+
+
+def analyze_tiered(file_stream, custom_api_key=None):
+    """
+    Local OCR first; escalate to analyze_with_vlm when the pass is
+    low-confidence, not medical, or yields no medications.
+    """
+    file_stream.seek(0)
+    image_bytes = file_stream.read()
+
+    started = time.perf_counter()
+    ocr = perform_local_ocr(image_bytes)
+    score = medical_score(ocr['text'])
+    local = analyze_report_text(ocr['text']) if ocr['text'] else {"diseases": [], "medications": []}
+
+    confident = ocr['confidence'] >= OCR_MIN_CONFIDENCE and score >= OCR_MIN_MEDICAL_SCORE
+    if confident and local['medications']:
+        logger.info("Tiered extraction served locally", extra={
+            'confidence': round(ocr['confidence'], 1), 'medical_score': score,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2)
+        })
+        return {
+            "is_medical": True,
+            "medications": local['medications'],
+            "diseases": local['diseases'],
+            "source": "local_ocr",
+            "ocr_confidence": round(ocr['confidence'], 1),
+            "raw_text": ocr['text'],
+        }
+
+    logger.info("Tiered extraction escalating to VLM", extra={
+        'confidence': round(ocr['confidence'], 1), 'medical_score': score, 'local_medications': len(local['medications'])
+    })
+    result = analyze_with_vlm(io.BytesIO(image_bytes), custom_api_key=custom_api_key)
+    result['source'] = 'vlm'
+    return result
+
+
+_groq_clients = {}
+_groq_clients_lock = threading.Lock()
+
+
+def get_groq_client(api_key):
+    """One Groq client per API key, built on first use (the SDK import is the slow part)."""
+    client = _groq_clients.get(api_key)
+    if client is None:
+        with _groq_clients_lock:
+            client = _groq_clients.get(api_key)
+            if client is None:
+                from groq import Groq
+                client = _groq_clients[api_key] = Groq(api_key=api_key)
+    return client
+
+
+# Concurrent uploads of the same image share one extraction / analysis run
+_extract_flight = SingleFlight('report_extract')
+_analysis_flight = SingleFlight('report_analysis')
+
+
+def extract_report(file_stream, mode=None, custom_api_key=None):
+    """Phase 1 dispatcher: 'tiered' tries local OCR first, 'tiled' splits large pages into bands, anything else goes straight to the VLM."""
+    with stage('upload_read'):
+        image_bytes = file_stream.read()
+    mode = mode or ANALYZER_MODE
+    key = canonical_key(image_bytes, mode, custom_api_key)
+    return _extract_flight.do(key, _extract_report, image_bytes, mode, custom_api_key)
+
+
+def _extract_report(image_bytes, mode, custom_api_key):
+    if mode == 'tiered':
+        return analyze_tiered(io.BytesIO(image_bytes), custom_api_key=custom_api_key)
+    if mode == 'tiled':
+        return analyze_tiled(io.BytesIO(image_bytes), custom_api_key=custom_api_key)
+    return analyze_with_vlm(io.BytesIO(image_bytes), custom_api_key=custom_api_key)
+
+# VLM extraction output. is_medical defaults to true if missing (the prompt asks for it explicitly)
+REPORT_EXTRACTION_FIELDS = {
+    'is_medical': Field('bool', default=True),
+    'medications': Field('list', default=[], aliases=('medicines', 'drugs'), items=Field('object', from_string='name', fields={
+        'name': Field('str', required=True, aliases=('medication', 'drug')),
+        'dosage': Field('str', default='', aliases=('dose', 'strength')),
+        'frequency': Field('str', default=''),
+    })),
+    'diseases': Field('list', default=[], aliases=('conditions', 'diagnoses'), items=Field('str')),
+}
+
+
+VLM_PROMPT = "Analyze this image. First, determine if it is a valid medical document (prescription, lab report, clinical notes, discharge summary) or medication packaging. If it is NOT a medical image, return strict JSON: {\"is_medical\": false}. If it IS a medical image, extract all detected medications (name, dosage, frequency) and any detected clinical conditions or diseases. Return JSON: {\"is_medical\": true, \"medications\": [{\"name\": \"...\", \"dosage\": \"...\", \"frequency\": \"...\"}], \"diseases\": [\"...\", \"...\"]}"
+# Bands of a tiled page: lines cut by the band edge are read whole in the neighbouring band
+VLM_TILE_PROMPT = "This image is one horizontal band of a taller medical document; judge is_medical by the visible content. Skip any line of text that is cut off at the top or bottom edge. " + VLM_PROMPT
+VLM_TILE_WORKERS = int(os.getenv('VLM_TILE_WORKERS', 6))  # Band extractions in flight per worker process
+
+TILED_EXTRACTIONS = telemetry.counter(
+    'curebird_tiled_extraction_total', 'Tiled-mode report extractions: single, tiled, partial, failed.', ('outcome',)
+)
+
+
+def _vision_client(custom_api_key=None):
+    api_key = custom_api_key or os.getenv('GROQ_API_KEY_VISION') or os.getenv('GROQ_API_KEY')
+    if not api_key:
+        raise ValueError("Groq API key not found in environment variables.")
+    return get_groq_client(api_key)
+
+
+def _vlm_extract(client, image_bytes, prompt=VLM_PROMPT):
+    """One VLM extraction call; raises on failure."""
+    with stage('image_encode'):
+        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+
+    # Output repaired and validated locally; see utils/structured_output.py
+    return structured_completion(
+        client,
+        'report_extraction',
+        REPORT_EXTRACTION_FIELDS,
+        model="meta-llama/llama-4-scout-17b-16e-instruct",
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{base64_image}",
+                        },
+                    },
+                ],
+            }
+        ],
+        temperature=0.1,
+        max_tokens=1024,
+        response_format={"type": "json_object"}
+    )
+
+
 def analyze_with_vlm(file_stream, custom_api_key=None):
     """
     Directly analyze medical report images using Groq VLM.
     """
     try:
-        # 1. Setup Groq Client
-        api_key = custom_api_key or os.getenv('GROQ_API_KEY_VISION') or os.getenv('GROQ_API_KEY')
-        if not api_key:
-            raise ValueError("Groq API key not found in environment variables.")
-        
-        client = Groq(api_key=api_key)
-        
-        # 2. Encode image to Base64
+        client = _vision_client(custom_api_key)
         file_stream.seek(0)
-        base64_image = base64.b64encode(file_stream.read()).decode('utf-8')
-        
-        # 3. Call Groq VLM
-        completion = client.chat.completions.create(
-            model="meta-llama/llama-4-scout-17b-16e-instruct",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text", 
-                            "text": "Analyze this image. First, determine if it is a valid medical document (prescription, lab report, clinical notes, discharge summary) or medication packaging. If it is NOT a medical image, return strict JSON: {\"is_medical\": false}. If it IS a medical image, extract all detected medications (name, dosage, frequency) and any detected clinical conditions or diseases. Return JSON: {\"is_medical\": true, \"medications\": [{\"name\": \"...\", \"dosage\": \"...\", \"frequency\": \"...\"}], \"diseases\": [\"...\", \"...\"]}"
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}",
-                            },
-                        },
-                    ],
-                }
-            ],
-            temperature=0.1,
-            max_tokens=1024,
-            response_format={"type": "json_object"}
-        )
-        
-        raw_response = completion.choices[0].message.content
-        structured_data = json.loads(raw_response)
-        
-        return {
-            "is_medical": structured_data.get("is_medical", True), # Default to true if missing to be safe, but prompt should catch it
-            "medications": structured_data.get("medications", []),
-            "diseases": structured_data.get("diseases", []) or structured_data.get("conditions", [])
-        }
+        return _vlm_extract(client, file_stream.read())
+    except deadline.DeadlineExceeded:
+        # Out of time is not "not medical"; let the caller answer 504
+        raise
+    except Exception as e:
+        logger.error("VLM analysis failed", extra={'error': str(e)})
+        return {"is_medical": False, "medications": [], "diseases": []}
+
+
+_tile_pool = None
+_tile_pool_lock = threading.Lock()
+
+
+def _get_tile_pool():
+    """Threads for band extractions; each one mostly waits on the VLM."""
+    global _tile_pool
+    if _tile_pool is None:
+        with _tile_pool_lock:
+            if _tile_pool is None:
+                _tile_pool = ThreadPoolExecutor(max_workers=VLM_TILE_WORKERS, thread_name_prefix='vlm-tile')
+    return _tile_pool
+
+
+def _extract_band(client, image, box, scale):
+    return _vlm_extract(client, render_band(image, box, scale), VLM_TILE_PROMPT)
+
+
+def analyze_tiled(file_stream, custom_api_key=None):
+    """
+    Tall or high-resolution pages are cut into overlapping bands
+    (utils/report_tiles.py), each band is extracted by the VLM in parallel,
+    and the results are merged with duplicates from the overlaps removed.
+    Pages that fit in one band take the plain analyze_with_vlm path.
+    """
+    file_stream.seek(0)
+    image_bytes = file_stream.read()
+    try:
+        with stage('image_tile'):
+            image, boxes, scale = plan_bands(image_bytes)
     except Exception as e:
-        print(f"VLM ERROR: {e}")
+        logger.warning("Image tiling failed, extracting whole page", extra={'error': str(e)})
+        boxes = []
+    if not boxes:
+        TILED_EXTRACTIONS.inc('single')
+        return analyze_with_vlm(io.BytesIO(image_bytes), custom_api_key=custom_api_key)
+
+    started = time.perf_counter()
+    try:
+        client = _vision_client(custom_api_key)
+    except ValueError as e:
+        logger.error("VLM analysis failed", extra={'error': str(e)})
+        return {"is_medical": False, "medications": [], "diseases": []}
+    # Bands are cropped and encoded in the pool too; copied contexts carry the
+    # request deadline and token attribution along
+    futures = [
+        _get_tile_pool().submit(contextvars.copy_context().run, _extract_band, client, image, box, scale)
+        for box in boxes
+    ]
+    results = []
+    try:
+        for index, future in enumerate(futures):
+            try:
+                results.append(deadline.wait_result(future, deadline.attempt_timeout()))
+            except (deadline.DeadlineExceeded, FutureTimeout):
+                raise
+            except Exception as e:
+                logger.warning("Band extraction failed", extra={'tile': index, 'tiles': len(boxes), 'error': str(e)})
+    except (deadline.DeadlineExceeded, FutureTimeout):
+        for future in futures:
+            future.cancel()
+        # A wait only times out once the deadline is spent; surface it as such
+        deadline.check()
+        raise
+
+    if not results:
+        TILED_EXTRACTIONS.inc('failed')
         return {"is_medical": False, "medications": [], "diseases": []}
+    TILED_EXTRACTIONS.inc('tiled' if len(results) == len(boxes) else 'partial')
+    merged = merge_extractions(results)
+    logger.info("Tiled extraction finished", extra={
+        'tiles': len(boxes), 'failed_tiles': len(boxes) - len(results),
+        'medications': len(merged['medications']),
+        'duration_ms': round((time.perf_counter() - started) * 1000, 2)
+    })
+    return merged
 
-def analyze_comprehensive(file_stream):
+def analyze_comprehensive(file_stream, mode=None):
     """
     Step 1: Extract data using VLM.
     Step 2: Explain extraction results using a smaller LLM for crisp summary.
     """
     try:
-        # Use dedicated analyzer key if available
-        analyzer_key = os.getenv('GROQ_API_KEY_ANALYZER') or os.getenv('GROQ_API_KEY')
-        
-        # Phase 1: Structured Extraction
-        extracted_data = analyze_with_vlm(file_stream, custom_api_key=analyzer_key)
-        
-        # Guardrail: Check if it's medical
-        if not extracted_data.get('is_medical', True):
-             return {
-                "analysis": {"medications": [], "diseases": []},
-                "summary": "Please upload a valid medical document (e.g., prescription, lab report, or doctor's notes). I am programmed to only analyze medical records and cannot process non-medical images."
-            }
-        
-        # Phase 2: User-friendly Summary
-        client = Groq(api_key=analyzer_key)
-        
-        summary_prompt = f"""
-        You are a friendly medical interpreter for a patient.
-        Given the following technical extraction from a medical document, provide a very crisp, short, and empathetic summary in simple terms.
-        
-        Technical Data:
-        Diseases/Conditions: {', '.join(extracted_data['diseases'])}
-        Medications: {json.dumps(extracted_data['medications'])}
-        
-        Instructions:
-        - Explain clinical terms (e.g., 'CAD' becomes 'heart artery blockage').
-        - Be encouraging but professional.
-        - Maximum 3-4 bullet points.
-        - End with a small disclaimer.
-        - If no data was found, say 'No specific medical details were clearly detected in the image.'
-        """
-        
-        summary_completion = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[{"role": "user", "content": summary_prompt}],
-            temperature=0.7,
-            max_tokens=512
-        )
-        
-        summary_text = summary_completion.choices[0].message.content
-        
-        return {
-            "analysis": extracted_data,
-            "summary": summary_text
-        }
-        
+        return run_comprehensive_analysis(file_stream, mode=mode)
+    except deadline.DeadlineExceeded:
+        raise
     except Exception as e:
-        print(f"COMPREHENSIVE ANALYZER ERROR: {e}")
+        logger.error("Comprehensive analysis failed", extra={'error': str(e)})
         return {
             "analysis": {"medications": [], "diseases": []},
             "summary": "An error occurred while creating your medical summary. Please try again."
         }
+
+
+def run_comprehensive_analysis(file_stream, mode=None):
+    """analyze_comprehensive without the error fallback, so job runs can record failures."""
+    with stage('upload_read'):
+        image_bytes = file_stream.read()
+    key = canonical_key(image_bytes, mode or ANALYZER_MODE)
+    return _analysis_flight.do(key, _run_comprehensive_analysis, image_bytes, mode)
+
+
+def _run_comprehensive_analysis(image_bytes, mode):
+    file_stream = io.BytesIO(image_bytes)
+    # Use dedicated analyzer key if available
+    analyzer_key = os.getenv('GROQ_API_KEY_ANALYZER') or os.getenv('GROQ_API_KEY')
+    
+    # Phase 1: Structured Extraction
+    extracted_data = extract_report(file_stream, mode=mode, custom_api_key=analyzer_key)
+    extracted_data.pop('raw_text', None)
+    
+    # Guardrail: Check if it's medical
+    if not extracted_data.get('is_medical', True):
+        return {
+            "analysis": {"medications": [], "diseases": []},
+            "summary": "Please upload a valid medical document (e.g., prescription, lab report, or doctor's notes). I am programmed to only analyze medical records and cannot process non-medical images."
+        }
+    
+    # Phase 2: User-friendly Summary. Terms in the medical lexicon are explained
+    # locally; the LLM is asked only about the ones it does not know
+    if LOCAL_SUMMARY:
+        with stage('local_summary'):
+            summary_text, unknown = summarize_report(extracted_data)
+        if unknown is None:
+            REPORT_SUMMARIES.inc('local')
+            return {"analysis": extracted_data, "summary": summary_text}
+        logger.info("Summary needs the LLM", extra={
+            'unknown_terms': len(unknown['diseases']) + len(unknown['medications']),
+        })
+        REPORT_SUMMARIES.inc('mixed' if summary_text else 'llm')
+        explained = _explain_terms(unknown, analyzer_key)
+        return {"analysis": extracted_data, "summary": complete_summary(summary_text, explained)}
+
+    REPORT_SUMMARIES.inc('llm')
+    client = get_groq_client(analyzer_key)
+    
+    summary_prompt = f"""
+    You are a friendly medical interpreter for a patient.
+    Given the following technical extraction from a medical document, provide a very crisp, short, and empathetic summary in simple terms.
+    
+    Technical Data:
+    Diseases/Conditions: {', '.join(extracted_data['diseases'])}
+    Medications: {json.dumps(extracted_data['medications'])}
+    
+    Instructions:
+    - Explain clinical terms (e.g., 'CAD' becomes 'heart artery blockage').
+    - Be encouraging but professional.
+    - Maximum 3-4 bullet points.
+    - End with a small disclaimer.
+    - If no data was found, say 'No specific medical details were clearly detected in the image.'
+    """
+    
+    summary_completion = timed_completion(
+        client,
+        model="llama-3.1-8b-instant",
+        messages=[{"role": "user", "content": summary_prompt}],
+        temperature=0.7,
+        max_tokens=512
+    )
+    
+    summary_text = summary_completion.choices[0].message.content
+    
+    return {
+        "analysis": extracted_data,
+        "summary": summary_text
+    }
+
+
+def _explain_terms(unknown, api_key):
+    """LLM bullets for just the diseases and medications the lexicon could not explain."""
+    client = get_groq_client(api_key)
+    prompt = f"""
+    You are a friendly medical interpreter for a patient.
+    Explain only these terms from their medical document in simple words.
+    
+    Diseases/Conditions: {', '.join(unknown['diseases']) or 'none'}
+    Medications: {json.dumps(unknown['medications'])}
+    
+    Instructions:
+    - One short bullet per term, starting with '• ' (e.g., 'CAD' becomes 'heart artery blockage').
+    - For a medicine, say what it is usually for and how it is to be taken.
+    - Be encouraging but professional.
+    - No introduction and no disclaimer.
+    """
+    completion = timed_completion(
+        client,
+        model="llama-3.1-8b-instant",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.7,
+        max_tokens=384
+    )
+    return completion.choices[0].message.content
+
+
+# --- Analyzer Jobs ---
+ANALYZER_JOB = 'analyzer'
+_jobs_ready = False
+_jobs_lock = threading.Lock()
+
+
+def _run_analyzer_job(payload, params):
+    return run_comprehensive_analysis(io.BytesIO(payload), mode=params.get('mode'))
+
+
+def get_analysis_jobs():
+    """
+    Job queue with the analyzer handler registered. Interrupted runs are not
+    resumed here (every worker calls this on start); the queue's lease thread
+    takes them over once their owner's lease has lapsed.
+    """
+    global _jobs_ready
+    jobs = get_job_queue()
+    if not _jobs_ready:
+        with _jobs_lock:
+            if not _jobs_ready:
+                jobs.register(ANALYZER_JOB, _run_analyzer_job)
+                jobs.start()
+                _jobs_ready = True
+    return jobs
+
+
+# --- Disease Narratives ---
+_narratives = None
+_narratives_lock = threading.Lock()
+
+
+def get_narrative_precomputer():
+    """Precompute job for per-disease narratives, started on first use unless NARRATIVE_PRECOMPUTE=0."""
+    global _narratives
+    if _narratives is None:
+        with _narratives_lock:
+            if _narratives is None:
+                from llm_router import get_health_assistant
+                from utils.admission import get_admission_controller
+                _narratives = NarrativePrecomputer(
+                    get_narrative_store(),
+                    wait_for_trends,
+                    lambda item: get_health_assistant().narrate_disease(item),
+                    busy=lambda: get_admission_controller().busy('llm'),
+                )
+                if NARRATIVE_PRECOMPUTE:
+                    _narratives.start()
+    return _narratives
+
+
+def get_disease_narratives(disease_id=None):
+    """
+    Stored narratives for the current trends, straight from the narrative store.
+    Each carries stale=True when its disease card has changed since it was
+    generated; `pending` lists diseases with no narrative yet.
+    """
+    get_narrative_precomputer()
+    trends = get_trends_data()
+    if disease_id is not None:
+        trends = [item for item in trends if str(item.get('id')) == disease_id]
+    stored = {n['id']: n for n in get_narrative_store().all()}
+    narratives, pending = [], []
+    for item in trends:
+        narrative = stored.get(str(item.get('id') or item.get('disease')))
+        if narrative is None:
+            pending.append(item.get('id'))
+            continue
+        narrative['stale'] = narrative.pop('fingerprint') != trend_fingerprint(item)
+        narratives.append(narrative)
+    return {'narratives': narratives, 'pending': pending}
@@ -0,0 +1,77 @@
+import os
+import time
+import importlib
+from utils import metrics as telemetry
+from utils.logger import get_logger
+
+logger = get_logger('warmup')
+
+WARMUP_ENABLED = os.getenv('WARMUP', '1').lower() not in ('0', 'false', 'no')
+
+STARTUP_SECONDS = telemetry.gauge('curebird_startup_seconds', 'Start-up phase durations.', ('phase',))
+
+# Heavy SDKs the request paths import lazily. Loading them before the fork lets
+# preloaded gunicorn workers share the pages instead of paying per worker.
+SHARED_IMPORTS = ('groq', 'numpy', 'groq_service', 'llm_router')
+
+_first_request_recorded = False
+
+
+def record_phase(phase, seconds):
+    STARTUP_SECONDS.set(round(seconds, 4), phase)
+    logger.info("Startup phase", extra={'phase': phase, 'duration_ms': round(seconds * 1000, 2)})
+
+
+def _timed(phase, fn):
+    started = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        # A cold cache is slower, not fatal; the request path retries on demand
+        logger.error("Warmup step failed", extra={'phase': phase, 'error': str(e)})
+    record_phase(phase, time.perf_counter() - started)
+
+
+def _import_shared():
+    for module in SHARED_IMPORTS:
+        importlib.import_module(module)
+
+
+def warm_shared():
+    """
+    Fork-safe warmup: imports and read-only data (trends mapping, medication
+    lexicon, disease retrieval index). Runs in the gunicorn master when preload_app is on.
+    Must not start threads, pools or network connections.
+    """
+    from app import services
+    from utils.medical_extractor import get_lexicon
+    from utils.disease_index import get_disease_retriever
+
+    _timed('warm_imports', _import_shared)
+    _timed('warm_trends', services.get_trends_data)
+    _timed('warm_lexicon', get_lexicon)
+    _timed('warm_disease_index', lambda: get_disease_retriever().index())
+
+
+def warm_worker():
+    """Per-process warmup after the fork: API clients, the provider router and background jobs."""
+    from app import services
+    from llm_router import get_health_assistant
+    from patient_chat_service import get_patient_service
+
+    api_key = os.getenv('GROQ_API_KEY_ANALYZER') or os.getenv('GROQ_API_KEY')
+    if api_key:
+        _timed('warm_vlm_client', lambda: services.get_groq_client(api_key))
+    _timed('warm_router', get_health_assistant)
+    _timed('warm_patient_client', get_patient_service)
+    _timed('warm_jobs', services.get_analysis_jobs)
+    # Starts the background narrative job; it waits for interactive LLM traffic before each call
+    _timed('warm_narratives', services.get_narrative_precomputer)
+
+
+def note_request(seconds):
+    """Record the first served request's latency once per process."""
+    global _first_request_recorded
+    if not _first_request_recorded:
+        _first_request_recorded = True
+        record_phase('first_request', seconds)
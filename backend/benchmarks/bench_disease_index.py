@@ -0,0 +1,91 @@
+"""
+Benchmark per-turn disease retrieval (utils.disease_index): index build time,
+query latency on the real epidemiology store and on synthetic stores of
+thousands of records, and the prompt size against the old fixed top-10 block.
+
+    cd backend
+    python -m benchmarks.bench_disease_index --records 5000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from utils.disease_index import DiseaseIndex, EPIDEMIOLOGY_STORE, format_record
+
+QUERIES = [
+    'What are the symptoms of dengue?',
+    'Is TB still spreading in India?',
+    'my blood sugar is high, what about diabetes',
+    'which infections peak during the monsoon',
+    'heart attack prevention',
+    'child diarrhoea in summer',
+    'thanks!',
+]
+
+
+def load_records():
+    with open(EPIDEMIOLOGY_STORE, 'r') as f:
+        return json.load(f)['diseases']
+
+
+def synthetic_records(base, count, seed=11):
+    """Variants of the real records with region, year and shuffled vocabulary, for scale tests."""
+    rng = random.Random(seed)
+    regions = ['Bihar', 'Kerala', 'Assam', 'Odisha', 'Punjab', 'Gujarat', 'Delhi', 'Goa', 'Sikkim', 'Tripura']
+    words = ' '.join(r.get('about', '') + ' ' + r.get('trends', '') for r in base).split()
+    records = []
+    for i in range(count):
+        record = dict(base[i % len(base)])
+        region = regions[rng.randrange(len(regions))]
+        record['name'] = f"{record['name']} - {region} {2015 + i % 10} #{i}"
+        record['about'] = f"{record.get('about', '')} {' '.join(rng.sample(words, 12))}"
+        records.append(record)
+    return records
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.95) - 1]
+
+
+def old_prompt_block(records):
+    lines = [f"{i}. {r['name']}: {r['metrics'].get('weekly_reported_cases', 0)} cases" for i, r in enumerate(records[:10], 1)]
+    return "Current Disease Trends in India:\n" + '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    base = load_records()
+    for label, records in (('store', base), ('synthetic', synthetic_records(base, args.records))):
+        start = time.perf_counter()
+        index = DiseaseIndex(records)
+        build_ms = (time.perf_counter() - start) * 1000
+        print(f"{label}: records={index.size} terms={len(index.vocabulary)} build={build_ms:.1f}ms")
+        for query in QUERIES:
+            p50, p95 = _time(lambda: index.search(query), args.repeat)
+            hits = index.search(query)
+            prompt = '\n'.join(format_record(r, detailed=i == 0) for i, (r, _) in enumerate(hits))
+            names = ', '.join(r['name'] for r, _ in hits) or '-'
+            print(f"  {query[:44]:<44} p50={p50:6.3f}ms p95={p95:6.3f}ms chars={len(prompt):5d}  {names[:70]}")
+
+    print(f"old fixed top-10 block: {len(old_prompt_block(base))} chars on every turn")
+
+
+if __name__ == '__main__':
+    main()
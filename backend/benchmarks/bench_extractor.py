@@ -0,0 +1,102 @@
+"""
+Benchmark the lexicon-backed local extractor (utils.medical_extractor).
+
+Runs every sample in benchmarks/report_corpus.json, reports precision/recall
+against the expected medications (by generic) and conditions, then measures
+throughput over a scaled corpus.
+
+    cd backend
+    python -m benchmarks.bench_extractor --repeat 2000 --output extractor_bench.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from utils.medical_extractor import extract_medical_entities, get_lexicon
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'report_corpus.json')
+
+
+def _score(found, expected):
+    found, expected = set(found), set(expected)
+    true_positive = len(found & expected)
+    precision = true_positive / len(found) if found else 1.0
+    recall = true_positive / len(expected) if expected else 1.0
+    return precision, recall, sorted(expected - found), sorted(found - expected)
+
+
+def _percentile(sorted_values, pct):
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=1000, help='Passes over the corpus for the throughput run')
+    parser.add_argument('--output', default='')
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH, 'r') as f:
+        reports = json.load(f)['reports']
+
+    started = time.perf_counter()
+    get_lexicon()
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    accuracy = []
+    for report in reports:
+        result = extract_medical_entities(report['text'])
+        generics = [m.get('generic', m['name'].lower()) for m in result['medications']]
+        med_p, med_r, med_missed, med_extra = _score(generics, report['medications'])
+        dis_p, dis_r, dis_missed, dis_extra = _score(result['diseases'], report['diseases'])
+        accuracy.append({
+            'id': report['id'],
+            'medications': {'precision': med_p, 'recall': med_r, 'missed': med_missed, 'extra': med_extra},
+            'diseases': {'precision': dis_p, 'recall': dis_r, 'missed': dis_missed, 'extra': dis_extra},
+        })
+        print(f"{report['id']:<20} meds P={med_p:.2f} R={med_r:.2f}  conditions P={dis_p:.2f} R={dis_r:.2f}"
+              + (f"  missed={med_missed + dis_missed}" if med_missed or dis_missed else ''))
+
+    texts = [r['text'] for r in reports]
+    total_bytes = sum(len(t.encode('utf-8')) for t in texts) * args.repeat
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for text in texts:
+            t0 = time.perf_counter()
+            extract_medical_entities(text)
+            latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    summary = {
+        'lexicon_compile_ms': round(compile_ms, 2),
+        'documents': len(latencies),
+        'docs_per_second': round(len(latencies) / elapsed, 1),
+        'mb_per_second': round(total_bytes / elapsed / (1024 * 1024), 2),
+        'latency_us': {
+            'p50': round(_percentile(latencies, 50) * 1e6, 1),
+            'p95': round(_percentile(latencies, 95) * 1e6, 1),
+            'p99': round(_percentile(latencies, 99) * 1e6, 1),
+        },
+        'medication_recall': round(sum(a['medications']['recall'] for a in accuracy) / len(accuracy), 3),
+        'medication_precision': round(sum(a['medications']['precision'] for a in accuracy) / len(accuracy), 3),
+        'condition_recall': round(sum(a['diseases']['recall'] for a in accuracy) / len(accuracy), 3),
+        'condition_precision': round(sum(a['diseases']['precision'] for a in accuracy) / len(accuracy), 3),
+    }
+    print(json.dumps(summary, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'summary': summary, 'accuracy': accuracy}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
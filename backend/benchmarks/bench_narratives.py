@@ -0,0 +1,80 @@
+"""
+Benchmark the disease narrative precompute job against the fake LLM server:
+one full precompute pass over the epidemiology store, a second pass with
+nothing changed, and read latency of the store-backed endpoints against
+generating a narrative on demand.
+
+    cd backend
+    python -m benchmarks.bench_narratives --latency-ms 400 --concurrency 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.fake_llm_server import FakeLLMConfig, start_fake_server
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', type=float, default=400.0)
+    parser.add_argument('--concurrency', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(latency_ms=args.latency_ms)
+    _, fake_url = start_fake_server(config)
+    workdir = tempfile.mkdtemp(prefix='curebird-narratives-')
+
+    # Must be set before the services build their clients and the store
+    os.environ['GROQ_BASE_URL'] = fake_url
+    os.environ['GROQ_API_KEY'] = 'bench-key'
+    os.environ['LLM_PROVIDERS'] = 'groq'
+    os.environ['NARRATIVE_STORE_PATH'] = os.path.join(workdir, 'narratives.sqlite3')
+    os.environ['NARRATIVE_CONCURRENCY'] = str(args.concurrency)
+    os.environ['NARRATIVE_PRECOMPUTE'] = '0'  # Passes are driven explicitly below
+    os.environ['SNAPSHOT_DIR'] = os.path.join(workdir, 'snapshots')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('RATE_LIMIT_STATIC', '1000000')
+
+    from app import create_app, services
+    from llm_router import get_health_assistant
+
+    trends = services.get_trends_data()
+    precomputer = services.get_narrative_precomputer()
+    for label in ('cold pass', 'unchanged pass'):
+        calls = config.requests
+        start = time.perf_counter()
+        stored = precomputer.refresh(trends)
+        print(f"{label}: diseases={len(trends)} stored={stored} llm_calls={config.requests - calls} "
+              f"duration={(time.perf_counter() - start) * 1000:.0f}ms")
+
+    client = create_app().test_client()
+    disease_id = trends[0]['id']
+    for path in ('/api/disease-narratives', f"/api/disease-narratives/{disease_id}"):
+        assert client.get(path).status_code == 200, path
+        p50, p95 = _time(lambda: client.get(path), args.repeat)
+        print(f"GET {path:<40} p50={p50:6.2f}ms p95={p95:6.2f}ms")
+
+    assistant = get_health_assistant()
+    p50, p95 = _time(lambda: assistant.narrate_disease(trends[0]), 5)
+    print(f"on-demand narrate_disease            p50={p50:6.0f}ms p95={p95:6.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
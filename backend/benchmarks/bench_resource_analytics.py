@@ -0,0 +1,101 @@
+"""
+Benchmark the resource-distribution analytics engine (utils.resource_analytics)
+on synthetic district-level data: table build time once per data version, and
+query latency and payload size for typical dashboard requests.
+
+    cd backend
+    python -m benchmarks.bench_resource_analytics --districts 750 --years 10
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from utils.resource_analytics import ResourceAnalytics
+
+STATES = ['Bihar', 'Kerala', 'Tamil Nadu', 'Uttar Pradesh', 'Maharashtra', 'Rajasthan', 'West Bengal',
+          'Karnataka', 'Gujarat', 'Madhya Pradesh', 'Odisha', 'Assam', 'Punjab', 'Jharkhand', 'Telangana']
+
+
+def synthetic_rows(districts, years, seed=7):
+    rng = random.Random(seed)
+    rows = []
+    for d in range(districts):
+        state = STATES[d % len(STATES)]
+        urban_beds = rng.uniform(1.0, 5.0)
+        urban_docs = rng.uniform(0.5, 3.5)
+        for y in range(years):
+            drift = 1 + 0.02 * y
+            rows.append({
+                'state': state,
+                'district': f"{state} District {d:03d}",
+                'year': 2016 + y,
+                'urban_beds_per_1000': round(urban_beds * drift, 2),
+                'rural_beds_per_1000': round(urban_beds * rng.uniform(0.05, 0.8) * drift, 2),
+                'urban_doctors_per_1000': round(urban_docs * drift, 2),
+                'rural_doctors_per_1000': round(urban_docs * rng.uniform(0.03, 0.7) * drift, 2),
+                'public_sector_share': (share := rng.randint(10, 70)),
+                'private_sector_share': 100 - share,
+                'average_cost_public': rng.randint(200, 1500),
+                'average_cost_private': rng.randint(4000, 25000),
+            })
+    return rows
+
+
+def _time(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return result, samples[len(samples) // 2], samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--districts', type=int, default=750)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.districts, args.years)
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(rows, f)
+        path = f.name
+
+    try:
+        engine = ResourceAnalytics({'district': path})
+        start = time.perf_counter()
+        table = engine.table('district')
+        build_ms = (time.perf_counter() - start) * 1000
+        print(f"rows={table.size} build={build_ms:.1f}ms (once per data version)")
+
+        last_year = 2016 + args.years - 1
+        queries = {
+            'cached table lookup': lambda: engine.table('district'),
+            'one state, latest year': lambda: table.query(states=['Kerala'], year=last_year),
+            'top 20 gap_index (all years)': lambda: table.query(sort='gap_index', limit=20,
+                                                                fields=['gap_index', 'cost_ratio']),
+            'latest year, columnar, 2 fields': lambda: table.query(year=last_year, fields=['gap_index', 'cost_ratio'],
+                                                                   columnar=True),
+            'full table': lambda: table.query(),
+        }
+        for name, fn in queries.items():
+            result, p50, p95 = _time(fn, args.repeat)
+            size = len(json.dumps(result)) if isinstance(result, dict) else 0
+            print(f"{name:<34} p50={p50:7.3f}ms p95={p95:7.3f}ms payload={size / 1024:8.1f}KB")
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
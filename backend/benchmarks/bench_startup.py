@@ -0,0 +1,86 @@
+"""
+Measure cold-start cost: module import, create_app, warmup and the first request
+to each cheap route, in fresh interpreter processes.
+
+    cd backend
+    python -m benchmarks.bench_startup --runs 5 --output startup_bench.json
+
+Runs once without warmup (what a lazily started worker pays on its first
+request) and once with the shared + per-worker warmup that wsgi.py and
+gunicorn.conf.py perform before a worker takes traffic.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app()
+t2 = time.perf_counter()
+warm = sys.argv[1] == '1'
+if warm:
+    from app.warmup import warm_shared, warm_worker
+    warm_shared()
+    warm_worker()
+t3 = time.perf_counter()
+client = app.test_client()
+first = {}
+for path in ('/api/disease-trends', '/api/resource-distribution', '/api/health-assistant/providers'):
+    s = time.perf_counter()
+    client.get(path)
+    first[path] = (time.perf_counter() - s) * 1000
+heavy = [m for m in ('pandas', 'groq', 'google.generativeai', 'PIL.Image', 'pytesseract', 'numpy') if m in sys.modules]
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'create_app_ms': (t2 - t1) * 1000,
+                  'warmup_ms': (t3 - t2) * 1000, 'first_request_ms': first, 'heavy_modules_loaded': heavy}))
+"""
+
+
+def _probe(warm):
+    env = dict(os.environ, LOG_LEVEL='WARNING', JOB_DIR=os.environ.get('JOB_DIR', os.path.join(BACKEND_DIR, 'jobs')))
+    env.setdefault('GROQ_API_KEY', 'bench-key')
+    env.setdefault('LLM_PROVIDERS', 'groq')
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, '1' if warm else '0'],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _summarise(samples):
+    summary = {key: round(statistics.median(s[key] for s in samples), 2)
+               for key in ('import_ms', 'create_app_ms', 'warmup_ms')}
+    summary['first_request_ms'] = {
+        path: round(statistics.median(s['first_request_ms'][path] for s in samples), 2)
+        for path in samples[0]['first_request_ms']
+    }
+    summary['heavy_modules_loaded'] = samples[-1]['heavy_modules_loaded']
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', default='')
+    args = parser.parse_args()
+
+    report = {}
+    for label, warm in (('cold', False), ('warmed', True)):
+        report[label] = _summarise([_probe(warm) for _ in range(args.runs)])
+        print(label, json.dumps(report[label], indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
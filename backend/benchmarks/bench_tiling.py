@@ -0,0 +1,70 @@
+"""
+Benchmark tiled report extraction against the fake LLM server: a synthetic
+tall, high-resolution page extracted whole (`mode=vlm`) and in overlapping
+bands (`mode=tiled`), reporting wall time, upstream calls and merged counts.
+
+    cd backend
+    python -m benchmarks.bench_tiling --latency-ms 600 --height 7000
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.fake_llm_server import FakeLLMConfig, start_fake_server
+
+
+def _page(width, height):
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    for row, top in enumerate(range(40, height - 40, 48)):
+        draw.text((60, top), f"{row + 1}. Tab Metformin 500 mg  1-0-1 after food", fill='black')
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', type=float, default=600.0)
+    parser.add_argument('--width', type=int, default=2480)
+    parser.add_argument('--height', type=int, default=7000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(latency_ms=args.latency_ms)
+    _, fake_url = start_fake_server(config)
+
+    # Must be set before the services build their Groq clients
+    os.environ['GROQ_BASE_URL'] = fake_url
+    os.environ['GROQ_API_KEY'] = 'bench-key'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from app import services
+    from utils.report_tiles import plan_bands
+
+    _, boxes, _ = plan_bands(_page(args.width, args.height))
+    print(f"page {args.width}x{args.height}: {len(boxes) or 1} band(s)")
+    for mode in ('vlm', 'tiled'):
+        samples = []
+        for i in range(args.repeat):
+            # A fresh page per run so single-flight never shares a result
+            image_bytes = _page(args.width, args.height + i)
+            calls = config.requests
+            start = time.perf_counter()
+            result = services.extract_report(io.BytesIO(image_bytes), mode=mode)
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        print(f"mode={mode:<6} p50={samples[len(samples) // 2]:7.0f}ms llm_calls/page={config.requests - calls} "
+              f"medications={len(result['medications'])} diseases={len(result['diseases'])}")
+
+
+if __name__ == '__main__':
+    main()
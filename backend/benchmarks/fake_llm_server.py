@@ -0,0 +1,199 @@
+"""
+OpenAI/Groq-compatible fake chat-completions server for local benchmarking.
+
+Point the Groq SDK at it with GROQ_BASE_URL=http://127.0.0.1:<port>. Latency,
+token rate and error rate are configurable so backend overhead can be measured
+without touching live APIs.
+
+    python -m benchmarks.fake_llm_server --port 8089 --latency-ms 200 --tokens-per-second 400 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Canned JSON body that satisfies the analyzer (VLM), disease-insight and disease-narrative schemas
+JSON_REPLY = {
+    "summary": "Cases are holding near last year's level, with the usual seasonal peak.",
+    "is_medical": True,
+    "medications": [
+        {"name": "Metformin", "dosage": "500 mg", "frequency": "BD"},
+        {"name": "Amlodipine", "dosage": "5 mg", "frequency": "OD"},
+    ],
+    "diseases": ["Type 2 Diabetes", "Hypertension"],
+    "patientView": {
+        "title": "Levels are steady",
+        "explanation": "Your readings are holding within a similar range.",
+        "action": "Keep up your daily walk.",
+    },
+    "doctorView": {"points": ["Stable mean", "Low variance", "No acute risk"]},
+}
+
+TEXT_REPLY = (
+    "### Summary\n\n- **Point**: This is a benchmark reply from the fake LLM server.\n\n"
+    "*Note: Consult a qualified healthcare professional for personalized advice.*"
+)
+
+
+class FakeLLMConfig:
+    def __init__(self, latency_ms=150.0, jitter_ms=0.0, tokens_per_second=500.0,
+                 completion_tokens=120, error_rate=0.0, error_status=500):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def count(self, error):
+        with self._lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+
+
+def _estimate_tokens(messages):
+    chars = 0
+    for message in messages or []:
+        content = message.get('content')
+        if isinstance(content, list):
+            chars += sum(len(part.get('text', '')) for part in content if isinstance(part, dict))
+        else:
+            chars += len(content or '')
+    return max(1, chars // 4)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            return self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model"}]})
+        self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            return self._send_json(404, {"error": {"message": "not found"}})
+
+        config = self.config
+        failed = random.random() < config.error_rate
+        config.count(failed)
+
+        delay = config.latency_ms + random.uniform(0, config.jitter_ms)
+        time.sleep(delay / 1000.0)
+
+        if failed:
+            return self._send_json(config.error_status, {
+                "error": {"message": "injected failure", "type": "server_error", "code": config.error_status}
+            })
+
+        wants_json = (request.get('response_format') or {}).get('type') == 'json_object'
+        content = json.dumps(JSON_REPLY) if wants_json else TEXT_REPLY
+        completion_tokens = min(config.completion_tokens, request.get('max_tokens') or config.completion_tokens)
+        prompt_tokens = _estimate_tokens(request.get('messages'))
+        model = request.get('model', 'fake-model')
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        generation_seconds = completion_tokens / config.tokens_per_second if config.tokens_per_second else 0
+
+        if request.get('stream'):
+            return self._stream(completion_id, model, content, generation_seconds)
+
+        time.sleep(generation_seconds)
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _stream(self, completion_id, model, content, generation_seconds):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        pieces = content.split(' ')
+        pause = generation_seconds / max(len(pieces), 1)
+        for index, piece in enumerate(pieces):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece + (' ' if index < len(pieces) - 1 else '')}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(pause)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def start_fake_server(config=None, host='127.0.0.1', port=0):
+    """Start the server on a daemon thread. Returns (server, base_url)."""
+    config = config or FakeLLMConfig()
+    handler = type('FakeLLMHandler', (_Handler,), {'config': config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=150.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--tokens-per-second', type=float, default=500.0)
+    parser.add_argument('--completion-tokens', type=int, default=120)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=500)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(args.latency_ms, args.jitter_ms, args.tokens_per_second,
+                           args.completion_tokens, args.error_rate, args.error_status)
+    handler = type('FakeLLMHandler', (_Handler,), {'config': config})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Fake LLM server on http://{args.host}:{args.port} (set GROQ_BASE_URL to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""
+Load-test every route in app/routes.py against a local fake LLM server.
+
+Starts benchmarks.fake_llm_server, points the Groq SDK at it via GROQ_BASE_URL,
+serves the Flask app on a local port and drives each endpoint at the requested
+concurrency levels. Reports throughput, p50/p95/p99 latency and process memory
+per endpoint and writes the results as JSON for release-to-release comparison.
+
+    cd backend
+    python -m benchmarks.run_benchmarks --concurrency 1,8,32 --requests 200 --output bench_results.json
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.fake_llm_server import FakeLLMConfig, start_fake_server
+
+
+def _sample_image():
+    """Small PNG upload; falls back to raw bytes when Pillow is not installed."""
+    try:
+        from PIL import Image, ImageDraw
+        image = Image.new('RGB', (800, 1000), 'white')
+        draw = ImageDraw.Draw(image)
+        for row, line in enumerate(["Rx", "1. Metformin 500 mg BD", "2. Amlodipine 5 mg OD", "Dx: T2DM, HTN"]):
+            draw.text((40, 40 + row * 30), line, fill='black')
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        return buffer.getvalue()
+    except ImportError:
+        return b'\x89PNG\r\n\x1a\n' + os.urandom(64 * 1024)
+
+
+def _metrics_payload(seed):
+    rng = random.Random(seed)
+    return [
+        {'value': round(rng.uniform(90, 180), 1), 'unit': 'mg/dL', 'timestamp': f'2025-01-{day:02d}'}
+        for day in range(1, 11)
+    ]
+
+
+def build_endpoints(image_bytes):
+    """(name, method, path, kwargs_factory) for every blueprint route."""
+    def upload(_):
+        return {'files': {'file': ('report.png', image_bytes, 'image/png')}}
+
+    return [
+        ('disease-trends', 'GET', '/api/disease-trends', lambda i: {}),
+        ('resource-distribution', 'GET', '/api/resource-distribution', lambda i: {}),
+        ('health-assistant-context', 'GET', '/api/health-assistant/context', lambda i: {}),
+        ('metrics', 'GET', '/metrics', lambda i: {}),
+        ('health-assistant-chat', 'POST', '/api/health-assistant/chat',
+         lambda i: {'json': {'message': 'What are the common symptoms of dengue fever in adults?', 'conversation_id': f'bench_{i}'}}),
+        ('health-assistant-clear', 'POST', '/api/health-assistant/clear',
+         lambda i: {'json': {'conversation_id': f'bench_{i}'}}),
+        ('patient-reply', 'POST', '/api/chat/patient-reply',
+         lambda i: {'json': {'history': [{'sender': 'doctor', 'text': 'How are you feeling today?'}],
+                             'patientContext': {'patient': 'Asha', 'condition': 'Type 2 Diabetes', 'status': 'stable'}}}),
+        ('disease-insight', 'POST', '/api/disease-insight',
+         lambda i: {'json': {'disease': {'name': 'Type 2 Diabetes'}, 'metrics': _metrics_payload(i)}}),
+        ('disease-insight-batch', 'POST', '/api/disease-insight/batch',
+         lambda i: {'json': {'items': [
+             {'disease': {'name': name}, 'metrics': _metrics_payload(i * 10 + n)}
+             for n, name in enumerate(['Type 2 Diabetes', 'Hypertension', 'CKD'])
+         ]}}),
+        ('analyze-report', 'POST', '/api/analyze-report', upload),
+        ('analyzer-process', 'POST', '/api/analyzer/process', upload),
+    ]
+
+
+def _rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 if sys.platform != 'darwin' else peak / (1024 * 1024)
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def run_endpoint(base_url, endpoint, concurrency, total_requests, timeout):
+    import requests
+
+    name, method, path, make_kwargs = endpoint
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return local.session
+
+    def one(index):
+        start = time.perf_counter()
+        try:
+            response = session().request(method, base_url + path, timeout=timeout, **make_kwargs(index))
+            response.content
+            status = response.status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        return time.perf_counter() - start, status
+
+    one(-1)  # Warm the route (imports, caches) outside the measured window
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, range(total_requests)))
+    elapsed = time.perf_counter() - started
+    rss_after = _rss_mb()
+
+    latencies = sorted(s[0] for s in samples)
+    statuses = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = sum(count for status, count in statuses.items() if status.isdigit() and int(status) < 400)
+
+    return {
+        'endpoint': name,
+        'method': method,
+        'path': path,
+        'concurrency': concurrency,
+        'requests': total_requests,
+        'success_rate': ok / total_requests if total_requests else 0.0,
+        'statuses': statuses,
+        'throughput_rps': total_requests / elapsed if elapsed else None,
+        'latency_ms': {
+            'p50': _percentile(latencies, 50) * 1000,
+            'p95': _percentile(latencies, 95) * 1000,
+            'p99': _percentile(latencies, 99) * 1000,
+            'mean': sum(latencies) / len(latencies) * 1000,
+            'max': latencies[-1] * 1000,
+        },
+        'memory_mb': {
+            'rss_before': round(rss_before, 2),
+            'rss_after': round(rss_after, 2),
+            'rss_delta': round(rss_after - rss_before, 2),
+        },
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_backend(host='127.0.0.1'):
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server(host, 0, create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', default='1,8,32', help='Comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per endpoint per level')
+    parser.add_argument('--endpoints', default='', help='Comma-separated endpoint names (default: all)')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--latency-ms', type=float, default=150.0, help='Fake LLM base latency')
+    parser.add_argument('--jitter-ms', type=float, default=50.0)
+    parser.add_argument('--tokens-per-second', type=float, default=500.0)
+    parser.add_argument('--completion-tokens', type=int, default=120)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--output', default='bench_results.json')
+    args = parser.parse_args()
+
+    fake_config = FakeLLMConfig(args.latency_ms, args.jitter_ms, args.tokens_per_second,
+                                args.completion_tokens, args.error_rate)
+    fake_server, fake_url = start_fake_server(fake_config)
+
+    # Must be set before the services build their clients
+    os.environ['GROQ_BASE_URL'] = fake_url
+    for key in ('GROQ_API_KEY', 'GROQ_API_KEY_VISION', 'GROQ_API_KEY_ANALYZER'):
+        os.environ[key] = 'bench-key'
+    os.environ.setdefault('GEMINI_API_KEY', 'bench-key')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Only the Groq client honours GROQ_BASE_URL; a Gemini fallback would leave the fake server
+    os.environ.setdefault('LLM_PROVIDERS', 'groq')
+    # Every benchmark request comes from one client; lift the per-client rate limits
+    # so the run measures the concurrency limits instead
+    for key in ('RATE_LIMIT_LLM', 'RATE_LIMIT_VLM', 'RATE_LIMIT_STATIC'):
+        os.environ.setdefault(key, '1000000')
+
+    backend_server, backend_url = start_backend()
+
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+    selected = {name.strip() for name in args.endpoints.split(',') if name.strip()}
+    endpoints = [e for e in build_endpoints(_sample_image()) if not selected or e[0] in selected]
+
+    results = []
+    for endpoint in endpoints:
+        for level in levels:
+            result = run_endpoint(backend_url, endpoint, level, args.requests, args.timeout)
+            results.append(result)
+            latency = result['latency_ms']
+            print(f"{result['endpoint']:<26} c={level:<4} {result['throughput_rps']:>9.1f} rps  "
+                  f"p50={latency['p50']:>8.1f}ms p95={latency['p95']:>8.1f}ms p99={latency['p99']:>8.1f}ms  "
+                  f"ok={result['success_rate']:.0%} rss={result['memory_mb']['rss_after']:.0f}MB")
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'requests_per_level': args.requests,
+            'concurrency_levels': levels,
+            'fake_llm': {
+                'latency_ms': args.latency_ms,
+                'jitter_ms': args.jitter_ms,
+                'tokens_per_second': args.tokens_per_second,
+                'completion_tokens': args.completion_tokens,
+                'error_rate': args.error_rate,
+                'requests_served': fake_config.requests,
+                'errors_injected': fake_config.errors,
+            },
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    backend_server.shutdown()
+    fake_server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
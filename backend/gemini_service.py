@@ -1,12 +1,31 @@
 import os
-import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
 import google.generativeai as genai
-from datetime import datetime
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from utils import metrics as telemetry
+from utils import deadline
+from utils.disease_index import get_disease_retriever
+from utils.logger import get_logger
 
 # Load environment variables explicitly
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 
+logger = get_logger('gemini_service')
+GEMINI_MODEL = 'gemini-2.0-flash'
+
+# --- Session Configuration ---
+MAX_CONVERSATIONS = int(os.getenv('GEMINI_MAX_CONVERSATIONS', 500))
+CONVERSATION_TTL = int(os.getenv('GEMINI_CONVERSATION_TTL', 3600))  # Idle seconds before a chat expires
+MAX_HISTORY_MESSAGES = int(os.getenv('GEMINI_MAX_HISTORY_MESSAGES', 40))  # user + model messages kept per chat
+# Provider-side context caching is opt-in: it needs a model version that supports
+# it and a prompt above the provider's minimum cached token count.
+CONTEXT_CACHE_ENABLED = os.getenv('GEMINI_CONTEXT_CACHE', '').lower() in ('1', 'true', 'yes')
+CONTEXT_CACHE_TTL = int(os.getenv('GEMINI_CONTEXT_CACHE_TTL', 3600))
+
 class GeminiHealthAssistant:
     def __init__(self):
         """Initialize Gemini 2.0 Flash for health assistance."""
@@ -16,67 +35,154 @@ class GeminiHealthAssistant:
         
         genai.configure(api_key=api_key)
         
-        # Use Gemini 2.0 Flash (available for this key)
-        self.model = genai.GenerativeModel(
-            model_name='gemini-2.0-flash',
-            generation_config={
-                'temperature': 0.7,
-                'top_p': 0.95,
-                'top_k': 40,
-                'max_output_tokens': 2048,
+        # Shared model settings; the system prompt is attached per prompt version
+        self.generation_config = {
+            'temperature': 0.7,
+            'top_p': 0.95,
+            'top_k': 40,
+            'max_output_tokens': 2048,
+        }
+        self.safety_settings = [
+            {
+                "category": "HARM_CATEGORY_HARASSMENT",
+                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
             },
-            safety_settings=[
-                {
-                    "category": "HARM_CATEGORY_HARASSMENT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_HATE_SPEECH",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                }
-            ]
-        )
-        
-        # Initialize conversation history
-        self.conversations = {}
+            {
+                "category": "HARM_CATEGORY_HATE_SPEECH",
+                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+            },
+            {
+                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+            },
+            {
+                "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+            }
+        ]
+
+        # prompt version -> GenerativeModel carrying that system_instruction
+        self._models = {}
+        self._models_lock = threading.Lock()
+
+        # Initialize conversation history: conversation_id -> (ChatSession, last_used), LRU ordered
+        self.conversations = OrderedDict()
+        self._conversations_lock = threading.Lock()
+        telemetry.CONVERSATIONS.set_function(lambda: len(self.conversations), 'gemini')
+
+    def _send(self, chat, content):
+        """send_message with duration and token metrics."""
+        # Bounded by the router's per-attempt timeout and the request deadline, if any
+        timeout = deadline.attempt_timeout()
+        start = time.perf_counter()
+        try:
+            with telemetry.stage('llm_call'):
+                response = chat.send_message(content, request_options={'timeout': timeout} if timeout else None)
+        except Exception:
+            telemetry.LLM_LATENCY.observe(time.perf_counter() - start, 'gemini', GEMINI_MODEL, 'error')
+            raise
+        duration = time.perf_counter() - start
+        telemetry.LLM_LATENCY.observe(duration, 'gemini', GEMINI_MODEL, 'ok')
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None:
+            telemetry.record_tokens('gemini', GEMINI_MODEL, getattr(usage, 'prompt_token_count', 0) or 0,
+                                    getattr(usage, 'candidates_token_count', 0) or 0)
+        return response
     
-    def load_disease_context(self):
-        """Load current disease trends from cache."""
+    def _model_for_prompt(self, system_prompt):
+        """
+        Return the GenerativeModel for this prompt version, building it once.
+        The prompt travels as system_instruction (or provider-side cached content)
+        instead of an extra bootstrap turn.
+        """
+        version = hashlib.sha1(system_prompt.encode('utf-8')).hexdigest()[:12]
+        model = self._models.get(version)
+        if model is not None:
+            return model
+
+        with self._models_lock:
+            model = self._models.get(version)
+            if model is None:
+                model = self._build_cached_model(system_prompt, version) if CONTEXT_CACHE_ENABLED else None
+                if model is None:
+                    model = genai.GenerativeModel(
+                        model_name=GEMINI_MODEL,
+                        generation_config=self.generation_config,
+                        safety_settings=self.safety_settings,
+                        system_instruction=system_prompt,
+                    )
+                # Only the current prompt version is needed; older ones belong to expired days
+                self._models = {version: model}
+                logger.info("Gemini prompt version built", extra={'version': version})
+        return model
+
+    def _build_cached_model(self, system_prompt, version):
+        """Best-effort provider-side context cache; returns None when unsupported."""
         try:
-            cache_file = os.path.join(os.path.dirname(__file__), 'disease_data_cache.json')
-            with open(cache_file, 'r') as f:
-                data = json.load(f)
-            
-            # Data is an array of disease objects
-            diseases = data[:10] if isinstance(data, list) else []
-            
-            context = "Current Disease Trends in India:\n"
-            for i, disease in enumerate(diseases, 1):
-                name = disease.get('disease', 'Unknown')
-                cases = disease.get('outbreaks', 0)
-                year = disease.get('year', 'N/A')
-                context += f"{i}. {name}: {cases:,} cases ({year})\n"
-            
-            return context
+            from google.generativeai import caching
+            cached = caching.CachedContent.create(
+                model=f"models/{GEMINI_MODEL}",
+                display_name=f"curebird-system-{version}",
+                system_instruction=system_prompt,
+                ttl=timedelta(seconds=CONTEXT_CACHE_TTL),
+            )
+            return genai.GenerativeModel.from_cached_content(
+                cached_content=cached,
+                generation_config=self.generation_config,
+                safety_settings=self.safety_settings,
+            )
         except Exception as e:
-            print(f"Error loading disease context: {e}")
-            return "Disease trend data temporarily unavailable."
-    
+            logger.warning("Gemini context cache unavailable", extra={'error': str(e)})
+            return None
+
+    def _evict_expired(self):
+        """Drop idle sessions past CONVERSATION_TTL and trim to MAX_CONVERSATIONS (LRU)."""
+        cutoff = time.time() - CONVERSATION_TTL
+        while self.conversations:
+            oldest_id, (_, last_used) = next(iter(self.conversations.items()))
+            if last_used >= cutoff and len(self.conversations) <= MAX_CONVERSATIONS:
+                break
+            self.conversations.pop(oldest_id)
+
+    def _get_chat(self, conversation_id, history=None):
+        with self._conversations_lock:
+            self._evict_expired()
+            entry = self.conversations.get(conversation_id)
+            if entry is None or history is not None:
+                model = self._model_for_prompt(self.create_system_prompt())
+                chat = model.start_chat(history=history or [])
+            else:
+                chat = entry[0]
+            self.conversations[conversation_id] = (chat, time.time())
+            self.conversations.move_to_end(conversation_id)
+            return chat
+
+    def _send_grounded(self, chat, user_message):
+        """
+        Send the turn with retrieved disease records as a leading part, then
+        store only the user's text in history so records are not re-sent on
+        every later turn.
+        """
+        previous = [c.parts[0].text for c in reversed(chat.history) if c.role == 'user' and c.parts][:1]
+        context = get_disease_retriever().context_for(user_message, *previous)
+        if not context:
+            return self._send(chat, user_message)
+        response = self._send(chat, [context, user_message])
+        history = chat.history
+        if len(history) >= 2 and history[-2].role == 'user':
+            history[-2] = genai.protos.Content(role='user', parts=[genai.protos.Part(text=user_message)])
+            chat.history = history
+        return response
+
+    def _trim_history(self, chat):
+        if len(chat.history) > MAX_HISTORY_MESSAGES:
+            # Keep whole user/model pairs so the history still starts on a user turn
+            chat.history = chat.history[-(MAX_HISTORY_MESSAGES - MAX_HISTORY_MESSAGES % 2):]
+
     def create_system_prompt(self):
-        """Create system prompt with disease context."""
-        disease_context = self.load_disease_context()
-        
+        """Create the static system prompt; relevant disease data is sent with each turn."""
         return f"""You are a Health Assistant AI for Curebird, India's premier medical intelligence platform.
-
-{disease_context}
+When a message includes surveillance data for India, ground any figures you quote in it.
 
 Your Role:
 - Provide accurate, evidence-based medical information
@@ -107,20 +213,12 @@ Remember: You are an informational assistant, not a replacement for professional
             if conversation_id is None:
                 conversation_id = f"conv_{datetime.now().timestamp()}"
             
-            if conversation_id not in self.conversations:
-                # Start new conversation with system prompt
-                self.conversations[conversation_id] = self.model.start_chat(history=[])
-                
-                # Send system prompt as first message
-                system_prompt = self.create_system_prompt()
-                self.conversations[conversation_id].send_message(
-                    f"[SYSTEM CONTEXT - Do not respond to this, just acknowledge]\n{system_prompt}"
-                )
+            # New conversations carry the system prompt as system_instruction; no bootstrap turn
+            chat = self._get_chat(conversation_id)
             
-            chat = self.conversations[conversation_id]
-            
-            # Send user message and get response
-            response = chat.send_message(user_message)
+            # Send user message, with the disease records relevant to it, and get response
+            response = self._send_grounded(chat, user_message)
+            self._trim_history(chat)
             
             return {
                 'success': True,
@@ -130,7 +228,7 @@ Remember: You are an informational assistant, not a replacement for professional
             }
         
         except Exception as e:
-            print(f"Error generating response: {e}")
+            logger.error("Error generating response", extra={'error': str(e)})
             return {
                 'success': False,
                 'error': str(e),
@@ -138,40 +236,21 @@ Remember: You are an informational assistant, not a replacement for professional
                 'conversation_id': conversation_id
             }
     
-    def get_disease_context(self):
-        """Get formatted disease context for frontend display."""
-        try:
-            cache_file = os.path.join(os.path.dirname(__file__), 'disease_data_cache.json')
-            with open(cache_file, 'r') as f:
-                data = json.load(f)
-            
-            # Data is an array, format it for frontend
-            diseases = []
-            for disease in data[:10]:
-                diseases.append({
-                    'name': disease.get('disease', 'Unknown'),
-                    'cases': disease.get('outbreaks', 0),
-                    'risk_level': 'High' if disease.get('outbreaks', 0) > 100000 else 'Medium' if disease.get('outbreaks', 0) > 10000 else 'Low',
-                    'year': disease.get('year', 'N/A')
-                })
-            
-            return {
-                'success': True,
-                'diseases': diseases,
-                'last_updated': 'Recently'
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e)
-            }
-    
+    def import_history(self, conversation_id, turns):
+        """Seed a conversation with prior user/assistant turns (used on provider failover)."""
+        history = [
+            {'role': 'user' if turn['role'] == 'user' else 'model', 'parts': [turn['content']]}
+            for turn in turns[-MAX_HISTORY_MESSAGES:]
+        ]
+        # Gemini histories must open on a user turn
+        while history and history[0]['role'] != 'user':
+            history.pop(0)
+        self._get_chat(conversation_id, history=history)
+
     def clear_conversation(self, conversation_id):
         """Clear a specific conversation history."""
-        if conversation_id in self.conversations:
-            del self.conversations[conversation_id]
-            return True
-        return False
+        with self._conversations_lock:
+            return self.conversations.pop(conversation_id, None) is not None
 
 # Global singleton instance
 _health_assistant = None
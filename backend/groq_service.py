@@ -1,14 +1,51 @@
 import os
-import json
 import time
 import random
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from groq import Groq, RateLimitError, APIError
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
+from utils.trend_features import compute_trend_features, fingerprint, features_moved, describe_features
+from utils import metrics as telemetry
+from utils.single_flight import SingleFlight, canonical_key
+from utils.token_ledger import get_token_ledger, attribute
+from utils.disease_index import get_disease_retriever
+from utils.structured_output import Field, structured_completion
+from utils import deadline
+from utils.logger import get_logger
 
 # Load environment variables explicitly
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 
+logger = get_logger('groq_service')
+
+# --- Disease Insight Cache Configuration ---
+INSIGHT_CACHE_SIZE = int(os.getenv('INSIGHT_CACHE_SIZE', 512))
+INSIGHT_CACHE_TTL = int(os.getenv('INSIGHT_CACHE_TTL', 6 * 3600))  # Fresh window (seconds)
+INSIGHT_CHANGE_THRESHOLD = float(os.getenv('INSIGHT_CHANGE_THRESHOLD', 0.1))  # Relative feature drift
+INSIGHT_BATCH_CONCURRENCY = int(os.getenv('INSIGHT_BATCH_CONCURRENCY', 4))
+
+# Dual-view disease insight returned by analyze_disease_progress
+INSIGHT_FIELDS = {
+    'patientView': Field('object', required=True, aliases=('patient_view', 'patient'), fields={
+        'title': Field('str', required=True),
+        'explanation': Field('str', required=True, aliases=('summary',)),
+        'action': Field('str', default='', aliases=('recommendation',)),
+    }),
+    'doctorView': Field('object', required=True, aliases=('doctor_view', 'doctor'), fields={
+        'points': Field('list', required=True, aliases=('observations',), items=Field('str')),
+    }),
+}
+
+# Precomputed per-disease narrative (see utils/narrative_store.py): a dashboard summary plus the insight views
+NARRATIVE_FIELDS = {
+    'summary': Field('str', required=True, aliases=('overview',)),
+    **INSIGHT_FIELDS,
+}
+
 class GroqHealthAssistant:
     def __init__(self):
         """Initialize Groq for health assistance."""
@@ -24,49 +61,24 @@ class GroqHealthAssistant:
         
         # Initialize conversation history
         self.conversations = {}
+        telemetry.CONVERSATIONS.set_function(lambda: len(self.conversations), 'groq')
         
-        # Cache disease context
-        self.disease_context_cache = None
-        self.context_last_loaded = None
-        self._load_disease_context_cache()
+        # Disease insight memo: fingerprint -> entry, plus latest entry per disease
+        self._insight_cache = OrderedDict()
+        self._insight_latest = {}
+        self._insight_lock = threading.Lock()
 
-    def _load_disease_context_cache(self):
-        """Load and cache disease context to reduce I/O."""
-        try:
-            cache_file = os.path.join(os.path.dirname(__file__), 'disease_data_cache.json')
-            if not os.path.exists(cache_file):
-                 self.disease_context_cache = "Disease trend data temporarily unavailable."
-                 return
+        # Identical insight requests already in flight share one upstream call (the router coalesces chat)
+        self._insight_flight = SingleFlight('groq_insight')
+
+        # Disease records are retrieved per turn instead of pasted into every prompt
+        self.retriever = get_disease_retriever()
 
-            with open(cache_file, 'r') as f:
-                data = json.load(f)
-            
-            # Data is an array of disease objects
-            diseases = data[:10] if isinstance(data, list) else []
-            
-            context = "Current Disease Trends in India:\n"
-            for i, disease in enumerate(diseases, 1):
-                name = disease.get('disease', 'Unknown')
-                cases = disease.get('outbreaks', 0)
-                year = disease.get('year', 'N/A')
-                context += f"{i}. {name}: {cases:,} cases ({year})\n"
-            
-            self.disease_context_cache = context
-            self.context_last_loaded = datetime.now()
-        except Exception as e:
-            print(f"Error loading disease context: {e}")
-            self.disease_context_cache = "Disease trend data temporarily unavailable."
-    
     def create_system_prompt(self):
-        """Create system prompt with cached disease context."""
-        # Refresh cache if older than 24 hours (optional, but good practice)
-        if not self.disease_context_cache:
-            self._load_disease_context_cache()
-            
+        """Create the static system prompt; disease data is added per turn by _turn_messages."""
         ist = timezone(timedelta(hours=5, minutes=30))
         return f"""You are a highly professional, reliable, and empathetic AI assistant for Curebird, known as Cure AI.
-
-{self.disease_context_cache}
+When a turn includes surveillance data for India, ground any figures you quote in it.
 
 ────────────────────────
 GREETING BEHAVIOR (CRITICAL BRAND RULE)
@@ -129,6 +141,18 @@ MEDICAL SAFETY RULES
 Current Date: {datetime.now(ist).strftime('%B %d, %Y')}
 """
 
+    def _turn_messages(self, history):
+        """
+        Messages for this call: the history with the disease records relevant to
+        the latest user turn placed just before it. The records are not kept in
+        history, so later turns only pay for what they retrieve themselves.
+        """
+        user_turns = [m['content'] for m in reversed(history) if m['role'] == 'user'][:2]
+        context = self.retriever.context_for(*user_turns)
+        if not context:
+            return history
+        return history[:-1] + [{"role": "system", "content": context}, history[-1]]
+
     def _determine_model(self, user_message):
         """
         Intent-based routing:
@@ -153,23 +177,36 @@ Current Date: {datetime.now(ist).strftime('%B %d, %Y')}
         return self.MODEL_70B
 
     def generate_response(self, user_message, conversation_id=None):
-        """Generate response with retry logic and model fallback."""
+        """
+        Generate response with retry logic and model fallback. Duplicate turns
+        are coalesced by the provider router in front of this assistant.
+        """
         ist = timezone(timedelta(hours=5, minutes=30))
         
         # Create or get conversation
         if conversation_id is None:
             conversation_id = f"conv_{datetime.now(ist).timestamp()}"
-        
+
+        with attribute(conversation=conversation_id):
+            return self._complete_turn(user_message, conversation_id)
+
+    def _complete_turn(self, user_message, conversation_id):
         if conversation_id not in self.conversations:
             self.conversations[conversation_id] = [
                 {"role": "system", "content": self.create_system_prompt()}
             ]
         
-        # Add user message to history
-        self.conversations[conversation_id].append({"role": "user", "content": user_message})
+        # Add user message to history. Held locally: a turn abandoned by the router may finish after clear_conversation
+        history = self.conversations[conversation_id]
+        history.append({"role": "user", "content": user_message})
+        with telemetry.stage('prompt_build'):
+            messages = self._turn_messages(history)
         
-        # Determine initial model
+        # Determine initial model; conversations or clients over their token budget get 8B
         target_model = self._determine_model(user_message)
+        if target_model == self.MODEL_70B and get_token_ledger().should_downgrade():
+            telemetry.LLM_FALLBACKS.inc('groq', self.MODEL_70B, self.MODEL_8B)
+            target_model = self.MODEL_8B
         
         # Retry logic parameters
         max_retries = 3
@@ -177,9 +214,10 @@ Current Date: {datetime.now(ist).strftime('%B %d, %Y')}
         
         for attempt in range(max_retries + 1):
             try:
-                completion = self.client.chat.completions.create(
+                completion = telemetry.timed_completion(
+                    self.client,
                     model=target_model,
-                    messages=self.conversations[conversation_id],
+                    messages=messages,
                     temperature=0.7,
                     max_tokens=400, # Reduced limit
                     top_p=1,
@@ -189,7 +227,7 @@ Current Date: {datetime.now(ist).strftime('%B %d, %Y')}
                 response_text = completion.choices[0].message.content
                 
                 # Add AI response to history
-                self.conversations[conversation_id].append({"role": "assistant", "content": response_text})
+                history.append({"role": "assistant", "content": response_text})
                 
                 return {
                     'success': True,
@@ -199,19 +237,25 @@ Current Date: {datetime.now(ist).strftime('%B %d, %Y')}
                 }
             
             except (RateLimitError, APIError) as e:
-                print(f"[Attempt {attempt+1}] Error with model {target_model}: {e}")
+                logger.warning("Chat completion failed", extra={'attempt': attempt + 1, 'model': target_model, 'error': str(e)})
                 
                 # If we hit a rate limit or error on 70B, switch to 8B for the next attempt
                 if target_model == self.MODEL_70B:
-                    print("Switching to fallback model (8B)...")
+                    logger.info("Switching to fallback model", extra={'model': self.MODEL_8B})
+                    telemetry.LLM_FALLBACKS.inc('groq', self.MODEL_70B, self.MODEL_8B)
                     target_model = self.MODEL_8B
                 
-                if attempt < max_retries:
-                    sleep_time = base_delay * (2 ** attempt) + random.uniform(0, 1)
-                    time.sleep(sleep_time)
+                sleep_time = base_delay * (2 ** attempt) + random.uniform(0, 1)
+                # Skip retries the request deadline leaves no time for
+                if attempt < max_retries and deadline.allows_retry(sleep_time):
+                    telemetry.LLM_RETRIES.inc('groq', target_model)
+                    try:
+                        deadline.sleep(sleep_time)
+                    except deadline.Cancelled as cancelled:
+                        return self._out_of_time(conversation_id, attempt, cancelled)
                 else:
-                    # Final failure
-                    print("Max retries reached.")
+                    # Final failure: retries exhausted, or no time left for another
+                    logger.error("No retries left", extra={'model': target_model, 'attempts': attempt + 1})
                     return {
                         'success': False,
                         # Return user-friendly message, log the real error above
@@ -219,8 +263,10 @@ Current Date: {datetime.now(ist).strftime('%B %d, %Y')}
                         'response': "Curebird is thinking 🐦 Please try again.",
                         'conversation_id': conversation_id
                     }
+            except deadline.DeadlineExceeded as e:
+                return self._out_of_time(conversation_id, attempt, e)
             except Exception as e:
-                print(f"Unexpected error: {e}")
+                logger.exception("Unexpected chat error")
                 return {
                     'success': False,
                     'error': str(e),
@@ -228,37 +274,22 @@ Current Date: {datetime.now(ist).strftime('%B %d, %Y')}
                     'conversation_id': conversation_id
                 }
 
-    def get_disease_context(self):
-        """Get formatted disease context for frontend display."""
-        try:
-            cache_file = os.path.join(os.path.dirname(__file__), 'disease_data_cache.json')
-            if not os.path.exists(cache_file):
-                 return {'success': False, 'error': 'Cache missing'}
-                 
-            with open(cache_file, 'r') as f:
-                data = json.load(f)
-            
-            # Data is an array, format it for frontend
-            diseases = []
-            for disease in data[:10]:
-                diseases.append({
-                    'name': disease.get('disease', 'Unknown'),
-                    'cases': disease.get('outbreaks', 0),
-                    'risk_level': 'High' if disease.get('outbreaks', 0) > 100000 else 'Medium' if disease.get('outbreaks', 0) > 10000 else 'Low',
-                    'year': disease.get('year', 'N/A')
-                })
-            
-            return {
-                'success': True,
-                'diseases': diseases,
-                'last_updated': 'Recently'
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e)
-            }
-    
+    def _out_of_time(self, conversation_id, attempt, error):
+        logger.warning("Chat turn out of time", extra={'attempt': attempt + 1, 'reason': error.reason})
+        return {
+            'success': False,
+            'error': str(error),
+            'reason': error.reason,
+            'response': "Curebird is thinking 🐦 Please try again.",
+            'conversation_id': conversation_id
+        }
+
+    def import_history(self, conversation_id, turns):
+        """Seed a conversation with prior user/assistant turns (used on provider failover)."""
+        self.conversations[conversation_id] = [
+            {"role": "system", "content": self.create_system_prompt()}
+        ] + [{"role": t['role'], "content": t['content']} for t in turns]
+
     def clear_conversation(self, conversation_id):
         """Clear a specific conversation history."""
         if conversation_id in self.conversations:
@@ -266,11 +297,58 @@ Current Date: {datetime.now(ist).strftime('%B %d, %Y')}
             return True
         return False
 
+    def _remember_insight(self, key, disease_key, features, insight):
+        entry = {'features': features, 'insight': insight, 'created_at': time.time()}
+        with self._insight_lock:
+            self._insight_cache[key] = entry
+            self._insight_cache.move_to_end(key)
+            self._insight_latest[disease_key] = entry
+            while len(self._insight_cache) > INSIGHT_CACHE_SIZE:
+                self._insight_cache.popitem(last=False)
+
+    def _lookup_insight(self, key, disease_key, features):
+        """
+        Return (entry, fresh) for an insight written for these features: the
+        same fingerprint, or the disease's latest insight while its features are
+        within INSIGHT_CHANGE_THRESHOLD. Fresh entries can be served without
+        calling the model; stale ones only if the call fails. An insight for
+        metrics that have moved on is never returned.
+        """
+        now = time.time()
+        with self._insight_lock:
+            entry = self._insight_cache.get(key)
+            if entry:
+                self._insight_cache.move_to_end(key)
+                return entry, now - entry['created_at'] < INSIGHT_CACHE_TTL
+
+            latest = self._insight_latest.get(disease_key)
+            if latest is None or features_moved(latest['features'], features, INSIGHT_CHANGE_THRESHOLD):
+                return None, False
+            return latest, now - latest['created_at'] < INSIGHT_CACHE_TTL
+
     def analyze_disease_progress(self, disease_name, metrics):
         """
         Generate a dual-view insight (Patient vs Doctor) for a specific disease trend.
         Uses 70B model for clinical accuracy.
+
+        Trend features are computed locally; the model is only called again when
+        they drift past INSIGHT_CHANGE_THRESHOLD. If the call fails, an expired
+        insight for the same features (within the threshold) is served instead;
+        with none, the error is raised.
         """
+        key = canonical_key(disease_name, metrics)
+        return self._insight_flight.do(key, self._analyze_disease_progress, disease_name, metrics)
+
+    def _analyze_disease_progress(self, disease_name, metrics):
+        features = compute_trend_features(metrics)
+        disease_key = str(disease_name or '').lower().strip()
+        key = fingerprint(disease_name, features)
+
+        cached, fresh = self._lookup_insight(key, disease_key, features)
+        telemetry.record_cache('disease_insight', bool(cached and fresh))
+        if cached and fresh:
+            return cached['insight']
+
         try:
             # Format metrics for prompt
             metrics_str = "Recent Readings:\n"
@@ -294,16 +372,22 @@ Do NOT output markdown. Output ONLY valid JSON in the following format:
     ]
   }
 }
+Use the computed trend features as ground truth for any numbers you quote.
 CRITICAL SAFETY:
 - Do NOT diagnose.
 - Do NOT sugest changing medication dosages.
 - If data is critical/dangerous, advise immediate doctor consult.
 """
             
-            user_prompt = f"Analyze progress for Condition: {disease_name}.\n{metrics_str}"
+            user_prompt = f"Analyze progress for Condition: {disease_name}.\n{metrics_str}\n{describe_features(features)}"
 
-            completion = self.client.chat.completions.create(
-                model=self.MODEL_70B,
+            # Clients over their token budget get the 8B model
+            model = self.MODEL_8B if get_token_ledger().should_downgrade() else self.MODEL_70B
+            insight = structured_completion(
+                self.client,
+                'disease_insight',
+                INSIGHT_FIELDS,
+                model=model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
@@ -313,12 +397,95 @@ CRITICAL SAFETY:
                 response_format={"type": "json_object"} 
             )
             
-            return json.loads(completion.choices[0].message.content)
+            self._remember_insight(key, disease_key, features, insight)
+            return insight
 
         except Exception as e:
-            print(f"Disease Analysis Error: {e}")
+            logger.error("Disease Analysis Error", extra={'disease': disease_name, 'error': str(e)})
+            if cached:
+                logger.warning("Serving stale insight", extra={'disease': disease_name})
+                return cached['insight']
             raise e
 
+    def iter_disease_progress(self, items, max_workers=None):
+        """Batch variant of analyze_disease_progress (see iter_disease_progress below)."""
+        return iter_disease_progress(self.analyze_disease_progress, items, max_workers)
+
+    def narrate_disease(self, item):
+        """
+        Dashboard summary and Patient/Doctor views for one national trends card.
+        Called by the narrative precompute job, off the request path, so it
+        always uses the 70B model.
+        """
+        history = item.get('history') or []
+        features = compute_trend_features([{'value': h.get('count'), 'unit': 'cases', 'timestamp': h.get('year')}
+                                           for h in history])
+        with telemetry.stage('prompt_build'):
+            card = '\n'.join(f"- {label}: {item[key]}" for key, label in (
+                ('segment', 'Segment'), ('severity', 'Severity'), ('seasonality', 'Seasonality'),
+                ('outbreaks', 'Recent reported cases'), ('annual_count', 'Annual confirmed cases'),
+                ('burden_estimate', 'National burden'), ('trends_context', 'Trend'), ('description', 'About'),
+            ) if item.get(key) not in (None, ''))
+            yearly = ', '.join(f"{h.get('year')}: {h.get('count')}" for h in history)
+
+        system_prompt = """You are an expert public-health analyst writing for the Curebird dashboard.
+Output ONLY valid JSON in the following format:
+{
+  "summary": "Two or three plain-language sentences on where this disease stands in India now and what drives it",
+  "patientView": {
+    "title": "Short title for the public",
+    "explanation": "What the trend means for an ordinary person, without jargon",
+    "action": "One safe, practical prevention step"
+  },
+  "doctorView": {
+    "points": ["Epidemiological observation", "Seasonal or regional pattern", "Surveillance or risk note"]
+  }
+}
+Use the given figures and computed trend features as ground truth for any numbers you quote.
+Do NOT diagnose or recommend specific medication dosages.
+"""
+        user_prompt = (f"Disease: {item.get('disease')}\n{card}\nYearly reported counts: {yearly}\n"
+                       f"{describe_features(features)}")
+        return structured_completion(
+            self.client,
+            'disease_narrative',
+            NARRATIVE_FIELDS,
+            model=self.MODEL_70B,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.4,
+            max_tokens=600,
+            response_format={"type": "json_object"}
+        )
+
+
+def iter_disease_progress(analyze, items, max_workers=None):
+    """
+    Run `analyze(name, metrics)` for many {disease, metrics} items concurrently.
+    Yields one result dict per item, in completion order, each tagged with its index.
+    """
+    max_workers = max(1, min(max_workers or INSIGHT_BATCH_CONCURRENCY, len(items) or 1))
+
+    def run(item):
+        disease = item.get('disease') or {}
+        name = disease.get('name') if isinstance(disease, dict) else disease
+        metrics = item.get('metrics')
+        if not name or not metrics:
+            raise ValueError('Missing disease or metrics data')
+        return analyze(name, metrics)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(contextvars.copy_context().run, run, item): index for index, item in enumerate(items)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                yield {'index': index, 'success': True, 'insight': future.result()}
+            except Exception as e:
+                logger.error("Batch Insight Error", extra={'index': index, 'error': str(e)})
+                yield {'index': index, 'success': False, 'error': str(e)}
+
 # Global singleton instance
 _health_assistant = None
 
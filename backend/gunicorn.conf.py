@@ -0,0 +1,17 @@
+import os
+import multiprocessing
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', max(2, multiprocessing.cpu_count())))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+# Load wsgi.py (imports + fork-safe warmup) once in the master; workers share it copy-on-write
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1').lower() not in ('0', 'false', 'no')
+
+
+def post_worker_init(worker):
+    """Build per-process clients and pools before the worker accepts connections."""
+    from app.warmup import WARMUP_ENABLED, warm_worker
+    if WARMUP_ENABLED:
+        warm_worker()
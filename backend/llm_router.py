@@ -0,0 +1,430 @@
+import os
+import time
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from utils import metrics as telemetry
+from utils import deadline
+from utils.single_flight import SingleFlight, canonical_key
+from utils.logger import get_logger
+
+# Load environment variables explicitly
+load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
+
+logger = get_logger('llm_router')
+
+# --- Router Configuration ---
+LLM_PROVIDERS = [p.strip() for p in os.getenv('LLM_PROVIDERS', 'groq,gemini').split(',') if p.strip()]
+PROVIDER_TIMEOUT = float(os.getenv('LLM_PROVIDER_TIMEOUT', 10))  # Seconds per provider attempt (providers make exactly one)
+ROUTER_ATTEMPTS = int(os.getenv('LLM_ROUTER_ATTEMPTS', 3))  # Attempts per request across providers (at least one per provider)
+ROUTER_BACKOFF = float(os.getenv('LLM_ROUTER_BACKOFF', 0.25))  # Seconds before a second round over the providers, doubling after
+FAILURE_THRESHOLD = int(os.getenv('LLM_FAILURE_THRESHOLD', 3))  # Consecutive failures before ejecting
+COOLDOWN_SECONDS = float(os.getenv('LLM_COOLDOWN_SECONDS', 30))  # Ejection window before a retry probe
+LATENCY_ALPHA = 0.3  # EWMA weight of the newest sample
+TRANSCRIPT_LIMIT = int(os.getenv('LLM_TRANSCRIPT_LIMIT', 1000))  # Conversations kept for failover replay
+INSIGHT_BATCH_MAX = int(os.getenv('INSIGHT_BATCH_MAX', 20))  # Items per /api/disease-insight/batch request; each counts against the client's LLM rate limit
+
+PROVIDER_HEALTH = telemetry.gauge('curebird_llm_provider_healthy', 'Provider accepting traffic (1) or ejected (0).', ('provider',))
+PROVIDER_LATENCY = telemetry.gauge('curebird_llm_provider_latency_ewma_seconds', 'Smoothed provider latency.', ('provider',))
+
+
+class ProviderUnavailable(Exception):
+    """Raised when every provider failed for a request."""
+
+
+class ProviderStats:
+    """Live latency and error tracking for one provider."""
+
+    def __init__(self, name, priority):
+        self.name = name
+        self.priority = priority
+        self.latency = None
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.successes = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        PROVIDER_HEALTH.set_function(lambda: 1 if self.healthy() else 0, name)
+        PROVIDER_LATENCY.set_function(lambda: self.latency or 0, name)
+
+    def healthy(self):
+        return time.time() >= self.ejected_until
+
+    def record_success(self, duration):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.ejected_until = 0.0
+            self.latency = duration if self.latency is None else LATENCY_ALPHA * duration + (1 - LATENCY_ALPHA) * self.latency
+
+    def record_failure(self, duration=None):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if duration is not None:
+                # Timeouts and slow errors still count against the latency estimate
+                self.latency = duration if self.latency is None else LATENCY_ALPHA * duration + (1 - LATENCY_ALPHA) * self.latency
+            if self.consecutive_failures >= FAILURE_THRESHOLD:
+                self.ejected_until = time.time() + COOLDOWN_SECONDS
+                logger.warning("Provider ejected", extra={'provider': self.name, 'cooldown_s': COOLDOWN_SECONDS})
+
+    def snapshot(self):
+        return {
+            'provider': self.name,
+            'healthy': self.healthy(),
+            'latency_ewma_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'consecutive_failures': self.consecutive_failures,
+            'successes': self.successes,
+            'failures': self.failures,
+        }
+
+
+class StubHealthAssistant:
+    """
+    Local provider with the health assistant interface, for tests and benchmarks.
+    Latency and failures are configurable; no network access.
+    """
+
+    def __init__(self, latency=0.0, fail=False, reply="Chirp! This is a local stub reply."):
+        self.latency = latency
+        self.fail = fail
+        self.reply = reply
+        self.conversations = {}
+
+    def generate_response(self, user_message, conversation_id=None):
+        if conversation_id is None:
+            conversation_id = f"conv_{datetime.now().timestamp()}"
+        time.sleep(self.latency)
+        if self.fail:
+            return {'success': False, 'error': 'stub failure', 'response': "Curebird is thinking 🐦 Please try again.",
+                    'conversation_id': conversation_id}
+        history = self.conversations.setdefault(conversation_id, [])
+        history.append({'role': 'user', 'content': user_message})
+        history.append({'role': 'assistant', 'content': self.reply})
+        return {
+            'success': True,
+            'response': self.reply,
+            'conversation_id': conversation_id,
+            'timestamp': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+        }
+
+    def import_history(self, conversation_id, turns):
+        self.conversations[conversation_id] = [dict(t) for t in turns]
+
+    def clear_conversation(self, conversation_id):
+        return self.conversations.pop(conversation_id, None) is not None
+
+    def analyze_disease_progress(self, disease_name, metrics):
+        time.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError('stub failure')
+        return {
+            'patientView': {'title': f"{disease_name} trend", 'explanation': 'Stub insight.', 'action': 'Keep monitoring.'},
+            'doctorView': {'points': [f"{len(metrics or [])} readings reviewed"]}
+        }
+
+    def narrate_disease(self, item):
+        time.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError('stub failure')
+        return {
+            'summary': f"Stub summary for {item.get('disease')}.",
+            'patientView': {'title': f"{item.get('disease')} trend", 'explanation': 'Stub insight.', 'action': 'Keep monitoring.'},
+            'doctorView': {'points': [f"{len(item.get('history') or [])} yearly counts reviewed"]}
+        }
+
+
+def _build_groq():
+    from groq_service import get_health_assistant as get_groq_assistant
+    return get_groq_assistant()
+
+
+def _build_gemini():
+    from gemini_service import get_health_assistant as get_gemini_assistant
+    return get_gemini_assistant()
+
+
+PROVIDER_FACTORIES = {
+    'groq': _build_groq,
+    'gemini': _build_gemini,
+    'stub': StubHealthAssistant,
+}
+
+
+class HealthAssistantRouter:
+    """
+    Sends each chat turn to the fastest healthy provider and fails over on
+    errors or timeouts. Providers are ejected after FAILURE_THRESHOLD
+    consecutive failures and probed again after COOLDOWN_SECONDS.
+
+    The router owns retries: providers run under deadline.single_attempt(), so
+    each call is one upstream attempt bounded by the provider timeout (no SDK
+    or provider-side retry loops), and a failure moves on to the next provider
+    at once. With every provider tried, further rounds back off briefly, up to
+    ROUTER_ATTEMPTS attempts in total.
+
+    A router-side transcript lets a conversation continue on another provider.
+    """
+
+    def __init__(self, providers=None, timeout=PROVIDER_TIMEOUT, attempts=ROUTER_ATTEMPTS, backoff=ROUTER_BACKOFF):
+        """`providers` is a list of (name, instance-or-factory); defaults to LLM_PROVIDERS."""
+        if providers is None:
+            providers = [(name, PROVIDER_FACTORIES[name]) for name in LLM_PROVIDERS if name in PROVIDER_FACTORIES]
+        self.timeout = timeout
+        self.attempts = attempts
+        self.backoff = backoff
+        self._factories = OrderedDict()
+        self._instances = {}
+        self.stats = {}
+        for priority, (name, provider) in enumerate(providers):
+            if hasattr(provider, 'generate_response') and not isinstance(provider, type):
+                self._instances[name] = provider
+                self._factories[name] = None
+            else:
+                self._factories[name] = provider
+            self.stats[name] = ProviderStats(name, priority)
+
+        self._init_lock = threading.Lock()
+        self._transcripts = OrderedDict()
+        self._transcript_lock = threading.Lock()
+        self._owner = {}
+        self._pool = ThreadPoolExecutor(max_workers=int(os.getenv('LLM_ROUTER_WORKERS', 32)),
+                                        thread_name_prefix='llm-router')
+        # Duplicate turns in flight share one routed call, so the transcript records the turn once
+        self._chat_flight = SingleFlight('router_chat')
+
+    # --- Provider selection ---
+    def _instance(self, name):
+        """Build providers lazily; a provider that cannot be built (e.g. missing key) is ejected."""
+        if name in self._instances:
+            return self._instances[name]
+        with self._init_lock:
+            if name not in self._instances:
+                try:
+                    self._instances[name] = self._factories[name]()
+                except Exception as e:
+                    logger.error("Provider unavailable", extra={'provider': name, 'error': str(e)})
+                    self._instances[name] = None
+        return self._instances[name]
+
+    def ranked_providers(self):
+        """Healthy providers by smoothed latency (untried first), then ejected ones as a last resort."""
+        stats = [s for s in self.stats.values() if self._instance(s.name) is not None]
+        key = lambda s: (s.latency if s.latency is not None else 0.0, s.priority)
+        healthy = sorted((s for s in stats if s.healthy()), key=key)
+        ejected = sorted((s for s in stats if not s.healthy()), key=lambda s: s.ejected_until)
+        return [s.name for s in healthy + ejected]
+
+    def _attempts(self):
+        """
+        Provider names to try, in order: every ranked provider once, then more
+        rounds (re-ranked, with doubling backoff) until ROUTER_ATTEMPTS attempts.
+        Stops early when the request deadline leaves no time for the backoff.
+        """
+        made, rounds = 0, 0
+        while True:
+            names = self.ranked_providers()
+            if not names:
+                return
+            if rounds:
+                backoff = self.backoff * (2 ** (rounds - 1))
+                if made >= self.attempts or not deadline.allows_retry(backoff):
+                    return
+                try:
+                    deadline.sleep(backoff)
+                except deadline.Cancelled:
+                    return
+            for name in names:
+                if rounds and made >= self.attempts:
+                    return
+                made += 1
+                yield name
+            rounds += 1
+
+    def _single_attempt(self, fn, *args):
+        with deadline.single_attempt(self.timeout):
+            return fn(*args)
+
+    def _call(self, name, fn, *args):
+        """Run one provider call under the router timeout, capped by the request deadline. Returns (ok, result, error)."""
+        stats = self.stats[name]
+        try:
+            timeout = deadline.attempt_timeout(self.timeout)
+        except deadline.DeadlineExceeded as e:
+            return False, None, str(e)
+        start = time.perf_counter()
+        # Run in the caller's context so usage attribution and the deadline follow the call into the pool.
+        # The provider's own upstream timeout matches ours, so an abandoned call frees its thread soon after.
+        future = self._pool.submit(contextvars.copy_context().run, self._single_attempt, fn, *args)
+        try:
+            result = deadline.wait_result(future, timeout)
+        except FutureTimeout:
+            future.cancel()
+            if timeout < self.timeout:
+                # Cut short by the request deadline; the provider is not at fault
+                return False, None, f"{name} ran out of request time after {timeout:.1f}s"
+            stats.record_failure(time.perf_counter() - start)
+            return False, None, f"{name} timed out after {self.timeout}s"
+        except deadline.DeadlineExceeded as e:
+            return False, None, str(e)
+        except Exception as e:
+            stats.record_failure(time.perf_counter() - start)
+            return False, None, str(e)
+
+        if isinstance(result, dict) and result.get('success') is False:
+            if result.get('reason') is None:
+                stats.record_failure(time.perf_counter() - start)
+            return False, result, result.get('error', 'provider error')
+
+        stats.record_success(time.perf_counter() - start)
+        return True, result, None
+
+    # --- Transcript (for failover replay) ---
+    def _transcript(self, conversation_id):
+        with self._transcript_lock:
+            turns = self._transcripts.get(conversation_id)
+            if turns is not None:
+                self._transcripts.move_to_end(conversation_id)
+            return list(turns or [])
+
+    def _append_turns(self, conversation_id, *turns):
+        with self._transcript_lock:
+            self._transcripts.setdefault(conversation_id, []).extend(turns)
+            self._transcripts.move_to_end(conversation_id)
+            while len(self._transcripts) > TRANSCRIPT_LIMIT:
+                evicted, _ = self._transcripts.popitem(last=False)
+                self._owner.pop(evicted, None)
+
+    def _prepare(self, name, provider, conversation_id):
+        """Make sure `provider` holds the conversation before it takes the next turn."""
+        if self._owner.get(conversation_id) == name:
+            return
+        turns = self._transcript(conversation_id)
+        if turns and hasattr(provider, 'import_history'):
+            provider.import_history(conversation_id, turns)
+
+    # --- Assistant interface ---
+    def generate_response(self, user_message, conversation_id=None):
+        if conversation_id is None:
+            conversation_id = f"conv_{datetime.now().timestamp()}"
+            call = lambda: self._generate_response(user_message, conversation_id)
+        else:
+            key = canonical_key(conversation_id, user_message)
+            call = lambda: self._chat_flight.do(key, self._generate_response, user_message, conversation_id)
+        try:
+            return call()
+        except deadline.DeadlineExceeded as e:
+            # Raised inside the flight so followers with time left retry instead of sharing it
+            return self._out_of_time(conversation_id, e)
+
+    def _generate_response(self, user_message, conversation_id):
+        last_result, last_error, previous = None, None, None
+        for name in self._attempts():
+            # No failover once the request is out of time or the client has gone
+            deadline.check()
+            provider = self._instance(name)
+            if previous is not None:
+                if previous == name:
+                    telemetry.LLM_RETRIES.inc('router', name)
+                else:
+                    telemetry.LLM_FALLBACKS.inc('router', previous, name)
+            previous = name
+
+            try:
+                self._prepare(name, provider, conversation_id)
+            except Exception as e:
+                logger.error("History import failed", extra={'provider': name, 'error': str(e)})
+                continue
+
+            ok, result, error = self._call(name, provider.generate_response, user_message, conversation_id)
+            if ok:
+                self._owner[conversation_id] = name
+                self._append_turns(conversation_id,
+                                   {'role': 'user', 'content': user_message},
+                                   {'role': 'assistant', 'content': result.get('response', '')})
+                result['provider'] = name
+                return result
+
+            logger.warning("Provider failed, failing over", extra={'provider': name, 'error': error})
+            # Drop the partial turn so the provider is re-seeded from the transcript next time
+            provider.clear_conversation(conversation_id)
+            if self._owner.get(conversation_id) == name:
+                self._owner.pop(conversation_id, None)
+            last_result, last_error = result, error
+
+        deadline.check()
+        if isinstance(last_result, dict):
+            return last_result
+        return {
+            'success': False,
+            'error': last_error or 'No LLM provider available',
+            'response': "Curebird is thinking 🐦 Please try again.",
+            'conversation_id': conversation_id
+        }
+
+    @staticmethod
+    def _out_of_time(conversation_id, error):
+        """Failure result for a turn stopped by the request deadline or a client disconnect."""
+        return {'success': False, 'error': str(error), 'reason': error.reason,
+                'response': "Curebird is thinking 🐦 Please try again.", 'conversation_id': conversation_id}
+
+    def analyze_disease_progress(self, disease_name, metrics):
+        last_error = None
+        for name in self._attempts():
+            deadline.check()
+            provider = self._instance(name)
+            if not hasattr(provider, 'analyze_disease_progress'):
+                continue
+            ok, result, error = self._call(name, provider.analyze_disease_progress, disease_name, metrics)
+            if ok:
+                return result
+            last_error = error
+        deadline.check()
+        raise ProviderUnavailable(last_error or 'No provider supports disease analysis')
+
+    def narrate_disease(self, item):
+        last_error = None
+        for name in self._attempts():
+            deadline.check()
+            provider = self._instance(name)
+            if not hasattr(provider, 'narrate_disease'):
+                continue
+            ok, result, error = self._call(name, provider.narrate_disease, item)
+            if ok:
+                return result
+            last_error = error
+        deadline.check()
+        raise ProviderUnavailable(last_error or 'No provider supports disease narratives')
+
+    def iter_disease_progress(self, items, max_workers=None):
+        from groq_service import iter_disease_progress
+        return iter_disease_progress(self.analyze_disease_progress, items, max_workers)
+
+    def clear_conversation(self, conversation_id):
+        cleared = False
+        for name, provider in list(self._instances.items()):
+            if provider is not None and provider.clear_conversation(conversation_id):
+                cleared = True
+        with self._transcript_lock:
+            cleared = self._transcripts.pop(conversation_id, None) is not None or cleared
+            self._owner.pop(conversation_id, None)
+        return cleared
+
+    def status(self):
+        return [self.stats[name].snapshot() for name in self.stats]
+
+
+# Global singleton instance
+_router = None
+_router_lock = threading.Lock()
+
+def get_health_assistant():
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = HealthAssistantRouter()
+    return _router
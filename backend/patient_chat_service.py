@@ -1,21 +1,28 @@
 import os
 import json
-from groq import Groq
 from dotenv import load_dotenv
+from utils.metrics import timed_completion
+from utils import deadline
+from utils.logger import get_logger
+from utils.single_flight import SingleFlight, canonical_key
 
 # Load environment variables
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 
+logger = get_logger('patient_chat')
+
 class PatientPersonaService:
     def __init__(self):
         """Initialize Groq for Patient Roleplay."""
         api_key = os.getenv('GROQ_API_KEY')
         if not api_key:
             # Fallback or error - relying on the one in .env
-            print("Warning: GROQ_API_KEY not found in environment for Patient Service")
+            logger.warning("GROQ_API_KEY not found in environment for Patient Service")
         
+        from groq import Groq  # Deferred: the SDK import dominates app start-up
         self.client = Groq(api_key=api_key)
         self.MODEL = "llama-3.1-8b-instant" # Fast, efficient model for chat
+        self._reply_flight = SingleFlight('patient_reply')
 
     def generate_patient_reply(self, history, patient_context):
         """
@@ -28,6 +35,10 @@ class PatientPersonaService:
         Returns:
             str: The patient's reply.
         """
+        key = canonical_key(history, patient_context)
+        return self._reply_flight.do(key, self._generate_patient_reply, history, patient_context)
+
+    def _generate_patient_reply(self, history, patient_context):
         try:
             # 1. Construct System Prompt
             name = patient_context.get('patient', 'Patient')
@@ -59,7 +70,8 @@ ROLEPLAY RULES:
                     formatted_messages.append({"role": role, "content": content})
 
             # 3. Call LLM
-            completion = self.client.chat.completions.create(
+            completion = timed_completion(
+                self.client,
                 model=self.MODEL,
                 messages=formatted_messages,
                 temperature=0.7, # Slightly creative for variations
@@ -70,8 +82,10 @@ ROLEPLAY RULES:
             
             return completion.choices[0].message.content.strip()
 
+        except deadline.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"Error generating patient reply: {e}")
+            logger.error("Error generating patient reply", extra={'error': str(e)})
             return "I'm sorry, I didn't verify that properly. Could you repeat it?"
 
 # Singleton Pattern
@@ -0,0 +1,33 @@
+import pytest
+
+from utils.admission import AdmissionController, RateLimiter, Rejected
+
+
+def test_rate_limiter_charges_the_cost():
+    limiter = RateLimiter(per_minute=10)
+    limiter.take('client', 8)
+    with pytest.raises(Rejected):
+        limiter.take('client', 3)
+    limiter.take('client', 2)
+
+
+def test_cost_is_capped_at_the_bucket_size():
+    limiter = RateLimiter(per_minute=10)
+    limiter.take('client', 50)
+    with pytest.raises(Rejected):
+        limiter.take('client')
+
+
+def test_slow_classes_leave_threads_for_static():
+    controller = AdmissionController(slow_threads=3)
+    tickets = [controller.admit('llm', f"client-{i}") for i in range(2)]
+    tickets.append(controller.admit('vlm', 'client-2'))
+    with pytest.raises(Rejected) as error:
+        controller.admit('llm', 'client-3')
+    assert error.value.reason == 'threads_busy'
+    static = controller.admit('static', 'client-3')
+    controller.release(tickets.pop())
+    tickets.append(controller.admit('llm', 'client-3'))
+    for ticket in tickets + [static]:
+        controller.release(ticket)
+    assert controller.slow_held == 0
@@ -0,0 +1,59 @@
+from collections import OrderedDict
+
+import pytest
+
+from app import create_app, services
+
+
+def test_assistant_context_grades_risk_on_outbreaks():
+    trends = [
+        {'disease': 'A', 'outbreaks': 150000, 'history': [{'year': 2024, 'count': 10}]},
+        {'disease': 'B', 'outbreaks': '20,000 cases', 'history': [{'year': 2024, 'count': 500000}]},
+        {'disease': 'C', 'outbreaks': '2.5%'},
+    ]
+    diseases = services._assistant_context(trends)['diseases']
+    assert [(d['cases'], d['risk_level']) for d in diseases] == [
+        (150000, 'High'), ('20,000 cases', 'Medium'), ('2.5%', 'Low'),
+    ]
+    assert diseases[0]['year'] == 2024
+
+
+class _Snapshot:
+    version = 'v1'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    built = []
+    monkeypatch.setattr(services, 'get_trends_data', lambda: built.append(1) or [{'disease': 'A', 'outbreaks': 5}])
+    monkeypatch.setattr(services, '_bootstrap_bodies', OrderedDict())
+    client = create_app().test_client()
+    client.built = built
+    return client
+
+
+def test_versioned_bootstrap_revalidates_without_building(client, monkeypatch):
+    monkeypatch.setattr(services, 'get_trends_snapshot', lambda: _Snapshot())
+    first = client.get('/api/bootstrap?sections=trends,context')
+    assert first.status_code == 200 and first.headers.get('ETag')
+    repeat = client.get('/api/bootstrap?sections=trends,context', headers={'If-None-Match': first.headers['ETag']})
+    assert repeat.status_code == 304
+    assert len(client.built) == 1
+
+
+def test_live_bootstrap_has_no_etag(client, monkeypatch):
+    monkeypatch.setattr(services, 'get_trends_snapshot', lambda: None)
+    first = client.get('/api/bootstrap?sections=trends,context')
+    assert first.status_code == 200
+    assert 'ETag' not in first.headers
+    repeat = client.get('/api/bootstrap?sections=trends,context', headers={'If-None-Match': '*'})
+    assert repeat.status_code == 200
+    assert len(client.built) == 2
+
+
+def test_assistant_context_matches_bootstrap_context(client, monkeypatch):
+    monkeypatch.setattr(services, 'get_trends_snapshot', lambda: None)
+    context = client.get('/api/health-assistant/context').get_json()
+    bootstrap = client.get('/api/bootstrap?sections=context').get_json()
+    assert context == bootstrap['context']
+    assert context['diseases'][0]['name'] == 'A'
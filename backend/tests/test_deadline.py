@@ -0,0 +1,109 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import create_app, routes
+from llm_router import HealthAssistantRouter, StubHealthAssistant
+from utils import deadline
+from utils.admission import AdmissionController
+
+
+@pytest.fixture
+def bound():
+    """Bind a deadline for the test body; call it with the budget in seconds."""
+    tokens = []
+
+    def bind(seconds):
+        tokens.append(deadline.bind(seconds))
+        return deadline.current()
+
+    yield bind
+    for token in reversed(tokens):
+        deadline.unbind(token)
+
+
+def test_check_raises_once_expired(bound):
+    budget = bound(0.05)
+    deadline.check()
+    time.sleep(0.06)
+    assert budget.expired
+    with pytest.raises(deadline.DeadlineExceeded):
+        deadline.check()
+
+
+def test_cancel_raises_cancelled_unless_shared(bound):
+    budget = bound(10)
+    budget.shared = True
+    budget.cancel()
+    deadline.check()
+    budget.shared = False
+    budget.cancel()
+    with pytest.raises(deadline.Cancelled):
+        deadline.check()
+
+
+def test_attempt_timeout_is_capped_by_what_is_left(bound):
+    assert deadline.attempt_timeout(5) == 5
+    bound(1)
+    assert deadline.attempt_timeout(5) <= 1
+    assert deadline.attempt_timeout(0.5) == 0.5
+    with deadline.single_attempt(0.2):
+        assert deadline.attempt_timeout(5) == 0.2
+
+
+def test_attempt_timeout_raises_when_nothing_is_left(bound):
+    bound(0)
+    with pytest.raises(deadline.DeadlineExceeded):
+        deadline.attempt_timeout(5)
+
+
+def test_retry_needs_time_for_another_attempt(bound):
+    assert deadline.allows_retry(1)
+    bound(deadline.DEADLINE_MIN_ATTEMPT + 0.5)
+    assert deadline.allows_retry(0.1)
+    assert not deadline.allows_retry(1)
+
+
+def test_sleep_and_wait_wake_on_cancel(bound):
+    budget = bound(10)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pool.submit(lambda: (time.sleep(0.05), budget.cancel()))
+        start = time.monotonic()
+        with pytest.raises(deadline.Cancelled):
+            deadline.sleep(5)
+        assert time.monotonic() - start < 1
+        with pytest.raises(deadline.Cancelled):
+            deadline.wait_result(pool.submit(time.sleep, 5), 10)
+
+
+def test_llm_call_stops_at_the_deadline(bound):
+    from groq import Groq
+    from benchmarks.fake_llm_server import FakeLLMConfig, start_fake_server
+    from utils.metrics import timed_completion
+
+    config = FakeLLMConfig(latency_ms=2000)
+    server, url = start_fake_server(config)
+    try:
+        bound(0.3)
+        start = time.monotonic()
+        with pytest.raises(deadline.DeadlineExceeded):
+            timed_completion(Groq(api_key='test-key', base_url=url), model='llama-3.3-70b-versatile',
+                             messages=[{'role': 'user', 'content': 'hello'}])
+        assert time.monotonic() - start < 1.5
+    finally:
+        server.shutdown()
+    assert config.requests == 1
+
+
+def test_chat_route_returns_504_at_the_deadline(monkeypatch):
+    router = HealthAssistantRouter([('slow', StubHealthAssistant(latency=2.0))])
+    monkeypatch.setattr(routes, 'get_health_assistant', lambda: router)
+    monkeypatch.setattr(routes, 'get_admission_controller', lambda: AdmissionController())
+    client = create_app().test_client()
+    start = time.monotonic()
+    response = client.post('/api/health-assistant/chat', json={'message': 'hello', 'conversation_id': 'c1'},
+                           headers={'X-Request-Timeout': '0.2'})
+    assert response.status_code == 504
+    assert response.get_json()['reason'] == 'deadline_exceeded'
+    assert time.monotonic() - start < 1.5
@@ -0,0 +1,39 @@
+import pytest
+
+import groq_service
+from benchmarks.fake_llm_server import FakeLLMConfig, start_fake_server
+
+METRICS = [{'value': v, 'unit': 'mg/dL', 'timestamp': f"2026-01-0{i + 1}"} for i, v in enumerate((120, 125, 130, 128))]
+MOVED = [{**m, 'value': m['value'] * 2} for m in METRICS]
+
+
+@pytest.fixture
+def assistant(monkeypatch):
+    config = FakeLLMConfig(latency_ms=0, error_status=400)
+    server, url = start_fake_server(config)
+    monkeypatch.setenv('GROQ_API_KEY', 'test-key')
+    monkeypatch.setenv('GROQ_BASE_URL', url)
+    assistant = groq_service.GroqHealthAssistant()
+    assistant.fake = config
+    yield assistant
+    server.shutdown()
+
+
+def test_same_features_are_served_from_cache(assistant):
+    first = assistant.analyze_disease_progress('Diabetes', METRICS)
+    assert assistant.analyze_disease_progress('Diabetes', METRICS) == first
+    assert assistant.fake.requests == 1
+
+
+def test_failed_call_serves_an_expired_insight_for_the_same_features(assistant, monkeypatch):
+    first = assistant.analyze_disease_progress('Diabetes', METRICS)
+    monkeypatch.setattr(groq_service, 'INSIGHT_CACHE_TTL', 0)
+    assistant.fake.error_rate = 1.0
+    assert assistant.analyze_disease_progress('Diabetes', METRICS) == first
+
+
+def test_insight_for_other_metrics_is_never_served(assistant):
+    assistant.analyze_disease_progress('Diabetes', METRICS)
+    assistant.fake.error_rate = 1.0
+    with pytest.raises(Exception):
+        assistant.analyze_disease_progress('Diabetes', MOVED)
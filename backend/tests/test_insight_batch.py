@@ -0,0 +1,39 @@
+import pytest
+
+from app import create_app, routes
+from llm_router import INSIGHT_BATCH_MAX, HealthAssistantRouter, StubHealthAssistant
+from utils.admission import AdmissionController
+
+
+@pytest.fixture
+def client(monkeypatch):
+    router = HealthAssistantRouter([('stub', StubHealthAssistant())])
+    controller = AdmissionController()
+    monkeypatch.setattr(routes, 'get_health_assistant', lambda: router)
+    monkeypatch.setattr(routes, 'get_admission_controller', lambda: controller)
+    return create_app().test_client()
+
+
+def _items(count):
+    return [{'disease': {'name': f"Disease {i}"}, 'metrics': [{'value': i}]} for i in range(count)]
+
+
+def test_batch_returns_every_result(client):
+    response = client.post('/api/disease-insight/batch', json={'items': _items(3)})
+    assert response.status_code == 200
+    assert [r['success'] for r in response.get_json()['results']] == [True, True, True]
+
+
+def test_oversized_batch_is_rejected(client):
+    response = client.post('/api/disease-insight/batch', json={'items': _items(INSIGHT_BATCH_MAX + 1)})
+    assert response.status_code == 400
+
+
+def test_batch_items_count_against_the_rate_limit(client):
+    rate = routes.get_admission_controller().rates['llm'].capacity
+    size = min(INSIGHT_BATCH_MAX, int(rate))
+    for _ in range(int(rate // size)):
+        assert client.post('/api/disease-insight/batch', json={'items': _items(size)}).status_code == 200
+    response = client.post('/api/disease-insight/batch', json={'items': _items(size)})
+    assert response.status_code == 429
+    assert response.get_json()['reason'] == 'rate_limited'
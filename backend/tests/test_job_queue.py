@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+
+import pytest
+
+from utils import job_queue
+from utils.job_queue import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue
+from utils.token_ledger import attribute, current_attribution
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path)
+
+
+def _queue(directory, handler=None):
+    queue = JobQueue(directory=directory, workers=2)
+    queue.register('echo', handler or (lambda payload, params: {'echo': payload.decode(), **params}))
+    return queue
+
+
+def _orphan(queue, status=RUNNING, lease_expires=0.0, attempts=1):
+    """A job row left behind by a worker process that died."""
+    job_id = f"orphan{attempts}{status}".lower()
+    with open(queue._payload_path(job_id), 'wb') as f:
+        f.write(b'page')
+    with queue._connection() as conn:
+        conn.execute(
+            'INSERT INTO jobs (id, kind, status, params, attempts, owner, lease_expires, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (job_id, 'echo', status, '{}', attempts, 'dead-worker', lease_expires, time.time(), time.time()),
+        )
+    return job_id
+
+
+def test_job_runs_and_returns_its_result(directory):
+    queue = _queue(directory)
+    job, created = queue.submit('echo', b'hello', {'mode': 'vlm'})
+    assert created is True
+    job = queue.wait(job['job_id'], 5)
+    assert job['status'] == SUCCEEDED
+    assert job['result'] == {'echo': 'hello', 'mode': 'vlm'}
+
+
+def test_duplicate_key_returns_the_same_job(directory):
+    release = threading.Event()
+    calls = []
+
+    def handler(payload, params):
+        calls.append(payload)
+        release.wait(5)
+        return {}
+
+    queue = _queue(directory, handler)
+    first, created = queue.submit('echo', b'page', idempotency_key='upload-1')
+    again, created_again = queue.submit('echo', b'page', idempotency_key='upload-1')
+    release.set()
+    assert created is True and created_again is False
+    assert again['job_id'] == first['job_id']
+    assert queue.wait(first['job_id'], 5)['status'] == SUCCEEDED
+    assert len(calls) == 1
+
+
+def test_failed_job_frees_its_key(directory):
+    def handler(payload, params):
+        raise RuntimeError('upstream down')
+
+    queue = _queue(directory, handler)
+    first, _ = queue.submit('echo', b'page', idempotency_key='upload-1')
+    assert queue.wait(first['job_id'], 5)['status'] == FAILED
+    second, created = queue.submit('echo', b'page', idempotency_key='upload-1')
+    assert created is True
+    assert second['job_id'] != first['job_id']
+
+
+def test_resume_takes_over_expired_jobs_only(directory):
+    queue = _queue(directory)
+    expired = _orphan(queue, RUNNING, lease_expires=time.time() - 1)
+    live = _orphan(queue, QUEUED, lease_expires=time.time() + 60, attempts=0)
+    assert queue.resume() == 1
+    assert queue.wait(expired, 5)['status'] == SUCCEEDED
+    assert queue.get(live)['status'] == QUEUED
+
+
+def test_resume_gives_up_after_max_attempts(directory):
+    queue = _queue(directory)
+    job_id = _orphan(queue, RUNNING, attempts=job_queue.JOB_MAX_ATTEMPTS)
+    assert queue.resume() == 0
+    job = queue.get(job_id)
+    assert job['status'] == FAILED
+    assert 'interrupted' in job['error']
+
+
+def test_only_one_process_resumes_a_job(directory):
+    first, second = _queue(directory), _queue(directory)
+    job_id = _orphan(first, RUNNING)
+    assert first.resume() + second.resume() == 1
+    assert first.wait(job_id, 5)['status'] == SUCCEEDED
+
+
+def test_job_keeps_the_submitters_attribution(directory):
+    seen = []
+    queue = _queue(directory, lambda payload, params: seen.append(dict(current_attribution())) or {})
+    with attribute(client='10.0.0.7', route='process_analyzer_report'):
+        job, _ = queue.submit('echo', b'page')
+    queue.wait(job['job_id'], 5)
+    assert seen[0]['client'] == '10.0.0.7'
+    row = queue._connection().execute('SELECT attribution FROM jobs WHERE id = ?', (job['job_id'],)).fetchone()
+    assert json.loads(row['attribution'])['route'] == 'process_analyzer_report'
+
+
+def test_keys_and_jobs_belong_to_their_client(directory):
+    release = threading.Event()
+    queue = _queue(directory, lambda payload, params: release.wait(5) and {'report': 'private'})
+    mine, _ = queue.submit('echo', b'page', idempotency_key='upload-1', client='10.0.0.1')
+    theirs, created = queue.submit('echo', b'page', idempotency_key='upload-1', client='10.0.0.2')
+    release.set()
+    assert created is True
+    assert theirs['job_id'] != mine['job_id']
+    assert queue.wait(mine['job_id'], 5, client='10.0.0.1')['result'] == {'report': 'private'}
+    assert queue.get(mine['job_id'], client='10.0.0.2') is None
+    assert queue.wait(mine['job_id'], 1, client='10.0.0.2') is None
+
+
+def test_wait_sees_jobs_finished_by_another_process(directory):
+    release = threading.Event()
+    runner = _queue(directory, lambda payload, params: release.wait(5) and {})
+    job, _ = runner.submit('echo', b'page')
+    poller = _queue(directory)  # Another worker process: never notified by the runner
+    threading.Timer(0.2, release.set).start()
+    start = time.monotonic()
+    assert poller.wait(job['job_id'], 10)['status'] == SUCCEEDED
+    assert time.monotonic() - start < 2
@@ -0,0 +1,135 @@
+import time
+
+import pytest
+
+from llm_router import HealthAssistantRouter, ProviderUnavailable, StubHealthAssistant, FAILURE_THRESHOLD
+from utils import deadline
+
+
+class FlakyStub(StubHealthAssistant):
+    """Fails its first `failures` calls, then answers."""
+
+    def __init__(self, failures, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+        self.calls = 0
+
+    def generate_response(self, user_message, conversation_id=None):
+        self.calls += 1
+        self.fail = self.calls <= self.failures
+        return super().generate_response(user_message, conversation_id)
+
+
+class RecordingStub(StubHealthAssistant):
+    """Records the attempt policy each call runs under."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.seen = []
+
+    def generate_response(self, user_message, conversation_id=None):
+        self.seen.append((deadline.retries_owned_by_caller(), deadline.attempt_timeout(), deadline.allows_retry(0)))
+        return super().generate_response(user_message, conversation_id)
+
+
+def test_fails_over_to_the_next_provider():
+    router = HealthAssistantRouter([('a', StubHealthAssistant(fail=True)), ('b', StubHealthAssistant(reply='from b'))])
+    result = router.generate_response('hello there', 'conv-1')
+    assert result['success'] is True
+    assert result['provider'] == 'b'
+    assert result['response'] == 'from b'
+    assert router.stats['a'].failures == 1
+
+
+def test_slow_provider_times_out_and_fails_over():
+    router = HealthAssistantRouter([('slow', StubHealthAssistant(latency=1.0)), ('fast', StubHealthAssistant())],
+                                   timeout=0.1)
+    start = time.perf_counter()
+    result = router.generate_response('hello there', 'conv-1')
+    assert result['provider'] == 'fast'
+    assert time.perf_counter() - start < 0.5
+
+
+def test_providers_make_a_single_attempt():
+    stub = RecordingStub()
+    router = HealthAssistantRouter([('a', stub)], timeout=2.5)
+    router.generate_response('hello there', 'conv-1')
+    assert stub.seen == [(True, 2.5, False)]
+    # Outside the router, providers keep their own retry policy
+    assert not deadline.retries_owned_by_caller()
+
+
+def test_router_retries_after_every_provider_failed():
+    flaky = FlakyStub(failures=1)
+    router = HealthAssistantRouter([('a', flaky)], attempts=2, backoff=0)
+    result = router.generate_response('hello there', 'conv-1')
+    assert result['success'] is True
+    assert flaky.calls == 2
+
+    flaky = FlakyStub(failures=1)
+    router = HealthAssistantRouter([('a', flaky)], attempts=1, backoff=0)
+    assert router.generate_response('hello there', 'conv-1')['success'] is False
+    assert flaky.calls == 1
+
+
+def test_provider_is_ejected_after_repeated_failures():
+    router = HealthAssistantRouter([('a', StubHealthAssistant(fail=True))], attempts=1)
+    for i in range(FAILURE_THRESHOLD):
+        assert router.stats['a'].healthy() is True
+        router.generate_response('hello there', f"conv-{i}")
+    assert router.stats['a'].healthy() is False
+
+
+def test_slower_provider_is_ranked_last():
+    router = HealthAssistantRouter([('a', StubHealthAssistant(latency=0.05, fail=True)), ('b', StubHealthAssistant())],
+                                   attempts=1)
+    router.generate_response('hello there', 'conv-1')
+    assert router.ranked_providers() == ['b', 'a']
+
+
+def test_conversation_continues_on_another_provider():
+    a, b = FlakyStub(failures=0), StubHealthAssistant(reply='from b')
+    router = HealthAssistantRouter([('a', a), ('b', b)], attempts=1)
+    router.generate_response('first question', 'conv-1')
+    a.failures = a.calls + 1  # a fails from now on
+    result = router.generate_response('second question', 'conv-1')
+    assert result['provider'] == 'b'
+    history = [turn['content'] for turn in b.conversations['conv-1']]
+    assert history[:2] == ['first question', a.reply]
+    assert history[2:] == ['second question', 'from b']
+
+
+def test_out_of_time_stops_failover():
+    router = HealthAssistantRouter([('a', StubHealthAssistant(fail=True)), ('b', StubHealthAssistant())])
+    token = deadline.bind(0.0001)
+    try:
+        time.sleep(0.01)
+        result = router.generate_response('hello there', 'conv-1')
+    finally:
+        deadline.unbind(token)
+    assert result['success'] is False
+    assert result['reason'] == 'deadline_exceeded'
+
+
+def test_insight_raises_when_every_provider_fails():
+    router = HealthAssistantRouter([('a', StubHealthAssistant(fail=True))], attempts=2, backoff=0)
+    with pytest.raises(ProviderUnavailable):
+        router.analyze_disease_progress('Dengue', [{'value': 1}])
+
+
+def test_single_attempt_disables_sdk_retries():
+    from groq import Groq
+    from benchmarks.fake_llm_server import FakeLLMConfig, start_fake_server
+    from utils.metrics import timed_completion
+
+    config = FakeLLMConfig(latency_ms=0, error_rate=1.0, error_status=503)
+    server, url = start_fake_server(config)
+    try:
+        client = Groq(api_key='test-key', base_url=url)
+        with deadline.single_attempt(2.0):
+            with pytest.raises(Exception):
+                timed_completion(client, model='llama-3.3-70b-versatile',
+                                 messages=[{'role': 'user', 'content': 'hello'}])
+    finally:
+        server.shutdown()
+    assert config.requests == 1
@@ -0,0 +1,79 @@
+import pytest
+
+from app import services
+from llm_router import HealthAssistantRouter, StubHealthAssistant
+from utils.narrative_store import NarrativePrecomputer, NarrativeStore
+
+TRENDS = [
+    {'id': 1, 'disease': 'Dengue', 'outbreaks': 1200, 'history': [{'year': 2023, 'count': 900}, {'year': 2024, 'count': 1200}]},
+    {'id': 2, 'disease': 'Malaria', 'outbreaks': 800, 'history': [{'year': 2024, 'count': 800}]},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return NarrativeStore(str(tmp_path / 'narratives.sqlite3'))
+
+
+def _precomputer(store, provider=None):
+    router = HealthAssistantRouter([('stub', provider or StubHealthAssistant())], attempts=1)
+    return NarrativePrecomputer(store, lambda after, timeout: None, router.narrate_disease)
+
+
+def test_refresh_stores_a_narrative_per_disease(store):
+    assert _precomputer(store).refresh(TRENDS, version=1) == 2
+    narrative = store.get('1')
+    assert narrative['summary'] == 'Stub summary for Dengue.'
+    assert narrative['patientView']['title'] == 'Dengue trend'
+    assert narrative['trends_version'] == 1
+
+
+def test_only_changed_cards_are_regenerated(store):
+    precomputer = _precomputer(store)
+    precomputer.refresh(TRENDS, version=1)
+    assert precomputer.refresh(TRENDS, version=2) == 0
+    changed = [dict(TRENDS[0], outbreaks=1500), TRENDS[1]]
+    assert [item['id'] for item in precomputer.pending(changed)] == [1]
+    assert precomputer.refresh(changed, version=3) == 1
+    assert store.get('1')['trends_version'] == 3
+    assert store.get('2')['trends_version'] == 1
+
+
+def test_failed_generations_stay_pending(store):
+    precomputer = _precomputer(store, StubHealthAssistant(fail=True))
+    assert precomputer.refresh(TRENDS) == 0
+    assert len(precomputer.pending(TRENDS)) == 2
+
+
+def test_one_process_runs_the_precompute(store):
+    other = _precomputer(store)
+    assert store.claim(NarrativePrecomputer.LEASE, other.owner)
+    assert _precomputer(store).refresh(TRENDS) == 0
+    store.release(NarrativePrecomputer.LEASE, other.owner)
+    assert _precomputer(store).refresh(TRENDS) == 2
+
+
+def test_generation_yields_to_interactive_traffic(store, monkeypatch):
+    monkeypatch.setattr('utils.narrative_store.NARRATIVE_BACKOFF', 0.01)
+    checks = []
+
+    def is_busy():
+        checks.append(1)
+        return len(checks) < 3  # Busy for the first two checks
+
+    router = HealthAssistantRouter([('stub', StubHealthAssistant())], attempts=1)
+    precomputer = NarrativePrecomputer(store, lambda after, timeout: None, router.narrate_disease, busy=is_busy,
+                                       concurrency=1)
+    assert precomputer.refresh(TRENDS[:1]) == 1
+    assert len(checks) >= 3
+
+
+def test_readers_see_stale_and_pending_narratives(store, monkeypatch):
+    _precomputer(store).refresh(TRENDS[:1])
+    trends = [dict(TRENDS[0], outbreaks=1500), TRENDS[1]]
+    monkeypatch.setattr(services, 'get_narrative_precomputer', lambda: None)
+    monkeypatch.setattr(services, 'get_narrative_store', lambda: store)
+    monkeypatch.setattr(services, 'get_trends_data', lambda: trends)
+    result = services.get_disease_narratives()
+    assert [(n['id'], n['stale']) for n in result['narratives']] == [('1', True)]
+    assert result['pending'] == [2]
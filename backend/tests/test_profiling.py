@@ -0,0 +1,35 @@
+from utils.profiling import Profiler
+
+
+def _record(profiler, route):
+    profile = profiler.start(route, 'GET', 'header')
+    sum(range(1000))
+    profile.status = 200
+    profiler.finish(profile)
+    return profile
+
+
+def test_profiles_are_shared_through_the_directory(tmp_path):
+    recorder = Profiler(token='secret', directory=str(tmp_path))
+    profile = _record(recorder, '/api/disease-trends')
+
+    # Another worker: a profiler with nothing in memory
+    reader = Profiler(token='secret', directory=str(tmp_path))
+    assert [summary['id'] for summary in reader.list()] == [profile.id]
+    assert reader.get(profile.id)['route'] == '/api/disease-trends'
+    assert reader.folded(profile.id) == profile.folded()
+
+
+def test_only_the_newest_profiles_are_kept(tmp_path):
+    profiler = Profiler(token='secret', directory=str(tmp_path), keep=2)
+    ids = [_record(profiler, f"/route/{i}").id for i in range(4)]
+    kept = [summary['id'] for summary in profiler.list()]
+    assert len(kept) == 2
+    assert set(kept) <= set(ids)
+    assert len(list(tmp_path.iterdir())) == 4  # .json and .folded per kept profile
+
+
+def test_unknown_or_unsafe_ids_are_not_found(tmp_path):
+    profiler = Profiler(token='secret', directory=str(tmp_path))
+    assert profiler.get('0123456789abcdef') is None
+    assert profiler.folded('../../etc/passwd') is None
@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+from app import services
+from utils.report_summary import DISCLAIMER, summarize_report
+
+KNOWN = {'diseases': ['Hypertension'], 'medications': [{'name': 'Tab Metformin', 'dosage': '500 mg', 'frequency': 'BD'}]}
+MIXED = {'diseases': ['Hypertension', 'Zorblax syndrome'],
+         'medications': [{'name': 'Tab Metformin', 'dosage': '500 mg', 'frequency': 'BD'},
+                         {'name': 'Qwertizumab', 'dosage': '', 'frequency': ''}]}
+
+
+def test_known_terms_are_summarised_locally():
+    summary, unknown = summarize_report(KNOWN)
+    assert unknown is None
+    assert 'high blood pressure' in summary and 'twice a day' in summary
+    assert summary.endswith(DISCLAIMER)
+
+
+def test_unknown_terms_leave_a_partial_summary():
+    summary, unknown = summarize_report(MIXED)
+    assert unknown == {'diseases': ['Zorblax syndrome'], 'medications': [MIXED['medications'][1]]}
+    assert 'high blood pressure' in summary and DISCLAIMER not in summary
+    assert summarize_report({'diseases': ['Zorblax syndrome'], 'medications': []})[0] is None
+
+
+def test_llm_is_asked_only_about_unknown_terms(monkeypatch):
+    prompts = []
+
+    def completion(client, messages, **kwargs):
+        prompts.append(messages[0]['content'])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='• Qwertizumab: explained.'))])
+
+    monkeypatch.setattr(services, 'extract_report', lambda *args, **kwargs: {**MIXED, 'is_medical': True})
+    monkeypatch.setattr(services, 'get_groq_client', lambda key: None)
+    monkeypatch.setattr(services, 'timed_completion', completion)
+    result = services._run_comprehensive_analysis(b'image', None)
+
+    assert len(prompts) == 1
+    assert 'Zorblax syndrome' in prompts[0] and 'Qwertizumab' in prompts[0]
+    assert 'Hypertension' not in prompts[0] and 'Metformin' not in prompts[0]
+    assert 'high blood pressure' in result['summary'] and '• Qwertizumab: explained.' in result['summary']
+    assert result['summary'].endswith(DISCLAIMER)
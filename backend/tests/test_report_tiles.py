@@ -0,0 +1,49 @@
+import io
+
+from PIL import Image
+
+from utils.report_tiles import _bands, merge_extractions, plan_bands, render_band
+
+
+def _page(width, height, orientation=None):
+    image = Image.new('L', (width, height), 255)
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+def test_bands_overlap_and_cover_the_page():
+    rows = _bands(5000, 1400, 200, 6)
+    assert rows[0][0] == 0 and rows[-1][1] == 5000
+    assert all(prev[1] - nxt[0] >= 200 for prev, nxt in zip(rows, rows[1:]))
+
+
+def test_short_page_is_one_band():
+    _, boxes, _ = plan_bands(_page(1000, 1200))
+    assert boxes == []
+
+
+def test_sideways_photo_is_banded_upright():
+    # Stored 6000 wide by 1000 high, displayed rotated 90 degrees: a tall page
+    image, boxes, scale = plan_bands(_page(6000, 1000, orientation=6), max_width=1000)
+    assert image.size == (1000, 6000)
+    assert len(boxes) > 1
+    assert all(box[2] == 1000 for box in boxes)
+    band = Image.open(io.BytesIO(render_band(image, boxes[0], scale)))
+    assert band.width == 1000
+
+
+def test_overlapping_readings_merge():
+    merged = merge_extractions([
+        {'is_medical': True, 'medications': [{'name': 'Tab Metformin', 'dosage': '500 mg', 'frequency': ''}],
+         'diseases': ['Diabetes']},
+        {'is_medical': False, 'medications': [{'name': 'Metformin', 'dosage': '500mg', 'frequency': '1-0-1'},
+                                              {'name': 'Metformin', 'dosage': '1000 mg', 'frequency': ''}],
+         'diseases': ['diabetes']},
+    ])
+    assert merged['is_medical'] is True
+    assert merged['diseases'] == ['Diabetes']
+    assert [(m['name'], m['frequency']) for m in merged['medications']] == [('Tab Metformin', '1-0-1'), ('Metformin', '')]
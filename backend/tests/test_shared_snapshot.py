@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from app import create_app, services
+from utils.shared_snapshot import SharedSnapshot
+
+DATA = [{'disease': 'Dengue', 'outbreaks': 1200}]
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    return SharedSnapshot('trends', lambda: DATA, max_age=3600, directory=str(tmp_path))
+
+
+def test_publish_then_map(snapshot):
+    current = snapshot.get()
+    assert current.version == 1
+    assert current.decode() == DATA
+    with current.open_body() as f:
+        assert f.read() == current.to_bytes()
+
+
+def test_new_version_after_expiry(snapshot, monkeypatch):
+    first = snapshot.get()
+    snapshot.max_age = -1
+    monkeypatch.setattr(snapshot, '_checked_at', 0.0)
+    assert snapshot.get().version == first.version + 1
+    assert snapshot.load(first.version).decode() == DATA
+
+
+def test_trends_route_serves_the_snapshot_file(snapshot, monkeypatch):
+    monkeypatch.setattr(services, 'get_trends_snapshot', snapshot.get)
+    response = create_app().test_client().get('/api/disease-trends')
+    assert response.status_code == 200
+    assert response.headers['X-Snapshot-Version'] == '1'
+    assert int(response.headers['Content-Length']) == len(response.data)
+    assert json.loads(response.data) == DATA
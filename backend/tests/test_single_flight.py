@@ -0,0 +1,80 @@
+import threading
+import time
+
+from utils import deadline
+from utils.single_flight import SingleFlight
+
+
+def _leader_and_follower(flight, fn, leader_budget, follower_budget):
+    """Run a leader and a follower on one key; return each side's result or exception."""
+    outcomes = {}
+    entered = threading.Event()
+
+    def run(role, budget):
+        token = deadline.bind(budget) if budget is not None else None
+        try:
+            outcomes[role] = flight.do('key', fn, entered)
+        except Exception as e:
+            outcomes[role] = e
+        finally:
+            if token is not None:
+                deadline.unbind(token)
+
+    leader = threading.Thread(target=run, args=('leader', leader_budget))
+    leader.start()
+    entered.wait(1)
+    follower = threading.Thread(target=run, args=('follower', follower_budget))
+    follower.start()
+    leader.join(2)
+    follower.join(2)
+    return outcomes
+
+
+def _slow_call(calls):
+    def fn(entered):
+        calls.append(threading.current_thread().name)
+        entered.set()
+        time.sleep(0.1)
+        deadline.check()
+        return {'answer': len(calls)}
+    return fn
+
+
+def test_follower_retries_when_leader_runs_out_of_time():
+    calls = []
+    outcomes = _leader_and_follower(SingleFlight('test'), _slow_call(calls), 0.03, None)
+    assert isinstance(outcomes['leader'], deadline.DeadlineExceeded)
+    assert outcomes['follower'] == {'answer': 2}
+    assert len(calls) == 2
+
+
+def test_follower_out_of_time_still_raises():
+    calls = []
+    outcomes = _leader_and_follower(SingleFlight('test'), _slow_call(calls), 0.03, 0.03)
+    assert isinstance(outcomes['follower'], deadline.DeadlineExceeded)
+    assert len(calls) == 1
+
+
+def test_follower_shares_other_errors():
+    calls = []
+
+    def fn(entered):
+        calls.append(1)
+        entered.set()
+        time.sleep(0.05)
+        raise ValueError('upstream said no')
+
+    outcomes = _leader_and_follower(SingleFlight('test'), fn, None, None)
+    assert isinstance(outcomes['follower'], ValueError)
+    assert len(calls) == 1
+
+
+def test_follower_gets_a_copy_of_the_result():
+    def fn(entered):
+        entered.set()
+        time.sleep(0.05)
+        return {'items': []}
+
+    outcomes = _leader_and_follower(SingleFlight('test'), fn, None, None)
+    assert outcomes['leader'] == outcomes['follower']
+    assert outcomes['leader'] is not outcomes['follower']
@@ -0,0 +1,13 @@
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_create_app_imports_no_heavy_libraries():
+    # A fresh interpreter: other tests have already imported the SDKs into this one
+    code = ("import sys; from app import create_app; create_app(); "
+            "print(','.join(m for m in ('groq', 'numpy', 'PIL', 'google.generativeai') if m in sys.modules))")
+    out = subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1:] in ([], [''])
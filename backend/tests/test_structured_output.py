@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+
+import pytest
+
+from utils.structured_output import (CONTINUE_PROMPT, Field, StructuredOutputError, parse_structured, repair_json,
+                                     structured_completion)
+
+FIELDS = {
+    'summary': Field('str', required=True),
+    'is_medical': Field('bool', required=True),
+    'diseases': Field('list', default=[], items=Field('str')),
+}
+
+
+@pytest.mark.parametrize('text, expected, repaired, truncated', [
+    ('{"a": 1}', {'a': 1}, False, False),
+    ('```json\n{"a": 1}\n```', {'a': 1}, True, False),
+    ('Here you go: {"a": [1, 2,],} thanks', {'a': [1, 2]}, True, False),
+    ('{"a": 1} and also {"b": 2}', {'a': 1}, True, False),
+    ('[1, 2]', [1, 2], False, False),
+    # Truncated inside a value: the partial string is kept
+    ('{"a": "hel', {'a': 'hel'}, True, True),
+    ('{"a": "say \\"hi', {'a': 'say "hi'}, True, True),
+    ('{"a": "x\\', {'a': 'x'}, True, True),
+    # Truncated in a key, after a colon or comma: cut back to the last complete value
+    ('{"a": 1, "bb', {'a': 1}, True, True),
+    ('{"a": 1, "b":', {'a': 1}, True, True),
+    ('{"a": 1,', {'a': 1}, True, True),
+    # A literal cut short may be incomplete (12 of 120), so it is dropped
+    ('{"a": 1, "b": 12', {'a': 1}, True, True),
+    ('{"a": tru', {}, True, True),
+    # Brackets inside strings do not count
+    ('{"a": "}{", "b": [1, {"c": 2', {'a': '}{', 'b': [1, {}]}, True, True),
+    ('```json\n{"a": [1, 2', {'a': [1]}, True, True),
+])
+def test_repair_json(text, expected, repaired, truncated):
+    assert repair_json(text) == (expected, repaired, truncated)
+
+
+@pytest.mark.parametrize('text', ['', None, 'Sorry, I cannot read this image.'])
+def test_no_document_is_an_error(text):
+    with pytest.raises(StructuredOutputError):
+        repair_json(text)
+
+
+def test_validation_coerces_and_reports_missing_fields():
+    document, _, _ = parse_structured('{"summary": " ok ", "is_medical": "yes", "diseases": "Asthma"}', FIELDS)
+    assert document == {'summary': 'ok', 'is_medical': True, 'diseases': ['Asthma']}
+    with pytest.raises(StructuredOutputError) as error:
+        parse_structured('{"summary": "ok", "is_med', FIELDS)
+    assert 'is_medical: missing' in str(error.value)
+    assert error.value.truncated is True
+
+
+class FakeClient:
+    """chat.completions.create() returning the scripted replies (or raising them) in order."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        text, finish_reason = reply
+        message = SimpleNamespace(content=text)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)], usage=None)
+
+
+def _complete(client):
+    return structured_completion(client, 'test', FIELDS, model='test-model', response_format={'type': 'json_object'},
+                                 messages=[{'role': 'user', 'content': 'extract'}])
+
+
+def test_truncated_output_is_continued():
+    client = FakeClient(('{"summary": "ok", "is_med', 'length'), ('ical": false}', 'stop'))
+    assert _complete(client) == {'summary': 'ok', 'is_medical': False, 'diseases': []}
+    follow_up = client.calls[1]
+    assert follow_up['messages'][-1]['content'] == CONTINUE_PROMPT
+    assert 'response_format' not in follow_up
+
+
+def test_invalid_output_is_corrected_once():
+    client = FakeClient(('I could not find JSON here.', 'stop'), ('{"summary": "ok", "is_medical": true}', 'stop'))
+    assert _complete(client)['is_medical'] is True
+    assert len(client.calls) == 2
+    assert client.calls[1]['response_format'] == {'type': 'json_object'}
+
+
+def test_rejected_json_mode_output_is_repaired_locally():
+    rejected = RuntimeError('json_validate_failed')
+    rejected.body = {'error': {'failed_generation': '{"summary": "ok", "is_medical": "true",}'}}
+    client = FakeClient(rejected)
+    assert _complete(client)['is_medical'] is True
+    assert len(client.calls) == 1
+
+
+def test_second_failure_raises():
+    client = FakeClient(('nope', 'stop'), ('still nope', 'stop'))
+    with pytest.raises(StructuredOutputError):
+        _complete(client)
@@ -0,0 +1,22 @@
+from utils.token_ledger import TokenLedger
+
+
+def test_flush_writes_usage_since_last_flush(tmp_path):
+    path = tmp_path / 'ledger.jsonl'
+    ledger = TokenLedger(path=str(path), flush_interval=3600)
+    ledger.record('llama', 10, 5, conversation='conv-1')
+    ledger.record('llama', 1, 1, conversation='conv-1')
+    assert ledger.flush() == 1
+    assert ledger.flush() == 0
+    assert '"prompt_tokens": 11' in path.read_text()
+
+
+def test_no_flush_interval_keeps_nothing_pending(tmp_path):
+    path = tmp_path / 'ledger.jsonl'
+    ledger = TokenLedger(path=str(path), flush_interval=0)
+    for i in range(100):
+        ledger.record('llama', 10, 5, conversation=f'conv-{i}', client='1.2.3.4')
+    assert ledger._pending == {}
+    assert ledger.report('client', '1.2.3.4')[0]['calls'] == 100
+    assert ledger.flush() == 0
+    assert not path.exists()
@@ -0,0 +1,201 @@
+import os
+import math
+import time
+import threading
+from collections import OrderedDict
+from utils import metrics as telemetry
+
+# Route classes: LLM chat, VLM report analysis and cheap static/dashboard data.
+# Each gets its own concurrency limit and bounded wait queue so a slow upstream
+# saturates only its own class.
+ROUTE_CLASSES = {
+    'llm': {
+        'concurrency': int(os.getenv('ADMISSION_LLM_CONCURRENCY', 8)),
+        'queue': int(os.getenv('ADMISSION_LLM_QUEUE', 16)),
+        'wait': float(os.getenv('ADMISSION_LLM_WAIT', 5)),  # Seconds a request may queue
+        'rate': float(os.getenv('RATE_LIMIT_LLM', 30)),  # Requests per client per minute
+    },
+    'vlm': {
+        'concurrency': int(os.getenv('ADMISSION_VLM_CONCURRENCY', 2)),
+        'queue': int(os.getenv('ADMISSION_VLM_QUEUE', 4)),
+        'wait': float(os.getenv('ADMISSION_VLM_WAIT', 10)),
+        'rate': float(os.getenv('RATE_LIMIT_VLM', 10)),
+    },
+    'static': {
+        'concurrency': int(os.getenv('ADMISSION_STATIC_CONCURRENCY', 64)),
+        'queue': int(os.getenv('ADMISSION_STATIC_QUEUE', 128)),
+        'wait': float(os.getenv('ADMISSION_STATIC_WAIT', 2)),
+        'rate': float(os.getenv('RATE_LIMIT_STATIC', 300)),
+    },
+}
+RATE_LIMIT_CLIENTS = int(os.getenv('RATE_LIMIT_CLIENTS', 10000))  # Client buckets tracked per class
+# A request holds a server thread while it runs and while it queues. Slow
+# classes together may hold at most WORKER_THREADS - ADMISSION_RESERVED_THREADS
+# of a worker's threads, so static data and /metrics always find a free one.
+WORKER_THREADS = int(os.getenv('GUNICORN_THREADS', 8))  # Request threads per worker process (see gunicorn.conf.py)
+ADMISSION_RESERVED_THREADS = int(os.getenv('ADMISSION_RESERVED_THREADS', max(1, WORKER_THREADS // 4)))
+SLOW_CLASSES = ('llm', 'vlm')
+
+ADMISSION_DECISIONS = telemetry.counter(
+    'curebird_admission_total', 'Admission decisions by route class.', ('route_class', 'outcome')
+)
+ADMISSION_INFLIGHT = telemetry.gauge('curebird_admission_inflight', 'Requests holding a slot.', ('route_class',))
+ADMISSION_WAITING = telemetry.gauge('curebird_admission_waiting', 'Requests queued for a slot.', ('route_class',))
+
+
+class Rejected(Exception):
+    """Raised when a request is refused; `retry_after` is in whole seconds."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    At most `concurrency` requests run at once; up to `queue` more wait at most
+    `wait` seconds for a slot. Anything beyond that is rejected immediately.
+    """
+
+    def __init__(self, name, concurrency, queue, wait):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.queue = max(0, queue)
+        self.wait = wait
+        self.active = 0
+        self.waiting = 0
+        self.service_time = 1.0  # EWMA of slot hold time, used for Retry-After
+        self._cond = threading.Condition()
+        ADMISSION_INFLIGHT.set_function(lambda: self.active, name)
+        ADMISSION_WAITING.set_function(lambda: self.waiting, name)
+
+    def _retry_after(self):
+        backlog = (self.waiting + 1) / self.concurrency
+        return max(1, math.ceil(backlog * self.service_time))
+
+    def acquire(self):
+        with self._cond:
+            if self.active < self.concurrency and self.waiting == 0:
+                self.active += 1
+                return
+            if self.waiting >= self.queue:
+                raise Rejected('queue_full', self._retry_after())
+
+            deadline = time.monotonic() + self.wait
+            self.waiting += 1
+            try:
+                while self.active >= self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Rejected('queue_timeout', self._retry_after())
+                    self._cond.wait(remaining)
+                self.active += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self, held_for):
+        with self._cond:
+            self.active -= 1
+            self.service_time = 0.8 * self.service_time + 0.2 * held_for
+            self._cond.notify()
+
+
+class RateLimiter:
+    """
+    Token bucket per client: `per_minute` sustained, bursting up to the same
+    amount. A request may cost several tokens (one per item of a batch); the
+    cost is capped at the bucket size so any allowed request can eventually run.
+    """
+
+    def __init__(self, per_minute, max_clients=RATE_LIMIT_CLIENTS):
+        self.capacity = max(1.0, per_minute)
+        self.refill = per_minute / 60.0
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # client -> (tokens, last_refill)
+        self._lock = threading.Lock()
+
+    def take(self, client, cost=1):
+        cost = min(max(1, cost), self.capacity)
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(client, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.refill)
+            if tokens < cost:
+                self._buckets[client] = (tokens, now)
+                raise Rejected('rate_limited', max(1, math.ceil((cost - tokens) / self.refill)))
+            self._buckets[client] = (tokens - cost, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+
+
+class AdmissionController:
+    """
+    Per-class limits plus a cap on the worker threads the slow classes hold
+    (running or queued): past `slow_threads`, slow requests are rejected at once
+    instead of waiting on a thread that static requests need.
+    """
+
+    def __init__(self, classes=ROUTE_CLASSES, slow_threads=WORKER_THREADS - ADMISSION_RESERVED_THREADS):
+        self.limiters = {}
+        self.rates = {}
+        for name, config in classes.items():
+            self.limiters[name] = ConcurrencyLimiter(name, config['concurrency'], config['queue'], config['wait'])
+            self.rates[name] = RateLimiter(config['rate'])
+        self.slow_threads = max(1, slow_threads)
+        self.slow_held = 0
+        self._slow_lock = threading.Lock()
+
+    def _hold_thread(self, route_class):
+        with self._slow_lock:
+            if self.slow_held >= self.slow_threads:
+                raise Rejected('threads_busy', self.limiters[route_class]._retry_after())
+            self.slow_held += 1
+
+    def _drop_thread(self):
+        with self._slow_lock:
+            self.slow_held -= 1
+
+    def admit(self, route_class, client, cost=1):
+        """Charge `cost` against the client's rate, then take a slot. Returns an opaque ticket for `release`."""
+        slow = route_class in SLOW_CLASSES
+        try:
+            self.rates[route_class].take(client, cost)
+            if slow:
+                self._hold_thread(route_class)
+            try:
+                self.limiters[route_class].acquire()
+            except Rejected:
+                if slow:
+                    self._drop_thread()
+                raise
+        except Rejected as e:
+            ADMISSION_DECISIONS.inc(route_class, e.reason)
+            raise
+        ADMISSION_DECISIONS.inc(route_class, 'admitted')
+        return route_class, time.monotonic()
+
+    def release(self, ticket):
+        route_class, started = ticket
+        self.limiters[route_class].release(time.monotonic() - started)
+        if route_class in SLOW_CLASSES:
+            self._drop_thread()
+
+    def busy(self, route_class, share=0.5):
+        """True while requests of the class are queued or at least `share` of its slots are taken (background work backs off)."""
+        limiter = self.limiters[route_class]
+        return limiter.waiting > 0 or limiter.active >= max(1, limiter.concurrency * share)
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """Get or create the process-wide admission controller."""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController()
+    return _controller
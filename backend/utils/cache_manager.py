@@ -2,6 +2,10 @@ import json
 import os
 import time
 import hashlib
+from utils.metrics import record_cache
+from utils.logger import get_logger
+
+logger = get_logger('cache_manager')
 
 CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache')
 
@@ -20,6 +24,7 @@ class CacheManager:
     def get(self, key):
         cache_path = self._get_cache_path(key)
         if not os.path.exists(cache_path):
+            record_cache('cache_manager', False)
             return None
         
         try:
@@ -28,11 +33,14 @@ class CacheManager:
             
             # Check expiration
             if time.time() - data['timestamp'] > self.expiration_seconds:
+                record_cache('cache_manager', False)
                 return None
             
+            record_cache('cache_manager', True)
             return data['payload']
         except Exception as e:
-            print(f"Cache read error: {e}")
+            logger.error("Cache read error", extra={'error': str(e)})
+            record_cache('cache_manager', False)
             return None
 
     def set(self, key, payload):
@@ -45,7 +53,7 @@ class CacheManager:
             with open(cache_path, 'w') as f:
                 json.dump(data, f)
         except Exception as e:
-            print(f"Cache write error: {e}")
+            logger.error("Cache write error", extra={'error': str(e)})
 
 # Global instance
 cache = CacheManager()
@@ -0,0 +1,250 @@
+import os
+import time
+import select
+import socket
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import TimeoutError as FutureTimeout
+from utils import metrics as telemetry
+from utils.logger import get_logger
+
+logger = get_logger('deadline')
+
+# Default request deadline per admission class (seconds; 0 = none). X-Request-Timeout can only shorten it.
+REQUEST_DEADLINES = {
+    'llm': float(os.getenv('REQUEST_DEADLINE_LLM', 30)),
+    'vlm': float(os.getenv('REQUEST_DEADLINE_VLM', 60)),
+    'static': float(os.getenv('REQUEST_DEADLINE_STATIC', 0)),
+}
+DEADLINE_MIN_ATTEMPT = float(os.getenv('DEADLINE_MIN_ATTEMPT', 2))  # A retry needs at least this long left after its backoff
+DEADLINE_POLL = 0.25  # Seconds between client-disconnect checks
+
+DEADLINE_OUTCOMES = telemetry.counter(
+    'curebird_deadline_total', 'Deadline outcomes: deadline_exceeded, client_disconnected, retry_skipped.', ('reason',)
+)
+
+_current = contextvars.ContextVar('curebird_deadline', default=None)
+# Per-attempt timeout while a caller (the provider router) owns retries; None = providers retry themselves
+_single_attempt = contextvars.ContextVar('curebird_single_attempt', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before the work could finish."""
+
+    reason = 'deadline_exceeded'
+
+
+class Cancelled(DeadlineExceeded):
+    """The client went away; nobody will read the result."""
+
+    reason = 'client_disconnected'
+
+
+class Deadline:
+    """
+    Time budget for one request, on the monotonic clock. `cancelled` is set
+    when the client disconnects. A deadline shared with single-flight
+    followers ignores cancellation, since other requests still want the result.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.cancelled = threading.Event()
+        self.shared = False
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    def cancel(self):
+        if not self.shared and not self.cancelled.is_set():
+            self.cancelled.set()
+            DEADLINE_OUTCOMES.inc(Cancelled.reason)
+
+    def check(self):
+        """Raise Cancelled or DeadlineExceeded if the work should stop now."""
+        if self.cancelled.is_set():
+            raise Cancelled('client disconnected')
+        if self.expired:
+            raise DeadlineExceeded(f'request deadline of {self.seconds:g}s exceeded')
+
+
+def bind(seconds):
+    """Start a deadline for the current context; returns a token for unbind()."""
+    return _current.set(Deadline(seconds))
+
+
+def unbind(token):
+    try:
+        _current.reset(token)
+    except ValueError:
+        # Token from another context (e.g. a request torn down on a different thread)
+        pass
+
+
+def current():
+    return _current.get()
+
+
+def check():
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check()
+
+
+@contextmanager
+def single_attempt(timeout):
+    """
+    Within the block, upstream calls make one attempt of at most `timeout`
+    seconds: no SDK or provider retries. Used by the provider router, which
+    retries and fails over itself.
+    """
+    token = _single_attempt.set(timeout)
+    try:
+        yield
+    finally:
+        _single_attempt.reset(token)
+
+
+def retries_owned_by_caller():
+    """True inside single_attempt(): providers must not retry."""
+    return _single_attempt.get() is not None
+
+
+def attempt_timeout(cap=None):
+    """
+    Timeout for the next upstream attempt: what is left of the deadline,
+    capped at `cap` and at the single_attempt() timeout. Raises if nothing is
+    left; None when nothing bounds the attempt.
+    """
+    single = _single_attempt.get()
+    if single is not None:
+        cap = single if cap is None else min(cap, single)
+    deadline = _current.get()
+    if deadline is None:
+        return cap
+    deadline.check()
+    remaining = deadline.remaining()
+    return remaining if cap is None else min(cap, remaining)
+
+
+def allows_retry(backoff):
+    """
+    False when providers must not retry (single_attempt()), or (counted) when a
+    retry after `backoff` seconds could not finish before the deadline.
+    """
+    if _single_attempt.get() is not None:
+        return False
+    deadline = _current.get()
+    if deadline is None or deadline.remaining() >= backoff + DEADLINE_MIN_ATTEMPT:
+        return True
+    DEADLINE_OUTCOMES.inc('retry_skipped')
+    return False
+
+
+def sleep(seconds):
+    """time.sleep that wakes early and raises Cancelled if the client disconnects."""
+    deadline = _current.get()
+    if deadline is None:
+        time.sleep(seconds)
+        return
+    if deadline.cancelled.wait(seconds):
+        raise Cancelled('client disconnected')
+
+
+def wait_result(future, timeout):
+    """future.result(timeout) that gives up early when the deadline is cancelled; raises FutureTimeout."""
+    deadline = _current.get()
+    if deadline is None:
+        return future.result(timeout=timeout)
+    end = time.monotonic() + timeout
+    while True:
+        if deadline.cancelled.is_set():
+            future.cancel()
+            raise Cancelled('client disconnected')
+        try:
+            return future.result(timeout=max(0.0, min(DEADLINE_POLL, end - time.monotonic())))
+        except FutureTimeout:
+            if time.monotonic() >= end:
+                raise
+
+
+class DisconnectWatcher:
+    """
+    One background thread that notices when clients of long requests hang up.
+    A socket that polls readable but yields no data has been closed by the
+    peer (or the proxy in front of it), and its deadline is cancelled. The
+    thread sleeps while nothing is registered.
+    """
+
+    def __init__(self, interval=DEADLINE_POLL):
+        self.interval = interval
+        self._watched = {}
+        self._wake = threading.Condition()
+        self._thread = None
+
+    def register(self, sock, deadline):
+        with self._wake:
+            self._watched[sock] = deadline
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='disconnect-watcher', daemon=True)
+                self._thread.start()
+            self._wake.notify()
+
+    def unregister(self, sock):
+        with self._wake:
+            self._watched.pop(sock, None)
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while not self._watched:
+                    self._wake.wait()
+                watched = dict(self._watched)
+            try:
+                readable, _, _ = select.select(list(watched), [], [], 0)
+            except (OSError, ValueError):
+                # A socket closed under us; check them one by one
+                readable = [sock for sock in watched if self._closed(sock)]
+            for sock in readable:
+                if self._hung_up(sock):
+                    logger.info("Client disconnected, cancelling request")
+                    watched[sock].cancel()
+                    self.unregister(sock)
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _closed(sock):
+        try:
+            return sock.fileno() < 0
+        except OSError:
+            return True
+
+    @staticmethod
+    def _hung_up(sock):
+        try:
+            return sock.recv(1, socket.MSG_PEEK | getattr(socket, 'MSG_DONTWAIT', 0)) == b''
+        except (BlockingIOError, InterruptedError, ValueError):
+            # No data yet, or a TLS socket that cannot peek: treat as connected
+            return False
+        except OSError:
+            return True
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def get_disconnect_watcher():
+    """Get or create the process-wide disconnect watcher."""
+    global _watcher
+    if _watcher is None:
+        with _watcher_lock:
+            if _watcher is None:
+                _watcher = DisconnectWatcher()
+    return _watcher
@@ -0,0 +1,208 @@
+import os
+import re
+import json
+import threading
+import numpy as np
+from utils.logger import get_logger
+
+logger = get_logger('disease_index')
+
+EPIDEMIOLOGY_STORE = os.getenv('EPIDEMIOLOGY_STORE', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'india_epidemiology_data.json'))
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', 3))  # Disease records injected per chat turn
+RETRIEVAL_MIN_SCORE = float(os.getenv('RETRIEVAL_MIN_SCORE', 1.0))  # BM25 score below which a record is ignored
+RETRIEVAL_RELATIVE_CUTOFF = 0.35  # Drop hits scoring under this fraction of the best hit
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Field weights: a term in the disease name counts three times a term in its description
+FIELD_WEIGHTS = (
+    ('name', 3.0),
+    ('category', 2.0),
+    ('segment', 1.0),
+    ('about', 1.0),
+    ('trends', 1.0),
+    ('seasonality', 1.0),
+    ('severity', 1.0),
+    ('metrics', 0.5),
+)
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_STOPWORDS = frozenset("""
+a an and are as at be by can do does for from has have how i in is it its me my of on or
+our so that the their there these this to was what when where which who why will with you your
+tell about please any much many most more india indian current currently
+case disease illnesse illness condition problem risk high level rate trend data health stat
+increasing rising common watch
+""".split())
+
+
+def _stem(token):
+    """Light plural stripping so 'infections'/'infection' and 'fevers'/'fever' meet."""
+    if len(token) > 3:
+        if token.endswith('ies'):
+            return token[:-3] + 'y'
+        if token.endswith('s') and not token.endswith(('ss', 'us', 'is')):
+            return token[:-1]
+    return token
+
+
+def tokenize(text):
+    tokens = (_stem(t) for t in _TOKEN_RE.findall(str(text).lower()))
+    return [t for t in tokens if t not in _STOPWORDS]
+
+
+def _field_text(record, field):
+    if field == 'metrics':
+        metrics = record.get('metrics') or {}
+        return ' '.join(str(v) for v in metrics.values() if isinstance(v, str))
+    return str(record.get(field) or '')
+
+
+def _format_count(value):
+    return f"{value:,}" if isinstance(value, (int, float)) else str(value)
+
+
+def format_record(record, detailed=True):
+    """One prompt line per disease record; the short form keeps only the figures and trend."""
+    metrics = record.get('metrics') or {}
+    figures = []
+    for key, label in (('weekly_reported_cases', 'weekly reported'), ('weekly_notified_cases', 'weekly notified'),
+                       ('annual_confirmed_cases', 'annual confirmed'), ('prevalence', 'prevalence'),
+                       ('estimated_affected', 'estimated affected'), ('estimated_national_burden', 'burden')):
+        if metrics.get(key) not in (None, ''):
+            figures.append(f"{label} {_format_count(metrics[key])}")
+    parts = [f"- {record.get('name', 'Unknown')} ({record.get('category', 'Uncategorized')})"]
+    if figures:
+        parts.append('; '.join(figures))
+    fields = (('severity', 'Severity'), ('seasonality', 'Seasonality'), ('trends', 'Trend'), ('about', 'About'))
+    for key, label in fields if detailed else fields[2:3]:
+        if record.get(key):
+            parts.append(f"{label}: {str(record[key]).rstrip('.')}")
+    return '. '.join(parts) + '.'
+
+
+class DiseaseIndex:
+    """
+    BM25 index over disease records. Postings are stored as flat numpy arrays
+    sorted by term with each posting's BM25 weight precomputed, so a query is
+    a handful of slice-adds into one score vector.
+    """
+
+    def __init__(self, records, version=None):
+        self.records = records
+        self.version = version
+        self.size = len(records)
+        self.vocabulary = {}
+
+        term_ids, doc_ids, freqs = [], [], []
+        lengths = np.zeros(self.size, dtype=np.float64)
+        for doc, record in enumerate(records):
+            counts = {}
+            for field, weight in FIELD_WEIGHTS:
+                for token in tokenize(_field_text(record, field)):
+                    counts[token] = counts.get(token, 0.0) + weight
+            lengths[doc] = sum(counts.values())
+            for token, tf in counts.items():
+                term_ids.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+                doc_ids.append(doc)
+                freqs.append(tf)
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind='stable')
+        self._docs = np.asarray(doc_ids, dtype=np.int64)[order]
+        tf = np.asarray(freqs, dtype=np.float64)[order]
+        self._offsets = np.searchsorted(term_ids[order], np.arange(len(self.vocabulary) + 1))
+
+        doc_freq = np.diff(self._offsets).astype(np.float64)
+        idf = np.log1p((self.size - doc_freq + 0.5) / (doc_freq + 0.5))
+        avg_length = lengths.mean() if self.size else 1.0
+        norm = K1 * (1 - B + B * lengths[self._docs] / max(avg_length, 1e-9))
+        self._weights = np.repeat(idf, np.diff(self._offsets)) * tf * (K1 + 1) / (tf + norm)
+
+    def scores(self, query):
+        scores = np.zeros(self.size, dtype=np.float64)
+        for token in set(tokenize(query)):
+            term = self.vocabulary.get(token)
+            if term is None:
+                continue
+            start, end = self._offsets[term], self._offsets[term + 1]
+            scores[self._docs[start:end]] += self._weights[start:end]
+        return scores
+
+    def search(self, query, k=RETRIEVAL_TOP_K, min_score=RETRIEVAL_MIN_SCORE):
+        """Top-k (record, score) pairs for the query, best first; empty when nothing is relevant."""
+        if not self.size or k <= 0:
+            return []
+        scores = self.scores(query)
+        k = min(k, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        best = scores[top[0]]
+        cutoff = max(min_score, best * RETRIEVAL_RELATIVE_CUTOFF)
+        return [(self.records[i], float(scores[i])) for i in top if scores[i] >= cutoff]
+
+
+def _file_version(path):
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+class DiseaseRetriever:
+    """Keeps a DiseaseIndex over the epidemiology store, rebuilt only when the file changes."""
+
+    def __init__(self, path=EPIDEMIOLOGY_STORE):
+        self.path = path
+        self._index = None
+        self._lock = threading.Lock()
+
+    def index(self):
+        version = _file_version(self.path)
+        index = self._index
+        if index is not None and index.version == version:
+            return index
+        with self._lock:
+            if self._index is None or self._index.version != version:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                records = data.get('diseases', []) if isinstance(data, dict) else data
+                self._index = DiseaseIndex(records, version)
+                logger.info("Disease index built", extra={'records': self._index.size,
+                                                         'terms': len(self._index.vocabulary), 'version': version})
+        return self._index
+
+    def context_for(self, *queries, k=RETRIEVAL_TOP_K):
+        """
+        Prompt block with the records relevant to the first query that matches
+        anything (callers pass the current message, then earlier turns for
+        follow-ups like "and its symptoms?"). Empty string when nothing matches.
+        """
+        try:
+            index = self.index()
+        except (OSError, ValueError) as e:
+            logger.error("Disease index unavailable", extra={'error': str(e)})
+            return ''
+        for query in queries:
+            if not query:
+                continue
+            hits = index.search(query, k)
+            if hits:
+                # Full detail for the best match, figures only for the runners-up
+                lines = '\n'.join(format_record(record, detailed=i == 0) for i, (record, _) in enumerate(hits))
+                return f"Relevant disease surveillance data for India (IDSP/MoHFW-aligned):\n{lines}"
+        return ''
+
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def get_disease_retriever():
+    """Get or create the process-wide retriever."""
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = DiseaseRetriever()
+    return _retriever
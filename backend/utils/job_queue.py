@@ -0,0 +1,324 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import metrics as telemetry
+from utils.token_ledger import attribute, current_attribution
+from utils.logger import get_logger
+
+logger = get_logger('job_queue')
+
+JOB_DIR = os.getenv('JOB_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'jobs'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))  # Concurrent analyses
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', 24 * 3600))  # Seconds finished jobs (and idempotency keys) are kept
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 2))  # Runs interrupted by a restart count as attempts
+JOB_LEASE = float(os.getenv('JOB_LEASE', 120))  # A running job not renewed for this long is presumed dead and may be resumed
+JOB_POLL = 0.5  # Seconds between status re-reads while waiting on a job another process may be running
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+FINISHED = (SUCCEEDED, FAILED)
+
+JOBS_SUBMITTED = telemetry.counter('curebird_jobs_submitted_total', 'Job submissions by outcome.', ('kind', 'outcome'))
+JOBS_COMPLETED = telemetry.counter('curebird_jobs_completed_total', 'Finished jobs by status.', ('kind', 'status'))
+JOB_DURATION = telemetry.histogram('curebird_job_duration_seconds', 'Job run time.', ('kind',))
+JOBS_PENDING = telemetry.gauge('curebird_jobs_pending', 'Queued and running jobs.')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    idempotency_key TEXT UNIQUE,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    lease_expires REAL,
+    attribution TEXT,
+    client TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+# Columns added after the first release; older job databases get them on open
+_MIGRATIONS = (('owner', 'TEXT'), ('lease_expires', 'REAL'), ('attribution', 'TEXT'), ('client', 'TEXT'))
+
+
+class JobQueue:
+    """
+    Runs registered handlers on a bounded thread pool. Job rows live in SQLite
+    and uploads are spooled to disk, so jobs interrupted by a crash or restart
+    are picked up again by a live worker. Re-submitting with the same idempotency key
+    returns the existing job instead of starting another run.
+
+    Several worker processes share one database. A queued or running job
+    carries the process that holds it as owner and a lease the owner renews
+    every JOB_LEASE / 3 seconds, so resume() only takes over jobs whose owner
+    stopped renewing.
+    """
+
+    def __init__(self, directory=JOB_DIR, workers=JOB_WORKERS):
+        self.directory = directory
+        self.payload_dir = os.path.join(directory, 'payloads')
+        os.makedirs(self.payload_dir, exist_ok=True)
+        self._db_path = os.path.join(directory, 'jobs.sqlite3')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._handlers = {}
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._renewer = None
+        with self._connection() as conn:
+            conn.execute(_SCHEMA)
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            for column, kind in _MIGRATIONS:
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {kind}')
+        JOBS_PENDING.set_function(self._pending_count)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _pending_count(self):
+        row = self._connection().execute(
+            'SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)', (QUEUED, RUNNING)
+        ).fetchone()
+        return row[0]
+
+    def _payload_path(self, job_id):
+        return os.path.join(self.payload_dir, f"{job_id}.bin")
+
+    def register(self, kind, handler):
+        """handler(payload_bytes, params) -> JSON-serialisable result."""
+        self._handlers[kind] = handler
+
+    def submit(self, kind, payload, params=None, idempotency_key=None, client=None):
+        """
+        Enqueue a job. Returns (job, created); created is False for a duplicate key.
+        Keys are per client: the same key from another client is a different job,
+        and only `client` can read the job back (see get()). The submitting
+        request's token attribution (client, conversation, route) is stored with
+        the job, so its LLM usage counts against the same budgets.
+        """
+        if idempotency_key and client is not None:
+            idempotency_key = f"{client}|{idempotency_key}"
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        self.purge_expired()
+        now = time.time()
+        job_id = uuid.uuid4().hex
+
+        with self._lock:
+            conn = self._connection()
+            if idempotency_key:
+                existing = conn.execute('SELECT * FROM jobs WHERE idempotency_key = ?', (idempotency_key,)).fetchone()
+                if existing is not None and existing['status'] != FAILED:
+                    JOBS_SUBMITTED.inc(kind, 'duplicate')
+                    return self._to_dict(existing), False
+                if existing is not None:
+                    # A failed run should not pin its key for the whole retention window
+                    with conn:
+                        conn.execute('DELETE FROM jobs WHERE id = ?', (existing['id'],))
+
+            with open(self._payload_path(job_id), 'wb') as f:
+                f.write(payload)
+            try:
+                with conn:
+                    conn.execute(
+                        'INSERT INTO jobs (id, kind, idempotency_key, status, params, owner, lease_expires, attribution, client, created_at, updated_at) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (job_id, kind, idempotency_key, QUEUED, json.dumps(params or {}), self.owner, now + JOB_LEASE,
+                         json.dumps(current_attribution()), client, now, now),
+                    )
+            except sqlite3.IntegrityError:
+                # Another worker process took the key between our lookup and insert
+                os.remove(self._payload_path(job_id))
+                existing = conn.execute('SELECT * FROM jobs WHERE idempotency_key = ?', (idempotency_key,)).fetchone()
+                JOBS_SUBMITTED.inc(kind, 'duplicate')
+                return self._to_dict(existing), False
+
+        JOBS_SUBMITTED.inc(kind, 'created')
+        logger.info("Job queued", extra={'job_id': job_id, 'kind': kind})
+        self.start()
+        self._pool.submit(self._run, job_id)
+        return self.get(job_id), True
+
+    def get(self, job_id, client=None):
+        """The job, or None if it does not exist or (with `client`) was submitted by another client."""
+        row = self._connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None or (client is not None and row['client'] != client):
+            return None
+        return self._to_dict(row)
+
+    def wait(self, job_id, timeout, client=None):
+        """
+        Block until the job finishes or the timeout elapses, then return its
+        current state. Jobs finished here wake the wait at once; the row is also
+        re-read every JOB_POLL seconds for jobs running in another process.
+        """
+        deadline = time.monotonic() + timeout
+        job = self.get(job_id, client)
+        with self._done:
+            while job is not None and job['status'] not in FINISHED:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._done.wait(min(remaining, JOB_POLL))
+                job = self.get(job_id, client)
+        return job
+
+    def start(self):
+        """
+        Start the lease thread: it renews this process's leases and takes over
+        jobs whose owner died (see resume()), so crash recovery needs no restart.
+        """
+        with self._lock:
+            if self._renewer is None:
+                self._renewer = threading.Thread(target=self._renew_loop, name='job-lease', daemon=True)
+                self._renewer.start()
+
+    def _renew_loop(self):
+        while True:
+            time.sleep(JOB_LEASE / 3)
+            try:
+                with self._connection() as conn:
+                    conn.execute(
+                        'UPDATE jobs SET lease_expires = ? WHERE owner = ? AND status IN (?, ?)',
+                        (time.time() + JOB_LEASE, self.owner, QUEUED, RUNNING),
+                    )
+            except sqlite3.Error as e:
+                logger.error("Job lease renewal failed", extra={'error': str(e)})
+            try:
+                self.resume()
+            except Exception:
+                logger.exception("Job resume sweep failed")
+
+    def _run(self, job_id):
+        conn = self._connection()
+        now = time.time()
+        with self._lock, conn:
+            # Claim atomically; a job another process has taken over since is no longer ours
+            claimed = conn.execute(
+                'UPDATE jobs SET status = ?, attempts = attempts + 1, lease_expires = ?, updated_at = ? '
+                'WHERE id = ? AND status = ? AND owner = ?',
+                (RUNNING, now + JOB_LEASE, now, job_id, QUEUED, self.owner),
+            ).rowcount
+            if not claimed:
+                return
+            row = conn.execute('SELECT kind, params, attribution FROM jobs WHERE id = ?', (job_id,)).fetchone()
+
+        kind = row['kind']
+        start = time.perf_counter()
+        try:
+            with open(self._payload_path(job_id), 'rb') as f:
+                payload = f.read()
+            with attribute(**json.loads(row['attribution'] or '{}')):
+                result = self._handlers[kind](payload, json.loads(row['params']))
+            self._finish(job_id, SUCCEEDED, result=json.dumps(result))
+        except Exception as e:
+            logger.exception("Job failed", extra={'job_id': job_id, 'kind': kind})
+            self._finish(job_id, FAILED, error=str(e))
+        finally:
+            JOB_DURATION.observe(time.perf_counter() - start, kind)
+
+    def _finish(self, job_id, status, result=None, error=None):
+        conn = self._connection()
+        with self._done:
+            with conn:
+                kind = conn.execute('SELECT kind FROM jobs WHERE id = ?', (job_id,)).fetchone()['kind']
+                conn.execute(
+                    'UPDATE jobs SET status = ?, result = ?, error = ?, lease_expires = NULL, updated_at = ? WHERE id = ?',
+                    (status, result, error, time.time(), job_id),
+                )
+            self._done.notify_all()
+        JOBS_COMPLETED.inc(kind, status)
+        try:
+            os.remove(self._payload_path(job_id))
+        except OSError:
+            pass
+
+    def resume(self):
+        """
+        Take over queued or running jobs whose lease has expired (their process
+        died or was recycled) and run them here. Jobs a live worker holds are
+        left alone. Returns how many jobs were resumed.
+        """
+        conn = self._connection()
+        now = time.time()
+        rows = conn.execute(
+            'SELECT id, kind, attempts FROM jobs WHERE status IN (?, ?) AND COALESCE(lease_expires, 0) < ?',
+            (QUEUED, RUNNING, now),
+        ).fetchall()
+        resumed = 0
+        for row in rows:
+            if row['kind'] not in self._handlers:
+                continue
+            with self._lock, conn:
+                # Several processes may find the same expired job; only one takes it
+                taken = conn.execute(
+                    'UPDATE jobs SET status = ?, owner = ?, lease_expires = ? '
+                    'WHERE id = ? AND status IN (?, ?) AND COALESCE(lease_expires, 0) < ?',
+                    (QUEUED, self.owner, now + JOB_LEASE, row['id'], QUEUED, RUNNING, now),
+                ).rowcount
+            if not taken:
+                continue
+            if row['attempts'] >= JOB_MAX_ATTEMPTS:
+                self._finish(row['id'], FAILED, error="Job interrupted too many times")
+                continue
+            self.start()
+            self._pool.submit(self._run, row['id'])
+            resumed += 1
+        if resumed:
+            logger.info("Resumed jobs", extra={'count': resumed})
+        return resumed
+
+    def purge_expired(self):
+        """Drop finished jobs (and their idempotency keys) past the retention window."""
+        cutoff = time.time() - JOB_RETENTION
+        conn = self._connection()
+        with self._lock, conn:
+            expired = conn.execute(
+                'SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?', (SUCCEEDED, FAILED, cutoff)
+            ).fetchall()
+            if expired:
+                conn.executemany('DELETE FROM jobs WHERE id = ?', [(row['id'],) for row in expired])
+
+    @staticmethod
+    def _to_dict(row):
+        job = {
+            'job_id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+        }
+        if row['result'] is not None:
+            job['result'] = json.loads(row['result'])
+        if row['error'] is not None:
+            job['error'] = row['error']
+        return job
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Get or create the process-wide job queue."""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue()
+    return _job_queue
@@ -0,0 +1,40 @@
+import json
+import logging
+import os
+import sys
+import time
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message and any `extra` fields."""
+
+    _RESERVED = set(vars(logging.makeLogRecord({})).keys()) | {'message', 'asctime'}
+
+    def format(self, record):
+        payload = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in self._RESERVED and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+def get_logger(name):
+    """Return a logger that writes structured JSON lines to stdout."""
+    logger = logging.getLogger(f"curebird.{name}")
+    root = logging.getLogger('curebird')
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+    return logger
@@ -0,0 +1,246 @@
+import os
+import re
+import json
+import threading
+
+LEXICON_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'medical_lexicon.json')
+
+# One pass over the text produces every token kind the extractor needs.
+# Order matters: frequency patterns and dosages must win over bare numbers.
+_TOKEN_RE = re.compile(
+    r"(?P<pattern>\b\d(?:\s*-\s*\d){2,3}\b)"
+    r"|(?P<dose>\d+(?:\.\d+)?(?:\s*/\s*\d+(?:\.\d+)?)?\s*(?:mg|mcg|µg|gm|g|ml|iu|units?|%)(?![a-z]))"
+    r"|(?P<word>[a-z][a-z0-9'\-]*|\d+[a-z][a-z0-9\-]*)"
+    r"|(?P<num>\d+(?:\.\d+)?)"
+    r"|(?P<newline>\n)",
+    re.IGNORECASE,
+)
+_SPACES_RE = re.compile(r'\s+')
+
+# Legacy numbered-line fallback ("1. Tab Xyz 10mg") for drugs outside the lexicon
+_NUMBERED_LINE_RE = re.compile(r'^\s*\d+[.)]\s*(?:(?:tab|cap|syp|inj)\.?\s+)?([a-z][\w\-]+)', re.IGNORECASE)
+
+# Aliases this short are only trusted when written in capitals (e.g. "TB", "HTN", "CAD")
+_CASE_SENSITIVE_MAX_LEN = 3
+
+
+def tokenize(text):
+    """Yield (kind, normalised, original) tokens in a single scan."""
+    for match in _TOKEN_RE.finditer(text or ''):
+        kind = match.lastgroup
+        original = match.group()
+        if kind == 'pattern':
+            yield kind, _SPACES_RE.sub('', original), original
+        elif kind == 'dose':
+            number = re.match(r'[\d./\s]+', original).group().replace(' ', '')
+            unit = original[len(re.match(r'[\d./\s]+', original).group()):].strip().lower()
+            yield kind, f"{number} {unit}", original
+        else:
+            yield kind, original.lower(), original
+
+
+def _phrase_tokens(phrase):
+    return [token for _, token, _ in tokenize(phrase) if token != '\n']
+
+
+class MedicalLexicon:
+    """
+    Token-level trie over drug names (generic and brand), conditions and their
+    abbreviations, dosage forms and frequency phrases. Matching is
+    longest-phrase-first, so each text token is visited a bounded number of times.
+    """
+
+    def __init__(self, data):
+        self.version = data.get('version', 1)
+        self.root = {}
+        self.max_depth = 1
+        self.drugs = {}
+        self.conditions = {}
+        self.ambiguous = {name.lower() for name in data.get('ambiguous_brands', [])}
+        self.frequency_plain = data.get('frequency_plain', {})
+
+        for drug in data.get('drugs', []):
+            generic = drug['generic']
+            info = {'generic': generic, 'class': drug.get('class', '')}
+            self.drugs[generic.lower()] = info
+            self._add(generic, ('drug', info, None))
+            for brand in drug.get('brands', []):
+                self._add(brand, ('drug', info, brand))
+
+        for condition in data.get('conditions', []):
+            info = {'name': condition['name'], 'plain': condition.get('plain', '')}
+            self.conditions[condition['name'].lower()] = info
+            self._add(condition['name'], ('condition', info, None))
+            for alias in condition.get('aliases', []):
+                case_sensitive = alias.isalpha() and len(alias) <= _CASE_SENSITIVE_MAX_LEN
+                self._add(alias, ('condition', info, 'upper' if case_sensitive else None))
+
+        for label, phrases in data.get('frequencies', {}).items():
+            for phrase in phrases:
+                self._add(phrase, ('frequency', label, None))
+        for label, phrases in data.get('timings', {}).items():
+            for phrase in phrases:
+                self._add(phrase, ('timing', label, None))
+        for form in data.get('forms', []):
+            self._add(form, ('form', form, None))
+
+    def _add(self, phrase, payload):
+        tokens = _phrase_tokens(phrase)
+        if not tokens:
+            return
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        # Earlier entries win (generic names are loaded before brands that reuse them)
+        node.setdefault(None, payload)
+        self.max_depth = max(self.max_depth, len(tokens))
+
+    def match(self, tokens, start):
+        """Longest entry starting at tokens[start]. Returns (payload, length) or (None, 0)."""
+        node = self.root
+        best, best_len = None, 0
+        for offset in range(min(self.max_depth, len(tokens) - start)):
+            kind, token, _ = tokens[start + offset]
+            node = node.get(token)
+            if node is None:
+                break
+            if None in node:
+                best, best_len = node[None], offset + 1
+        return best, best_len
+
+
+_lexicon = None
+_lexicon_lock = threading.Lock()
+
+
+def get_lexicon():
+    """Compile the lexicon once per process."""
+    global _lexicon
+    if _lexicon is None:
+        with _lexicon_lock:
+            if _lexicon is None:
+                with open(LEXICON_PATH, 'r', encoding='utf-8') as f:
+                    _lexicon = MedicalLexicon(json.load(f))
+    return _lexicon
+
+
+def _title(name):
+    return ' '.join(part[:1].upper() + part[1:] for part in name.split(' '))
+
+
+def extract_medical_entities(text, lexicon=None):
+    """
+    Linear pass over OCR text. Returns {"diseases": [...], "medications": [...]}
+    where each medication carries name, dosage, frequency and, when known,
+    generic, drug_class and timing. Dosage and frequency attach to the most
+    recent drug on the same line.
+    """
+    lexicon = lexicon or get_lexicon()
+    tokens = list(tokenize(text))
+
+    medications = []
+    diseases = []
+    seen_diseases = set()
+    current = None
+    line_has_drug = False
+    previous_form = False
+    line_start = 0
+
+    i = 0
+    while i < len(tokens):
+        kind, token, original = tokens[i]
+
+        if kind == 'newline':
+            if not line_has_drug:
+                _fallback_numbered_line(tokens, line_start, i, medications, lexicon)
+            current, line_has_drug, previous_form = None, False, False
+            line_start = i + 1
+            i += 1
+            continue
+
+        if kind == 'dose':
+            if current is not None and not current['dosage']:
+                current['dosage'] = token
+            i += 1
+            continue
+
+        payload, length = lexicon.match(tokens, i)
+        if payload is None:
+            if kind == 'pattern' and current is not None and not current['frequency']:
+                current['frequency'] = token
+            previous_form = False
+            i += 1
+            continue
+
+        entry_kind, info, extra = payload
+        matched_original = ' '.join(t[2] for t in tokens[i:i + length])
+
+        if entry_kind == 'drug':
+            brand = extra
+            if brand and brand.lower() in lexicon.ambiguous and not (previous_form or _dose_follows(tokens, i + length)):
+                # Everyday words that are also brand names need prescription context
+                i += length
+                continue
+            current = {
+                'name': brand or _title(info['generic']),
+                'dosage': '',
+                'frequency': '',
+                'generic': info['generic'],
+                'drug_class': info['class'],
+            }
+            medications.append(current)
+            line_has_drug = True
+        elif entry_kind == 'condition':
+            if extra != 'upper' or matched_original.isupper():
+                if info['name'] not in seen_diseases:
+                    seen_diseases.add(info['name'])
+                    diseases.append(info['name'])
+        elif entry_kind == 'frequency':
+            if current is not None and not current['frequency']:
+                current['frequency'] = info
+        elif entry_kind == 'timing':
+            if current is not None:
+                current['timing'] = info
+
+        previous_form = entry_kind == 'form'
+        i += length
+
+    if not line_has_drug:
+        _fallback_numbered_line(tokens, line_start, len(tokens), medications, lexicon)
+
+    return {"diseases": diseases, "medications": medications}
+
+
+def _dose_follows(tokens, index):
+    for kind, _, _ in tokens[index:index + 3]:
+        if kind == 'newline':
+            return False
+        if kind in ('dose', 'pattern'):
+            return True
+    return False
+
+
+def _fallback_numbered_line(tokens, start, end, medications, lexicon):
+    """Keep numbered prescription lines with a dosage even when the drug is not in the lexicon."""
+    if start >= end:
+        return
+    line = ' '.join(t[2] for t in tokens[start:end])
+    if not any(t[0] == 'dose' for t in tokens[start:end]):
+        return
+    # Tokens drop punctuation, so rebuild "1." from a leading number token
+    if tokens[start][0] != 'num':
+        return
+    match = _NUMBERED_LINE_RE.match(line.replace(' ', '. ', 1))
+    if not match:
+        return
+    dosage = next(t[1] for t in tokens[start:end] if t[0] == 'dose')
+    frequency = ''
+    for index in range(start, end):
+        payload, _ = lexicon.match(tokens, index)
+        if payload is not None and payload[0] == 'frequency':
+            frequency = payload[1]
+            break
+        if tokens[index][0] == 'pattern':
+            frequency = tokens[index][1]
+            break
+    medications.append({'name': match.group(1).capitalize(), 'dosage': dosage, 'frequency': frequency})
@@ -0,0 +1,256 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from bisect import bisect_left
+
+# Latency buckets (seconds) shared by route and LLM histograms
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+BYTE_BUCKETS = (10_000, 100_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000, 25_000_000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(v) for v in labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._functions = {}
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, fn, *labels):
+        """Evaluate `fn` at scrape time instead of tracking the value on every change."""
+        self._functions[self._key(labels)] = fn
+
+    def _samples(self):
+        with self._lock:
+            items = dict(self._values)
+        for key, fn in list(self._functions.items()):
+            try:
+                items[key] = fn()
+            except Exception:
+                continue
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items.items()]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(m.render() for m in metrics) + '\n'
+
+
+# Global registry
+registry = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return registry.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# --- Application metrics ---
+HTTP_LATENCY = histogram('curebird_http_request_duration_seconds', 'Route latency.', ('route', 'method', 'status'))
+LLM_LATENCY = histogram('curebird_llm_call_duration_seconds', 'Upstream LLM call duration.', ('provider', 'model', 'outcome'))
+LLM_TOKENS = histogram('curebird_llm_tokens', 'Tokens per LLM call.', ('provider', 'model', 'kind'), TOKEN_BUCKETS)
+LLM_RETRIES = counter('curebird_llm_retries_total', 'LLM call retries.', ('provider', 'model'))
+LLM_FALLBACKS = counter('curebird_llm_fallbacks_total', 'Model fallbacks.', ('provider', 'from_model', 'to_model'))
+CACHE_REQUESTS = counter('curebird_cache_requests_total', 'Cache lookups by result.', ('cache', 'result'))
+CONVERSATIONS = gauge('curebird_conversations', 'Conversations held in memory.', ('provider',))
+UPLOAD_BYTES = histogram('curebird_upload_bytes', 'Uploaded file size.', ('route',), BYTE_BUCKETS)
+STAGE_DURATION = histogram('curebird_stage_duration_seconds', 'Time spent in instrumented request stages.', ('stage',))
+
+# Receives (stage, seconds) for stages run in this context; set while a request is being profiled
+_stage_sink = contextvars.ContextVar('stage_sink', default=None)
+
+
+def bind_stage_sink(sink):
+    return _stage_sink.set(sink)
+
+
+def unbind_stage_sink(token):
+    try:
+        _stage_sink.reset(token)
+    except ValueError:
+        pass
+
+
+@contextmanager
+def stage(name):
+    """Time a request stage (upload read, encode, LLM call, serialize...)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(elapsed, name)
+        sink = _stage_sink.get()
+        if sink is not None:
+            sink(name, elapsed)
+
+
+def record_cache(cache_name, hit):
+    CACHE_REQUESTS.inc(cache_name, 'hit' if hit else 'miss')
+
+
+_usage_hooks = []
+
+
+def add_usage_hook(hook):
+    """Register hook(provider, model, prompt_tokens, completion_tokens), called for every recorded LLM call."""
+    _usage_hooks.append(hook)
+
+
+def record_tokens(provider, model, prompt, completion):
+    if prompt is not None:
+        LLM_TOKENS.observe(prompt, provider, model, 'prompt')
+    if completion is not None:
+        LLM_TOKENS.observe(completion, provider, model, 'completion')
+    for hook in _usage_hooks:
+        hook(provider, model, prompt or 0, completion or 0)
+
+
+def record_usage(provider, model, usage):
+    """Record prompt/completion token counts from an OpenAI-style `usage` object."""
+    if usage is None:
+        return
+    record_tokens(provider, model, getattr(usage, 'prompt_tokens', None), getattr(usage, 'completion_tokens', None))
+
+
+def timed_completion(client, provider='groq', **kwargs):
+    """
+    Call client.chat.completions.create(**kwargs) and record duration, tokens
+    and outcome. Under a request deadline (utils/deadline.py) the call's
+    timeout is capped at the time left, and under deadline.single_attempt()
+    at the router's per-attempt timeout.
+    """
+    from utils import deadline  # Deferred: utils.deadline registers its metrics here
+
+    model = kwargs.get('model', 'unknown')
+    request_deadline = deadline.current()
+    if request_deadline is not None or deadline.retries_owned_by_caller():
+        # Raises once the request is out of time; otherwise the attempt may use what is left
+        kwargs['timeout'] = deadline.attempt_timeout(kwargs.get('timeout'))
+        if hasattr(client, 'with_options'):
+            # SDK-internal retries would run past the deadline or duplicate the router's; callers retry
+            client = client.with_options(max_retries=0)
+    start = time.perf_counter()
+    try:
+        with stage('llm_call'):
+            completion = client.chat.completions.create(**kwargs)
+    except Exception:
+        LLM_LATENCY.observe(time.perf_counter() - start, provider, model, 'error')
+        if request_deadline is not None and request_deadline.expired:
+            request_deadline.check()  # Report the timeout as the deadline it really was
+        raise
+    duration = time.perf_counter() - start
+    LLM_LATENCY.observe(duration, provider, model, 'ok')
+    record_usage(provider, model, getattr(completion, 'usage', None))
+    return completion
@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import metrics as telemetry
+from utils.single_flight import canonical_key
+from utils.token_ledger import attribute
+from utils.logger import get_logger
+
+logger = get_logger('narrative_store')
+
+NARRATIVE_STORE_PATH = os.getenv('NARRATIVE_STORE_PATH', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache', 'narratives.sqlite3'))
+NARRATIVE_PRECOMPUTE = os.getenv('NARRATIVE_PRECOMPUTE', '1').lower() not in ('0', 'false', 'no')
+NARRATIVE_CONCURRENCY = int(os.getenv('NARRATIVE_CONCURRENCY', 2))  # Diseases generated at once by the precompute job
+NARRATIVE_RECHECK_INTERVAL = float(os.getenv('NARRATIVE_RECHECK_INTERVAL', 300))  # Seconds between retries of missing/failed narratives
+NARRATIVE_LEASE = float(os.getenv('NARRATIVE_LEASE', 600))  # A precompute run not renewed for this long is taken over by another process
+NARRATIVE_BACKOFF = 0.5  # Seconds between checks while interactive LLM traffic is busy
+NARRATIVE_MAX_DEFER = float(os.getenv('NARRATIVE_MAX_DEFER', 60))  # Longest a generation yields to interactive traffic
+
+NARRATIVES = telemetry.counter('curebird_narratives_total', 'Precomputed disease narratives by outcome.', ('outcome',))
+NARRATIVE_DURATION = telemetry.histogram('curebird_narrative_generation_seconds', 'Time to generate one disease narrative.')
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS narratives (
+        disease_id TEXT PRIMARY KEY,
+        disease TEXT NOT NULL,
+        fingerprint TEXT NOT NULL,
+        narrative TEXT NOT NULL,
+        trends_version INTEGER,
+        created_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    """,
+)
+
+
+def trend_fingerprint(item):
+    """Content hash of one trends card; a narrative is regenerated only when it changes."""
+    return canonical_key(item)[:32]
+
+
+def _disease_id(item):
+    return str(item.get('id') or item.get('disease') or '')
+
+
+class NarrativeStore:
+    """
+    Latest narrative per disease in SQLite, shared by every worker process.
+    Each row keeps the fingerprint of the trends card it was generated from,
+    so readers can tell whether it still matches the current data.
+    """
+
+    def __init__(self, path=NARRATIVE_STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def put(self, item, narrative, trends_version=None):
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO narratives (disease_id, disease, fingerprint, narrative, trends_version, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (_disease_id(item), str(item.get('disease') or ''), trend_fingerprint(item),
+                 json.dumps(narrative), trends_version, time.time()),
+            )
+
+    def fingerprints(self):
+        rows = self._connection().execute('SELECT disease_id, fingerprint FROM narratives').fetchall()
+        return {row['disease_id']: row['fingerprint'] for row in rows}
+
+    def get(self, disease_id):
+        row = self._connection().execute('SELECT * FROM narratives WHERE disease_id = ?', (disease_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def all(self):
+        return [self._to_dict(row) for row in self._connection().execute('SELECT * FROM narratives')]
+
+    def claim(self, name, owner, duration=NARRATIVE_LEASE):
+        """Take or renew the named lease; False while another owner holds an unexpired one."""
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute('INSERT OR IGNORE INTO leases (name, owner, expires_at) VALUES (?, ?, 0)', (name, owner))
+            return conn.execute(
+                'UPDATE leases SET owner = ?, expires_at = ? WHERE name = ? AND (owner = ? OR expires_at < ?)',
+                (owner, now + duration, name, owner, now),
+            ).rowcount == 1
+
+    def release(self, name, owner):
+        with self._connection() as conn:
+            conn.execute('UPDATE leases SET expires_at = 0 WHERE name = ? AND owner = ?', (name, owner))
+
+    @staticmethod
+    def _to_dict(row):
+        return {
+            'id': row['disease_id'],
+            'disease': row['disease'],
+            'fingerprint': row['fingerprint'],
+            'trends_version': row['trends_version'],
+            'generated_at': row['created_at'],
+            **json.loads(row['narrative']),
+        }
+
+
+class NarrativePrecomputer:
+    """
+    Background job that keeps a narrative in the store for every tracked disease.
+    It wakes on each new trends version (and every NARRATIVE_RECHECK_INTERVAL to
+    retry failures), regenerates only the diseases whose card changed, and runs
+    at most NARRATIVE_CONCURRENCY generations at once. Each generation waits while
+    `busy()` reports interactive LLM load, for up to NARRATIVE_MAX_DEFER seconds.
+    A lease in the store makes one worker process do the run for everyone.
+
+    `wait_for_trends(after, timeout)` returns the current trends snapshot;
+    `narrate(item)` returns the narrative dict for one trends card.
+    """
+
+    LEASE = 'narrative_precompute'
+
+    def __init__(self, store, wait_for_trends, narrate, busy=None, concurrency=NARRATIVE_CONCURRENCY):
+        self.store = store
+        self.wait_for_trends = wait_for_trends
+        self.narrate = narrate
+        self.busy = busy or (lambda: False)
+        self.concurrency = max(1, concurrency)
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='narrative-precompute', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        seen = None
+        while True:
+            try:
+                snapshot = self.wait_for_trends(seen, NARRATIVE_RECHECK_INTERVAL)
+                if snapshot is None:
+                    time.sleep(NARRATIVE_BACKOFF)
+                    continue
+                seen = snapshot.version
+                self.refresh(snapshot.decode(), snapshot.version)
+            except Exception:
+                logger.exception("Narrative precompute failed")
+                time.sleep(NARRATIVE_BACKOFF)
+
+    def pending(self, trends):
+        """Trends cards with no narrative, or one generated from different data."""
+        stored = self.store.fingerprints()
+        return [item for item in trends if stored.get(_disease_id(item)) != trend_fingerprint(item)]
+
+    def refresh(self, trends, version=None):
+        """Generate narratives for the changed cards. Returns how many were stored (0 if another process holds the run)."""
+        todo = self.pending(trends)
+        if not todo or not self.store.claim(self.LEASE, self.owner):
+            return 0
+        started = time.perf_counter()
+        logger.info("Narrative precompute started", extra={'trends_version': version, 'diseases': len(todo)})
+        stored = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='narrative') as pool:
+                for ok in pool.map(lambda item: self._generate(item, version), todo):
+                    stored += ok
+        finally:
+            self.store.release(self.LEASE, self.owner)
+        logger.info("Narrative precompute finished", extra={
+            'trends_version': version, 'stored': stored, 'failed': len(todo) - stored,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+        })
+        return stored
+
+    def _yield(self):
+        deadline = time.monotonic() + NARRATIVE_MAX_DEFER
+        while self.busy() and time.monotonic() < deadline:
+            time.sleep(NARRATIVE_BACKOFF)
+
+    def _generate(self, item, version):
+        self._yield()
+        # Keep the lease alive through long runs
+        self.store.claim(self.LEASE, self.owner)
+        started = time.perf_counter()
+        try:
+            with attribute(route='narrative_precompute'):
+                narrative = self.narrate(item)
+            self.store.put(item, narrative, version)
+        except Exception as e:
+            NARRATIVES.inc('failed')
+            logger.error("Narrative generation failed", extra={'disease': item.get('disease'), 'error': str(e)})
+            return False
+        NARRATIVE_DURATION.observe(time.perf_counter() - started)
+        NARRATIVES.inc('generated')
+        return True
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_narrative_store():
+    """Get or create the process-wide narrative store."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = NarrativeStore()
+    return _store
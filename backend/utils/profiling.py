@@ -0,0 +1,251 @@
+import os
+import re
+import sys
+import hmac
+import json
+import time
+import uuid
+import random
+import threading
+from collections import Counter
+from utils import metrics as telemetry
+from utils.logger import get_logger
+
+logger = get_logger('profiling')
+
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))  # Fraction of requests profiled (0 = on demand only)
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')  # X-Profile-Token value that forces a profile and unlocks the admin endpoints
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.005))  # Seconds between stack samples
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache', 'profiles'))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', 100))  # Profiles kept in PROFILE_DIR, shared by every worker
+PROFILE_MAX_DEPTH = 128  # Frames kept per sample, innermost first
+_PROFILE_ID_RE = re.compile(r'^[0-9a-f]{16}$')
+
+PROFILES = telemetry.counter('curebird_profiles_total', 'Requests profiled, by trigger.', ('trigger',))
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profile:
+    """Stack samples and stage timings for one request."""
+
+    def __init__(self, route, method, trigger):
+        self.id = uuid.uuid4().hex[:16]
+        self.route = route
+        self.method = method
+        self.trigger = trigger
+        self.started_at = time.time()
+        self.thread_id = threading.get_ident()
+        self.status = None
+        self.duration = None
+        self.stacks = Counter()
+        self.samples = 0
+        self.stages = []
+        self.sink_token = None
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, seconds):
+        self.stages.append((name, seconds))
+
+    def add_sample(self, frame):
+        labels = []
+        while frame is not None and len(labels) < PROFILE_MAX_DEPTH:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        with self._lock:
+            self.stacks[';'.join(reversed(labels))] += 1
+            self.samples += 1
+
+    def folded(self):
+        """Collapsed stacks ("outer;inner count" per line), readable by flamegraph.pl and speedscope."""
+        with self._lock:
+            return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self):
+        stages = {}
+        for name, seconds in self.stages:
+            entry = stages.setdefault(name, {'count': 0, 'total_ms': 0.0})
+            entry['count'] += 1
+            entry['total_ms'] += seconds * 1000
+        for entry in stages.values():
+            entry['total_ms'] = round(entry['total_ms'], 3)
+        return {
+            'id': self.id, 'route': self.route, 'method': self.method, 'trigger': self.trigger,
+            'status': self.status, 'started_at': round(self.started_at, 3),
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'samples': self.samples, 'sample_interval_ms': PROFILE_INTERVAL * 1000, 'stages': stages,
+        }
+
+
+class Sampler:
+    """
+    One background thread samples the stacks of every thread currently being
+    profiled (via sys._current_frames). It sleeps while nothing is registered,
+    so an idle profiler costs nothing.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self._active = {}
+        self._wake = threading.Condition()
+        self._thread = None
+
+    def register(self, profile):
+        with self._wake:
+            self._active[profile.thread_id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+                self._thread.start()
+            self._wake.notify()
+
+    def unregister(self, profile):
+        with self._wake:
+            if self._active.get(profile.thread_id) is profile:
+                del self._active[profile.thread_id]
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._wake:
+                while not self._active:
+                    self._wake.wait()
+                active = list(self._active.items())
+            frames = sys._current_frames()
+            for thread_id, profile in active:
+                frame = frames.get(thread_id)
+                if frame is not None and thread_id != own:
+                    profile.add_sample(frame)
+            del frames
+            time.sleep(self.interval)
+
+
+class Profiler:
+    """
+    Decides which requests to profile and runs the sampler. Finished profiles
+    are written to `directory` (collapsed stacks in <id>.folded, the summary in
+    <id>.json) and read back from there, so any worker can list and serve the
+    profiles every other worker recorded.
+    """
+
+    def __init__(self, sample_rate=PROFILE_SAMPLE_RATE, token=PROFILE_TOKEN, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.sample_rate = sample_rate
+        self.token = token
+        self.directory = directory
+        self.keep = keep
+        self.sampler = Sampler()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or bool(self.token)
+
+    def authorized(self, token):
+        return bool(self.token) and bool(token) and hmac.compare_digest(token, self.token)
+
+    def trigger_for(self, token):
+        """'header' for an authorized X-Profile-Token, 'sampled' for the random fraction, else None."""
+        if token and self.authorized(token):
+            return 'header'
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    def start(self, route, method, trigger):
+        profile = Profile(route, method, trigger)
+        profile.sink_token = telemetry.bind_stage_sink(profile.add_stage)
+        self.sampler.register(profile)
+        PROFILES.inc(trigger)
+        return profile
+
+    def finish(self, profile):
+        self.sampler.unregister(profile)
+        telemetry.unbind_stage_sink(profile.sink_token)
+        profile.duration = time.perf_counter() - profile._start
+        self._write(profile)
+
+    def _path(self, profile_id, suffix):
+        return os.path.join(self.directory, profile_id + suffix)
+
+    def _write(self, profile):
+        """Write the stacks, then the summary; each lands whole (temp file + rename), and a summary means both are there."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for suffix, content in (('.folded', profile.folded()), ('.json', json.dumps(profile.summary()))):
+                path = self._path(profile.id, suffix)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, 'w') as f:
+                    f.write(content)
+                os.replace(tmp, path)
+            self._prune()
+        except OSError as e:
+            logger.error("Profile write failed", extra={'profile': profile.id, 'error': str(e)})
+
+    def _recent(self):
+        """Profile ids on disk, newest first."""
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    profile_id, ext = os.path.splitext(entry.name)
+                    if ext == '.json' and _PROFILE_ID_RE.match(profile_id):
+                        try:
+                            entries.append((entry.stat().st_mtime, profile_id))
+                        except OSError:
+                            pass  # Pruned by another worker
+        except OSError:
+            return []
+        return [profile_id for _, profile_id in sorted(entries, reverse=True)]
+
+    def _prune(self):
+        for profile_id in self._recent()[self.keep:]:
+            for suffix in ('.json', '.folded'):
+                try:
+                    os.remove(self._path(profile_id, suffix))
+                except OSError:
+                    pass
+
+    def list(self):
+        """Summaries of the kept profiles from every worker, newest first."""
+        summaries = []
+        for profile_id in self._recent()[:self.keep]:
+            summary = self.get(profile_id)
+            if summary is not None:
+                summaries.append(summary)
+        return summaries
+
+    def get(self, profile_id):
+        """A profile's summary, or None if there is no such profile."""
+        if not _PROFILE_ID_RE.match(profile_id or ''):
+            return None
+        try:
+            with open(self._path(profile_id, '.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def folded(self, profile_id):
+        """A profile's collapsed stacks, or None if there is no such profile."""
+        if not _PROFILE_ID_RE.match(profile_id or ''):
+            return None
+        try:
+            with open(self._path(profile_id, '.folded')) as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+    """Get or create the process-wide profiler."""
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = Profiler()
+    return _profiler
@@ -0,0 +1,156 @@
+import os
+from utils import metrics as telemetry
+from utils.medical_extractor import get_lexicon, tokenize, _title
+
+LOCAL_SUMMARY = os.getenv('LOCAL_SUMMARY', '1').lower() not in ('0', 'false', 'no')
+
+NO_DETAILS = 'No specific medical details were clearly detected in the image.'
+DISCLAIMER = ("This summary is for general understanding only and is not medical advice. "
+              "Please talk to your doctor before starting, stopping or changing any medicine.")
+
+# Words that may follow a drug name without changing which drug it is
+_RELEASE_SUFFIXES = {'sr', 'xr', 'er', 'cr', 'mr', 'xl', 'la', 'ds', 'forte', 'plus', 'retard', 'od'}
+
+REPORT_SUMMARIES = telemetry.counter(
+    'curebird_report_summary_total',
+    'Analyzer summaries by source: local (glossary), mixed (glossary plus LLM for unknown terms) or llm.', ('source',)
+)
+
+
+def _condition(term, lexicon):
+    """Glossary entry for a disease only when the whole term is one known condition."""
+    tokens = [token for token in tokenize(term) if token[0] != 'newline']
+    if not tokens:
+        return None
+    payload, length = lexicon.match(tokens, 0)
+    if payload is None or payload[0] != 'condition' or length != len(tokens):
+        return None
+    _, info, extra = payload
+    if extra == 'upper' and not ' '.join(t[2] for t in tokens).isupper():
+        return None
+    return info
+
+
+def _drugs(name, lexicon):
+    """
+    (glossary entry, brand or None) for each drug in a medication name ("Tab
+    Glycomet 500", "Metformin SR 500 mg"), or None if any word in it is not a
+    known drug, form or release suffix.
+    """
+    tokens = [token for token in tokenize(name) if token[0] != 'newline']
+    drugs = []
+    i = 0
+    while i < len(tokens):
+        kind, token, _ = tokens[i]
+        payload, length = lexicon.match(tokens, i)
+        if payload is not None:
+            if payload[0] == 'drug' and all(info is not payload[1] for info, _ in drugs):
+                drugs.append((payload[1], payload[2]))
+            i += length
+            continue
+        if kind != 'word' or token in _RELEASE_SUFFIXES:
+            i += 1
+            continue
+        return None
+    return drugs or None
+
+
+def _schedule(medication, lexicon):
+    """Plain wording for the dose, frequency and timing as written on the report."""
+    parts = []
+    if medication.get('dosage'):
+        parts.append(medication['dosage'])
+    frequency = medication.get('frequency') or ''
+    tokens = [token for token in tokenize(frequency) if token[0] != 'newline']
+    plain = []
+    i = 0
+    while i < len(tokens):
+        payload, length = lexicon.match(tokens, i)
+        if payload is not None and payload[0] in ('frequency', 'timing'):
+            label = payload[1]
+            plain.append(lexicon.frequency_plain.get(label, label.lower()) if payload[0] == 'frequency' else label.lower())
+            i += length
+        else:
+            i += 1
+    if plain:
+        parts.append(' '.join(dict.fromkeys(plain)))
+    elif frequency:
+        parts.append(frequency)
+    if medication.get('timing') and medication['timing'].lower() not in plain:
+        parts.append(medication['timing'].lower())
+    return ' '.join(parts)
+
+
+def _purpose(drug_class):
+    """'Biguanide (blood sugar control)' -> 'blood sugar control'; classes without a gloss are used as written."""
+    if '(' in drug_class and drug_class.endswith(')'):
+        return drug_class[drug_class.index('(') + 1:-1]
+    return drug_class[:1].lower() + drug_class[1:]
+
+
+def _join(items):
+    return items[0] if len(items) == 1 else ', '.join(items[:-1]) + ' and ' + items[-1]
+
+
+def summarize_report(analysis, lexicon=None):
+    """
+    Patient-facing summary of an extraction built from the medical lexicon:
+    conditions get their plain meaning and medicines their drug-class purpose,
+    in at most three bullets plus a disclaimer. Returns (summary, unknown),
+    where `unknown` is the extraction narrowed to the diseases and medications
+    the glossary cannot explain. When it has any, `summary` covers only the
+    known terms (None if there are none) and has no disclaimer; see
+    complete_summary for adding the LLM's explanation of the rest.
+    """
+    lexicon = lexicon or get_lexicon()
+    diseases = [d for d in analysis.get('diseases', []) if d and d.strip()]
+    medications = [m for m in analysis.get('medications', []) if (m.get('name') or '').strip()]
+    if not diseases and not medications:
+        return f"{NO_DETAILS}\n\n{DISCLAIMER}", None
+
+    unknown = {'diseases': [], 'medications': []}
+    conditions = []
+    for disease in diseases:
+        info = _condition(disease, lexicon)
+        if info is None:
+            unknown['diseases'].append(disease)
+        elif info not in conditions:
+            conditions.append(info)
+    medicines = []
+    for medication in medications:
+        drugs = _drugs(medication['name'], lexicon)
+        if drugs is None:
+            unknown['medications'].append(medication)
+        else:
+            medicines.append((medication, drugs))
+
+    bullets = []
+    if conditions:
+        described = [f"{info['name']}, meaning {info['plain']}" for info in conditions]
+        bullets.append(f"Your report mentions {'; '.join(described)}.")
+    if medicines:
+        described = []
+        for medication, drugs in medicines:
+            purpose = _join(list(dict.fromkeys(_purpose(info['class']) for info, _ in drugs)))
+            schedule = _schedule(medication, lexicon)
+            generics = ' + '.join(_title(info['generic']) for info, _ in drugs)
+            brand = drugs[0][1] if len(drugs) == 1 else None
+            name = f"{brand} ({generics.lower()})" if brand else generics
+            described.append(f"{name}{f', {schedule},' if schedule else ''} for {purpose}")
+        bullets.append(f"Your medicines: {'; '.join(described)}.")
+
+    if unknown['diseases'] or unknown['medications']:
+        return ('\n'.join(f"• {bullet}" for bullet in bullets) or None), unknown
+
+    if medicines:
+        bullets.append("Take them exactly as prescribed and keep your follow-up visits, "
+                       "even on days you feel well.")
+    else:
+        bullets.append("Keep your follow-up visits so your doctor can track how you are doing.")
+    return '\n'.join(f"• {bullet}" for bullet in bullets) + f"\n\n{DISCLAIMER}", None
+
+
+def complete_summary(partial, explained):
+    """Join the local bullets for known terms with the LLM's bullets for the rest, then the disclaimer."""
+    parts = [part.strip() for part in (partial, explained) if part and part.strip()]
+    return '\n'.join(parts) + f"\n\n{DISCLAIMER}"
@@ -0,0 +1,116 @@
+import io
+import os
+import re
+
+VLM_TILE_HEIGHT = int(os.getenv('VLM_TILE_HEIGHT', 1400))  # Target band height (px) once the page is scaled to VLM_TILE_MAX_WIDTH
+VLM_TILE_OVERLAP = int(os.getenv('VLM_TILE_OVERLAP', 200))  # Rows shared by neighbouring bands, so every text line is whole in one of them
+VLM_TILE_MAX_WIDTH = int(os.getenv('VLM_TILE_MAX_WIDTH', 2560))  # Wider pages are scaled down to this before cutting (A4 and Letter at 300 dpi fit)
+VLM_TILE_MAX = int(os.getenv('VLM_TILE_MAX', 6))  # Bands per page; taller pages get taller bands instead of more calls
+VLM_TILE_QUALITY = 90  # JPEG quality of each band
+
+# Leading dosage-form words that vary between two readings of the same line
+_FORM_PREFIX_RE = re.compile(r'^(?:tab|tabs|tablet|cap|caps|capsule|syp|syrup|inj|injection)\b\.?\s*', re.IGNORECASE)
+_NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+
+
+def _bands(height, band, overlap, max_bands):
+    """(top, bottom) rows of evenly spaced bands covering `height` with at least `overlap` rows shared."""
+    if height <= band or max_bands < 2:
+        return [(0, height)]
+    step = max(1, band - overlap)
+    count = -(-(height - overlap) // step)
+    if count > max_bands:
+        count = max_bands
+        band = -(-(height + overlap * (count - 1)) // count)
+    stride = (height - band) / (count - 1)
+    return [(round(i * stride), round(i * stride) + band) for i in range(count)]
+
+
+def plan_bands(image_bytes, band=VLM_TILE_HEIGHT, overlap=VLM_TILE_OVERLAP,
+               max_width=VLM_TILE_MAX_WIDTH, max_bands=VLM_TILE_MAX):
+    """
+    Plan overlapping full-width horizontal bands over a page, top to bottom.
+    Bands keep whole text lines together (a medication's name, dose and
+    frequency sit on one row). The page is first turned upright by its EXIF
+    orientation (phone photos are often stored sideways), so bands follow the
+    text lines. Returns (image, boxes, scale): the upright image, crop boxes
+    in its pixels and the factor that brings the page to `max_width`. `boxes`
+    is empty when the page already fits in one band.
+    """
+    from PIL import Image, ImageOps
+
+    image = Image.open(io.BytesIO(image_bytes))
+    # No-op (and no decode) unless the Orientation tag says the pixels are rotated or mirrored
+    ImageOps.exif_transpose(image, in_place=True)
+    width, height = image.size
+    scale = min(1.0, max_width / width) if width else 1.0
+    rows = _bands(round(height * scale), band, overlap, max_bands)
+    if len(rows) == 1:
+        return image, [], scale
+
+    # Greyscale scans stay single-channel: a third of the resize and encode work
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    # Decode once here; render_band() then reads the pixels from several threads
+    image.load()
+    boxes = [(0, min(height, round(top / scale)), width, min(height, round(bottom / scale))) for top, bottom in rows]
+    return image, boxes, scale
+
+
+def render_band(image, box, scale):
+    """Crop one planned band, scale it and encode it as JPEG."""
+    from PIL import Image
+
+    tile = image.crop(box)
+    if scale < 1.0:
+        tile = tile.resize((round(tile.width * scale), round(tile.height * scale)), Image.LANCZOS, reducing_gap=3.0)
+    buffer = io.BytesIO()
+    tile.save(buffer, format='JPEG', quality=VLM_TILE_QUALITY)
+    return buffer.getvalue()
+
+
+def _key(value):
+    return _NON_WORD_RE.sub(' ', (value or '').lower()).strip()
+
+
+def _medication_key(name):
+    return _key(_FORM_PREFIX_RE.sub('', (name or '').strip()))
+
+
+def _dose_key(dosage):
+    # "500 mg", "500mg" and "500-mg" are one dose
+    return _key(dosage).replace(' ', '')
+
+
+def merge_extractions(results):
+    """
+    Combine per-band extractions in page order. A medication read in two
+    overlapping bands is kept once: same name (ignoring case, punctuation and
+    a leading Tab/Cap/Syp/Inj) and the same dose (ignoring spacing), or no
+    dose on one side. The merged entry keeps the longer reading of each field.
+    Diseases are deduplicated ignoring case. The page is medical if any band is.
+    """
+    medications = []
+    diseases = {}
+    for result in results:
+        for med in result.get('medications', []):
+            name_key, dose_key = _medication_key(med.get('name')), _dose_key(med.get('dosage'))
+            if not name_key:
+                continue
+            for kept in medications:
+                kept_dose = _dose_key(kept.get('dosage'))
+                if _medication_key(kept['name']) == name_key and (not dose_key or not kept_dose or dose_key == kept_dose):
+                    for field in ('name', 'dosage', 'frequency'):
+                        if len(med.get(field) or '') > len(kept.get(field) or ''):
+                            kept[field] = med[field]
+                    break
+            else:
+                medications.append(dict(med))
+        for disease in result.get('diseases', []):
+            diseases.setdefault(_key(disease), disease)
+    diseases.pop('', None)
+    return {
+        'is_medical': any(result.get('is_medical') for result in results),
+        'medications': medications,
+        'diseases': list(diseases.values()),
+    }
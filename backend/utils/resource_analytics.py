@@ -0,0 +1,226 @@
+import os
+import json
+import threading
+import numpy as np
+from utils.logger import get_logger
+
+logger = get_logger('resource_analytics')
+
+DATA_DIR = os.path.dirname(os.path.dirname(__file__))
+STATE_FILE = os.path.join(DATA_DIR, 'resource_distribution.json')
+DISTRICT_FILE = os.getenv('RESOURCE_DISTRICT_FILE', os.path.join(DATA_DIR, 'resource_distribution_districts.json'))
+
+# Raw numeric columns and whether a higher value is better for ranking
+BASE_METRICS = {
+    'urban_beds_per_1000': True,
+    'rural_beds_per_1000': True,
+    'urban_doctors_per_1000': True,
+    'rural_doctors_per_1000': True,
+    'public_sector_share': True,
+    'private_sector_share': False,
+    'average_cost_public': False,
+    'average_cost_private': False,
+}
+# Derived per-row metrics (see _derive)
+DERIVED_METRICS = {
+    'beds_gap': False,
+    'doctors_gap': False,
+    'beds_gap_index': False,
+    'doctors_gap_index': False,
+    'gap_index': False,
+    'cost_ratio': False,
+}
+RANKED_METRICS = {**BASE_METRICS, **DERIVED_METRICS}
+LABEL_COLUMNS = ('state', 'district', 'year')
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+def _derive(columns):
+    """Urban-rural gap indices (0 = parity, 1 = nothing in rural areas) and the private/public cost ratio."""
+    columns['beds_gap'] = columns['urban_beds_per_1000'] - columns['rural_beds_per_1000']
+    columns['doctors_gap'] = columns['urban_doctors_per_1000'] - columns['rural_doctors_per_1000']
+    columns['beds_gap_index'] = 1 - _ratio(columns['rural_beds_per_1000'], columns['urban_beds_per_1000'])
+    columns['doctors_gap_index'] = 1 - _ratio(columns['rural_doctors_per_1000'], columns['urban_doctors_per_1000'])
+    stacked = np.vstack([columns['beds_gap_index'], columns['doctors_gap_index']])
+    present = (~np.isnan(stacked)).sum(axis=0)
+    columns['gap_index'] = _ratio(np.nansum(stacked, axis=0), present)
+    columns['cost_ratio'] = _ratio(columns['average_cost_private'], columns['average_cost_public'])
+
+
+def _cohort_ranks(values, cohorts, higher_is_better):
+    """
+    Competition ranks (1 = best, ties share a rank) and percentiles (100 = best)
+    within each cohort (one cohort per year). NaNs rank last. One lexsort per column.
+    """
+    n = len(values)
+    ranks = np.zeros(n, dtype=np.int32)
+    percentiles = np.zeros(n, dtype=np.float64)
+    if n == 0:
+        return ranks, percentiles
+
+    key = np.where(np.isnan(values), np.inf, -values if higher_is_better else values)
+    order = np.lexsort((key, cohorts))
+    sorted_cohorts = cohorts[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(sorted_cohorts)) + 1]
+    sizes = np.diff(np.r_[starts, n])
+    position = np.arange(n) - np.repeat(starts, sizes)
+
+    # Ties share the best rank within their run
+    sorted_key = key[order]
+    new_run = np.r_[True, (np.diff(sorted_key) != 0) | (np.diff(sorted_cohorts) != 0)]
+    run_start = np.maximum.accumulate(np.where(new_run, np.arange(n), 0))
+    ranks[order] = position[run_start] + 1
+
+    cohort_size = np.repeat(sizes, sizes)
+    percentiles[order] = np.where(cohort_size > 1, 100.0 * (cohort_size - 1 - position[run_start]) / np.maximum(cohort_size - 1, 1), 100.0)
+    return ranks, percentiles
+
+
+class ResourceTable:
+    """Column arrays for one data version, with ranks and percentiles precomputed per year."""
+
+    def __init__(self, rows, version):
+        self.version = version
+        self.rows = rows
+        self.size = len(rows)
+        self.labels = {
+            name: np.array([str(row.get(name, '')) for row in rows], dtype=object)
+            for name in LABEL_COLUMNS
+        }
+        self._lower = {name: np.array([v.lower() for v in values], dtype=object) for name, values in self.labels.items()}
+        self.has_districts = any(row.get('district') for row in rows)
+        self.columns = {
+            name: np.array([row.get(name, np.nan) for row in rows], dtype=np.float64)
+            for name in BASE_METRICS
+        }
+        _derive(self.columns)
+
+        years, cohorts = np.unique(self.labels['year'], return_inverse=True)
+        self.years = [y for y in years.tolist() if y]
+        self.ranks = {}
+        self.percentiles = {}
+        for name, higher in RANKED_METRICS.items():
+            self.ranks[name], self.percentiles[name] = _cohort_ranks(self.columns[name], cohorts, higher)
+
+        self.summary = {
+            name: {
+                'mean': _clean(np.nanmean(values)) if self.size else None,
+                'median': _clean(np.nanmedian(values)) if self.size else None,
+                'min': _clean(np.nanmin(values)) if self.size else None,
+                'max': _clean(np.nanmax(values)) if self.size else None,
+            }
+            for name, values in self.columns.items()
+            if self.size and not np.all(np.isnan(values))
+        }
+
+    def query(self, states=None, districts=None, year=None, sort=None, descending=None, limit=None,
+              offset=0, fields=None, columnar=False):
+        mask = np.ones(self.size, dtype=bool)
+        if states:
+            mask &= np.isin(self._lower['state'], [s.lower() for s in states])
+        if districts:
+            mask &= np.isin(self._lower['district'], [d.lower() for d in districts])
+        if year:
+            mask &= self.labels['year'] == str(year)
+        selected = np.flatnonzero(mask)
+
+        if sort:
+            if sort not in self.columns and sort not in LABEL_COLUMNS:
+                raise ValueError(f"Unknown sort field '{sort}'")
+            if sort in LABEL_COLUMNS:
+                keys = self.labels[sort][selected].astype(str)
+                order = np.argsort(keys, kind='stable')
+                if descending:
+                    order = order[::-1]
+            else:
+                values = self.columns[sort][selected]
+                if descending is None:
+                    descending = RANKED_METRICS[sort]
+                key = np.where(np.isnan(values), np.inf, -values if descending else values)
+                order = np.argsort(key, kind='stable')
+            selected = selected[order]
+
+        total = int(len(selected))
+        selected = selected[offset:offset + limit if limit else None]
+
+        metric_fields = [f for f in (fields or list(self.columns)) if f in self.columns]
+        unknown = [f for f in (fields or []) if f not in self.columns and f not in LABEL_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        label_fields = [f for f in LABEL_COLUMNS if (f != 'district' or self.has_districts) and (f != 'year' or self.years)]
+
+        out = {name: self.labels[name][selected].tolist() for name in label_fields}
+        if 'year' in out:
+            out['year'] = [int(y) if y.isdigit() else y for y in out['year']]
+        for name in metric_fields:
+            out[name] = _clean_list(self.columns[name][selected])
+            if name in self.ranks:
+                out[f"{name}_rank"] = self.ranks[name][selected].tolist()
+                out[f"{name}_pct"] = np.round(self.percentiles[name][selected], 1).tolist()
+
+        if columnar:
+            records = out
+        else:
+            keys = list(out)
+            records = [dict(zip(keys, values)) for values in zip(*(out[k] for k in keys))]
+        return {'version': self.version, 'total': total, 'count': int(len(selected)), 'rows': records}
+
+
+def _clean(value):
+    value = float(value)
+    return None if np.isnan(value) else round(value, 4)
+
+
+def _clean_list(values):
+    rounded = np.round(values, 4)
+    return [None if v != v else v for v in rounded.tolist()]
+
+
+def _file_version(path):
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+class ResourceAnalytics:
+    """Loads the state (and optional district) datasets and rebuilds tables only when a file changes."""
+
+    def __init__(self, sources=None):
+        self.sources = sources or {'state': STATE_FILE, 'district': DISTRICT_FILE}
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def table(self, level='state'):
+        path = self.sources.get(level)
+        if path is None or not os.path.exists(path):
+            raise FileNotFoundError(f"No resource data for level '{level}'")
+        version = _file_version(path)
+        table = self._tables.get(level)
+        if table is not None and table.version == version:
+            return table
+        with self._lock:
+            table = self._tables.get(level)
+            if table is None or table.version != version:
+                with open(path, 'r') as f:
+                    rows = json.load(f)
+                table = ResourceTable(rows, version)
+                self._tables[level] = table
+                logger.info("Resource analytics rebuilt", extra={'dataset': level, 'rows': table.size, 'version': version})
+        return table
+
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+
+def get_resource_analytics():
+    """Get or create the process-wide analytics engine."""
+    global _analytics
+    if _analytics is None:
+        with _analytics_lock:
+            if _analytics is None:
+                _analytics = ResourceAnalytics()
+    return _analytics
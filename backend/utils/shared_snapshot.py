@@ -0,0 +1,253 @@
+import os
+import json
+import mmap
+import time
+import struct
+import threading
+from utils.metrics import record_cache, stage
+from utils.logger import get_logger
+
+logger = get_logger('shared_snapshot')
+
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache', 'snapshots'))
+SNAPSHOT_CHECK_INTERVAL = float(os.getenv('SNAPSHOT_CHECK_INTERVAL', 1.0))  # Seconds between pointer checks
+SNAPSHOT_LOCK_STALE = float(os.getenv('SNAPSHOT_LOCK_STALE', 60))  # A publisher lock older than this is abandoned
+SNAPSHOT_KEEP = int(os.getenv('SNAPSHOT_KEEP', 8))  # Versions kept on disk: readers mid-swap keep their mapping, and deltas can diff against them
+
+# magic, version, published_at (unix ms), body length
+_HEADER = struct.Struct('<8sQQQ')
+_MAGIC = b'CBSNAP01'
+
+
+class Snapshot:
+    """A read-only mapped version: `body` is the pre-serialised JSON as a memoryview over the map."""
+
+    def __init__(self, version, published_at, mapping, body, path=None):
+        self.version = version
+        self.published_at = published_at
+        self._mapping = mapping
+        self.body = body
+        self.path = path
+        self._decoded = None
+        self._decode_lock = threading.Lock()
+
+    def to_bytes(self):
+        return self.body.tobytes()
+
+    def open_body(self):
+        """
+        The version's file positioned at the body (which runs to the end of the
+        file), for responses the server can send with sendfile(); no copy is made
+        in Python. None if the file has already been pruned.
+        """
+        if self.path is None:
+            return None
+        try:
+            f = open(self.path, 'rb')
+        except OSError:
+            return None
+        f.seek(_HEADER.size)
+        return f
+
+    def decode(self):
+        """Parsed data for in-process callers, decoded once per version."""
+        if self._decoded is None:
+            with self._decode_lock:
+                if self._decoded is None:
+                    self._decoded = json.loads(self.body.tobytes())
+        return self._decoded
+
+    @property
+    def age(self):
+        return time.time() - self.published_at / 1000.0
+
+
+class SharedSnapshot:
+    """
+    Versioned snapshot published to a memory-mapped file shared by every worker
+    process. One process rebuilds at a time (guarded by an exclusive lock file);
+    the others keep serving the mapped version and pick up the new one when the
+    `current` pointer moves. Files are versioned rather than overwritten so the
+    swap also works where mapped files cannot be replaced (Windows).
+
+    A version also expires early when any of `sources` (the files the builder
+    reads) is modified after it was published.
+    """
+
+    def __init__(self, name, builder, max_age, directory=SNAPSHOT_DIR, sources=()):
+        self.name = name
+        self.builder = builder
+        self.max_age = max_age
+        self.sources = tuple(sources)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._pointer = os.path.join(directory, f"{name}.current")
+        self._lock_path = os.path.join(directory, f"{name}.lock")
+        self._current = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+
+    def _version_path(self, version):
+        return os.path.join(self.directory, f"{self.name}.v{version}.snap")
+
+    def _read_pointer(self):
+        try:
+            with open(self._pointer, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _map(self, version):
+        with open(self._version_path(version), 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, stored_version, published_at, length = _HEADER.unpack_from(mapping, 0)
+        if magic != _MAGIC or stored_version != version:
+            mapping.close()
+            raise ValueError(f"Corrupt snapshot {self.name} v{version}")
+        body = memoryview(mapping)[_HEADER.size:_HEADER.size + length]
+        return Snapshot(version, published_at, mapping, body, self._version_path(version))
+
+    def _acquire_publisher(self):
+        try:
+            fd = os.open(self._lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(self._lock_path) > SNAPSHOT_LOCK_STALE:
+                    os.remove(self._lock_path)
+            except OSError:
+                pass
+            return False
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        return True
+
+    def _release_publisher(self):
+        try:
+            os.remove(self._lock_path)
+        except OSError:
+            pass
+
+    def publish(self):
+        """Build, write and atomically point readers at a new version. Returns the version or None."""
+        if not self._acquire_publisher():
+            return None
+        try:
+            started = time.perf_counter()
+            with stage(f"{self.name}_build"):
+                data = self.builder()
+            with stage('serialize'):
+                body = json.dumps(data, ensure_ascii=True, sort_keys=True, separators=(',', ':')).encode() + b'\n'
+            version = self._read_pointer() + 1
+            path = self._version_path(version)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, version, int(time.time() * 1000), len(body)))
+                f.write(body)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+
+            pointer_tmp = f"{self._pointer}.{os.getpid()}.tmp"
+            with open(pointer_tmp, 'w') as f:
+                f.write(str(version))
+            os.replace(pointer_tmp, self._pointer)
+
+            self._prune(version)
+            logger.info("Snapshot published", extra={
+                'snapshot': self.name, 'version': version, 'bytes': len(body),
+                'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            })
+            return version
+        finally:
+            self._release_publisher()
+
+    def _prune(self, newest):
+        for version in range(max(1, newest - SNAPSHOT_KEEP - 16), newest - SNAPSHOT_KEEP + 1):
+            try:
+                os.remove(self._version_path(version))
+            except OSError:
+                # Missing, or still mapped by a reader on platforms that forbid it
+                pass
+
+    def get(self):
+        """Current mapped snapshot, refreshed from the pointer at most every SNAPSHOT_CHECK_INTERVAL."""
+        now = time.monotonic()
+        current = self._current
+        if current is not None and now - self._checked_at < SNAPSHOT_CHECK_INTERVAL:
+            record_cache(self.name, True)
+            return current
+
+        with self._lock:
+            if self._current is not None and now - self._checked_at < SNAPSHOT_CHECK_INTERVAL:
+                record_cache(self.name, True)
+                return self._current
+            self._checked_at = now
+            published = None
+
+            version = self._read_pointer()
+            if self._current is not None and self._current.version == version:
+                age = self._current.age
+            else:
+                age = self._peek_age(version) if version else float('inf')
+            if age > self.max_age or self._sources_changed(age):
+                # Missing or expired: one process rebuilds, the rest keep the mapped version
+                try:
+                    published = self.publish()
+                    version = published or self._read_pointer()
+                except Exception as e:
+                    logger.error("Snapshot publish failed", extra={'snapshot': self.name, 'error': str(e)})
+
+            if version and (self._current is None or self._current.version != version):
+                try:
+                    self._current = self._map(version)
+                except (OSError, ValueError) as e:
+                    logger.error("Snapshot map failed", extra={'snapshot': self.name, 'version': version, 'error': str(e)})
+                else:
+                    with self._changed:
+                        self._changed.notify_all()
+            record_cache(self.name, published is None and self._current is not None)
+            return self._current
+
+    def _sources_changed(self, age):
+        published = time.time() - age
+        for path in self.sources:
+            try:
+                if os.path.getmtime(path) > published:
+                    return True
+            except OSError:
+                continue
+        return False
+
+    def load(self, version):
+        """Map an older version still on disk (for diffs); None once it has been pruned."""
+        current = self._current
+        if current is not None and current.version == version:
+            return current
+        try:
+            return self._map(version)
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def wait(self, after, timeout):
+        """
+        Block until a version other than `after` is current, or `timeout` passes.
+        Publishes in this process wake waiters at once; other processes' publishes
+        are seen within SNAPSHOT_CHECK_INTERVAL. Returns the current snapshot.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            current = self.get()
+            remaining = deadline - time.monotonic()
+            if (current is not None and current.version != after) or remaining <= 0:
+                return current
+            with self._changed:
+                self._changed.wait(min(remaining, SNAPSHOT_CHECK_INTERVAL))
+
+    def _peek_age(self, version):
+        try:
+            with open(self._version_path(version), 'rb') as f:
+                _, _, published_at, _ = _HEADER.unpack(f.read(_HEADER.size))
+            return time.time() - published_at / 1000.0
+        except (OSError, struct.error):
+            return float('inf')
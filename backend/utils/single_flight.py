@@ -0,0 +1,92 @@
+import copy
+import json
+import hashlib
+import threading
+from utils import metrics as telemetry
+from utils import deadline
+
+COALESCED_CALLS = telemetry.counter(
+    'curebird_single_flight_total', 'Calls by coalescing role (leader ran it, follower shared it).', ('group', 'role')
+)
+
+
+def canonical_key(*parts):
+    """Stable hash of the request parts; dicts are key-sorted and bytes are hashed by content."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (bytes, bytearray, memoryview)):
+            digest.update(b'b:' + hashlib.sha256(part).digest())
+        else:
+            digest.update(b'j:' + json.dumps(part, sort_keys=True, default=str, separators=(',', ':')).encode())
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'deadline')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.deadline = deadline.current()
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution. The first
+    caller runs `fn`; callers arriving while it is in flight wait and receive a
+    copy of its result (or its exception). Nothing is cached once the call ends.
+    Followers wait no longer than their own request deadline. A leader that
+    stopped on its own deadline or disconnect (DeadlineExceeded, Cancelled) is
+    not the followers' failure: each follower with time left calls again,
+    leading the next execution or joining it.
+    """
+
+    def __init__(self, group):
+        self.group = group
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+            if leader:
+                break
+
+            COALESCED_CALLS.inc(self.group, 'follower')
+            if call.deadline is not None:
+                # Another request wants the result, so the leader's client hanging up must not cancel it
+                call.deadline.shared = True
+            own = deadline.current()
+            if not call.done.wait(own.remaining() if own is not None else None):
+                own.check()
+            if isinstance(call.error, deadline.DeadlineExceeded):
+                # The leader ran out of its own time; raises only if this request has too
+                deadline.check()
+                continue
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        COALESCED_CALLS.inc(self.group, 'leader')
+        try:
+            result = fn(*args, **kwargs)
+            # Followers copy from a private snapshot, so the leader's caller may mutate its own result
+            call.result = copy.deepcopy(result)
+            return result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
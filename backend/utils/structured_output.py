@@ -0,0 +1,267 @@
+import re
+import json
+from utils import metrics as telemetry
+from utils import deadline
+from utils.logger import get_logger
+
+logger = get_logger('structured_output')
+
+STRUCTURED_OUTPUTS = telemetry.counter(
+    'curebird_structured_output_total', 'Structured LLM outputs by how they were recovered.', ('schema', 'outcome')
+)
+
+_FENCE_RE = re.compile(r'```(?:json|JSON)?\s*(.*?)(?:```|$)', re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r',(\s*[}\]])')
+
+CONTINUE_PROMPT = ("Your JSON was cut off. Continue exactly where it stopped: output only the remaining "
+                   "characters, with no repetition, commentary or code fences.")
+FIX_PROMPT = ("Your previous output was not valid JSON for the required format ({errors}). "
+              "Return only the corrected JSON object, with no commentary or code fences.")
+
+
+class StructuredOutputError(ValueError):
+    """Model output that could not be repaired into a document matching its schema."""
+
+    def __init__(self, message, truncated=False):
+        super().__init__(message)
+        self.truncated = truncated
+
+
+def _close_truncated(text):
+    """
+    Close whatever a truncated JSON document left open. A partial string value
+    is kept and terminated; a partial key, literal or dangling comma/colon is
+    cut back to the last complete value. Open arrays/objects are then closed
+    in reverse order. Returns (text, was_truncated).
+    """
+    stack = []  # [closer, expecting_key] per open container
+    in_string = escaped = string_is_key = in_literal = False
+    last_safe = 0  # Offset just past the last complete value or container opening
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+                if not string_is_key:
+                    last_safe = i + 1
+            continue
+        if in_literal and (ch.isspace() or ch in ',:]}'):
+            in_literal = False
+            last_safe = i
+        if ch == '"':
+            in_string = True
+            string_is_key = bool(stack) and stack[-1][0] == '}' and stack[-1][1]
+        elif ch in '{[':
+            stack.append(['}', True] if ch == '{' else [']', False])
+            last_safe = i + 1
+        elif ch in '}]':
+            if stack:
+                stack.pop()
+            last_safe = i + 1
+        elif ch == ':':
+            if stack and stack[-1][0] == '}':
+                stack[-1][1] = False
+        elif ch == ',':
+            if stack and stack[-1][0] == '}':
+                stack[-1][1] = True
+        elif not ch.isspace():
+            in_literal = True
+
+    if not stack:
+        return text, False
+    if in_string and not string_is_key:
+        text = (text[:-1] if escaped else text) + '"'
+    else:
+        text = text[:last_safe]
+    return text.rstrip().rstrip(',') + ''.join(closer for closer, _ in reversed(stack)), True
+
+
+def repair_json(text):
+    """
+    Parse model output as JSON, repairing the usual damage: code fences, prose
+    around the document, trailing commas and truncation. Returns (value,
+    repaired, truncated); raises StructuredOutputError when nothing parses.
+    """
+    original = text or ''
+    candidate = original.strip()
+    fenced = _FENCE_RE.search(candidate)
+    if fenced:
+        candidate = fenced.group(1).strip()
+    try:
+        return json.loads(candidate), candidate != original.strip(), False
+    except ValueError:
+        pass
+
+    starts = [i for i in (candidate.find('{'), candidate.find('[')) if i >= 0]
+    if not starts:
+        raise StructuredOutputError('no JSON document in output')
+    candidate = candidate[min(starts):]
+    candidate, truncated = _close_truncated(candidate)
+    candidate = _TRAILING_COMMA_RE.sub(r'\1', candidate)
+    try:
+        return json.loads(candidate), True, truncated
+    except ValueError:
+        pass
+    # Prose after a complete document: keep the first value only
+    try:
+        value, _ = json.JSONDecoder().raw_decode(candidate)
+        return value, True, truncated
+    except ValueError as e:
+        raise StructuredOutputError(f'unrepairable JSON: {e}', truncated=truncated)
+
+
+class Field:
+    """
+    One schema field. `kind` is 'str', 'bool', 'list' or 'object'. Values are
+    coerced where the intent is clear (e.g. "true" -> True, a bare string for
+    a list, {"name": ...} for a string); `aliases` are alternative keys the
+    model may use.
+    """
+
+    def __init__(self, kind, required=False, default=None, aliases=(), items=None, fields=None, from_string=None):
+        self.kind = kind
+        self.required = required
+        self.default = default
+        self.aliases = tuple(aliases)
+        self.items = items
+        self.fields = fields or {}
+        self.from_string = from_string
+
+    def coerce(self, value, path):
+        if self.kind == 'str':
+            if isinstance(value, str):
+                return value.strip()
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return str(value)
+            if isinstance(value, dict) and isinstance(value.get('name'), str):
+                return value['name'].strip()
+        elif self.kind == 'bool':
+            if isinstance(value, bool):
+                return value
+            if isinstance(value, str) and value.strip().lower() in ('true', 'yes', '1', 'false', 'no', '0'):
+                return value.strip().lower() in ('true', 'yes', '1')
+        elif self.kind == 'list':
+            if isinstance(value, (str, dict)):
+                value = [value]
+            if isinstance(value, list):
+                out = []
+                for index, item in enumerate(value):
+                    try:
+                        out.append(self.items.coerce(item, f"{path}[{index}]") if self.items else item)
+                    except StructuredOutputError as e:
+                        # One bad element (often the one truncation cut short) should not sink the rest
+                        logger.debug("Dropped invalid list item", extra={'path': path, 'error': str(e)})
+                return out
+        elif self.kind == 'object':
+            if isinstance(value, str) and self.from_string:
+                value = {self.from_string: value}
+            if isinstance(value, dict):
+                return validate(value, self.fields, path)
+        raise StructuredOutputError(f"{path or 'value'}: expected {self.kind}, got {type(value).__name__}")
+
+
+def validate(document, fields, path=''):
+    """Coerce a parsed document to `fields` (name -> Field); raises StructuredOutputError listing what is wrong."""
+    if not isinstance(document, dict):
+        raise StructuredOutputError(f"{path or 'document'}: expected object, got {type(document).__name__}")
+    out, errors = {}, []
+    for name, field in fields.items():
+        key = next((k for k in (name,) + field.aliases if document.get(k) not in (None, '')), None)
+        where = f"{path}.{name}" if path else name
+        if key is None:
+            if field.required:
+                errors.append(f"{where}: missing")
+            elif field.default is not None:
+                out[name] = list(field.default) if isinstance(field.default, list) else field.default
+            continue
+        try:
+            out[name] = field.coerce(document[key], where)
+        except StructuredOutputError as e:
+            if field.required:
+                errors.append(str(e))
+            elif field.default is not None:
+                out[name] = list(field.default) if isinstance(field.default, list) else field.default
+    if errors:
+        raise StructuredOutputError('; '.join(errors))
+    return out
+
+
+def parse_structured(text, fields):
+    """repair_json + validate. Returns (document, repaired, truncated)."""
+    value, repaired, truncated = repair_json(text)
+    try:
+        return validate(value, fields), repaired, truncated
+    except StructuredOutputError as e:
+        e.truncated = truncated
+        raise
+
+
+def _failed_generation(error):
+    """Text the provider rejected in JSON mode (Groq returns it as error.failed_generation)."""
+    body = getattr(error, 'body', None)
+    if isinstance(body, dict):
+        detail = body.get('error', body)
+        if isinstance(detail, dict) and isinstance(detail.get('failed_generation'), str):
+            return detail['failed_generation']
+    return None
+
+
+def structured_completion(client, schema_name, fields, provider='groq', **kwargs):
+    """
+    timed_completion for a JSON answer, parsed and validated against `fields`.
+    Malformed or truncated output is repaired locally. Only when that fails is
+    one follow-up call made: a continuation if the output was cut off, else a
+    request to correct it. Raises StructuredOutputError if that fails too.
+    """
+    raw, finish_reason = None, None
+    try:
+        completion = telemetry.timed_completion(client, provider, **kwargs)
+        choice = completion.choices[0]
+        raw, finish_reason = choice.message.content or '', getattr(choice, 'finish_reason', None)
+    except Exception as e:
+        raw = _failed_generation(e)
+        if raw is None:
+            raise
+        logger.warning("Provider rejected JSON output; repairing locally", extra={'schema': schema_name})
+
+    try:
+        with telemetry.stage('response_parse'):
+            document, repaired, _ = parse_structured(raw, fields)
+        STRUCTURED_OUTPUTS.inc(schema_name, 'repaired' if repaired else 'ok')
+        return document
+    except StructuredOutputError as e:
+        first_error = e
+
+    truncated = first_error.truncated or finish_reason == 'length'
+    follow_up = CONTINUE_PROMPT if truncated else FIX_PROMPT.format(errors=str(first_error)[:300])
+    messages = list(kwargs['messages']) + [
+        {'role': 'assistant', 'content': raw},
+        {'role': 'user', 'content': follow_up},
+    ]
+    # A continuation is a fragment, so provider-side JSON mode would reject it
+    retry_kwargs = {k: v for k, v in kwargs.items() if k != 'response_format' or not truncated}
+    retry_kwargs['messages'] = messages
+    logger.info("Structured output follow-up call", extra={'schema': schema_name, 'truncated': truncated,
+                                                            'error': str(first_error)})
+    try:
+        completion = telemetry.timed_completion(client, provider, **retry_kwargs)
+        text = completion.choices[0].message.content or ''
+    except deadline.DeadlineExceeded:
+        STRUCTURED_OUTPUTS.inc(schema_name, 'failed')
+        raise
+    except Exception as e:
+        text = _failed_generation(e)
+        if text is None:
+            STRUCTURED_OUTPUTS.inc(schema_name, 'failed')
+            raise StructuredOutputError(f'follow-up call failed: {e}')
+    try:
+        with telemetry.stage('response_parse'):
+            document, _, _ = parse_structured(raw + text if truncated else text, fields)
+    except StructuredOutputError:
+        STRUCTURED_OUTPUTS.inc(schema_name, 'failed')
+        raise
+    STRUCTURED_OUTPUTS.inc(schema_name, 'continued')
+    return document
@@ -0,0 +1,253 @@
+import os
+import json
+import atexit
+import math
+import time
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from utils import metrics as telemetry
+from utils.logger import get_logger
+
+logger = get_logger('token_ledger')
+
+LEDGER_PATH = os.getenv('TOKEN_LEDGER_PATH', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache', 'token_ledger.jsonl'))
+LEDGER_FLUSH_INTERVAL = float(os.getenv('TOKEN_LEDGER_FLUSH_INTERVAL', 60))  # Seconds between flushes (0 = no ledger file)
+LEDGER_MAX_KEYS = int(os.getenv('TOKEN_LEDGER_MAX_KEYS', 20000))  # Conversations/clients tracked before LRU eviction
+
+# Rolling-window budgets in tokens (prompt + completion); 0 disables a limit
+BUDGET_WINDOW = int(os.getenv('TOKEN_BUDGET_WINDOW', 3600))  # Seconds
+BUDGETS = {
+    'conversation': {
+        'downgrade': int(os.getenv('TOKEN_BUDGET_CONVERSATION_DOWNGRADE', 30000)),
+        'throttle': int(os.getenv('TOKEN_BUDGET_CONVERSATION_THROTTLE', 80000)),
+    },
+    'client': {
+        'downgrade': int(os.getenv('TOKEN_BUDGET_CLIENT_DOWNGRADE', 100000)),
+        'throttle': int(os.getenv('TOKEN_BUDGET_CLIENT_THROTTLE', 250000)),
+    },
+}
+
+OK, DOWNGRADE, THROTTLE = 'ok', 'downgrade', 'throttle'
+
+BUDGET_ACTIONS = telemetry.counter('curebird_token_budget_actions_total', 'Budget enforcement actions.', ('scope', 'action'))
+
+# Who the current LLM call is on behalf of. Set by routes and services, read when usage is recorded.
+_attribution = contextvars.ContextVar('token_attribution', default={})
+
+
+def bind(**labels):
+    """Add attribution labels for the current context; returns a token for unbind()."""
+    return _attribution.set({**_attribution.get(), **{k: v for k, v in labels.items() if v}})
+
+
+def unbind(token):
+    try:
+        _attribution.reset(token)
+    except ValueError:
+        # Token from another context (e.g. a request torn down on a different thread)
+        pass
+
+
+@contextmanager
+def attribute(**labels):
+    """Attribute LLM usage inside the block to e.g. conversation=..., client=..., route=..."""
+    token = bind(**labels)
+    try:
+        yield
+    finally:
+        unbind(token)
+
+
+def current_attribution():
+    return _attribution.get()
+
+
+class _Usage:
+    __slots__ = ('prompt', 'completion', 'calls', 'minutes')
+
+    def __init__(self):
+        self.prompt = 0
+        self.completion = 0
+        self.calls = 0
+        self.minutes = deque()  # [minute, tokens] buckets inside the budget window
+
+    def add(self, prompt, completion, minute):
+        self.prompt += prompt
+        self.completion += completion
+        self.calls += 1
+        if self.minutes and self.minutes[-1][0] == minute:
+            self.minutes[-1][1] += prompt + completion
+        else:
+            self.minutes.append([minute, prompt + completion])
+
+    def window_total(self, minute, window_minutes):
+        while self.minutes and self.minutes[0][0] <= minute - window_minutes:
+            self.minutes.popleft()
+        return sum(tokens for _, tokens in self.minutes)
+
+    def as_dict(self):
+        return {'prompt_tokens': self.prompt, 'completion_tokens': self.completion, 'calls': self.calls}
+
+
+class TokenLedger:
+    """
+    In-memory token accounting per conversation, client and route, each split
+    by model. Recording is a dict update under one lock; totals since the last
+    flush are appended to a JSONL file by a background thread. With a flush
+    interval of 0 there is no file and nothing is kept for one.
+    """
+
+    def __init__(self, path=LEDGER_PATH, flush_interval=LEDGER_FLUSH_INTERVAL, budgets=BUDGETS,
+                 window=BUDGET_WINDOW, max_keys=LEDGER_MAX_KEYS):
+        self.path = path
+        self.budgets = budgets
+        self.window_minutes = max(1, math.ceil(window / 60))
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._totals = {scope: OrderedDict() for scope in ('conversation', 'client', 'route')}
+        self._by_model = {scope: {} for scope in self._totals}
+        self._pending = {}  # (scope, key, model) -> [prompt, completion, calls] since the last flush
+        self._persist = flush_interval > 0
+        self._flusher = None
+        if self._persist:
+            self._flusher = threading.Thread(target=self._flush_loop, args=(flush_interval,),
+                                             name='token-ledger', daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+
+    def record(self, model, prompt_tokens, completion_tokens, **labels):
+        """Add one call's usage; labels default to the current attribution context."""
+        labels = {**current_attribution(), **{k: v for k, v in labels.items() if v}}
+        prompt_tokens = int(prompt_tokens or 0)
+        completion_tokens = int(completion_tokens or 0)
+        minute = int(time.time() // 60)
+        with self._lock:
+            for scope, entries in self._totals.items():
+                key = labels.get(scope)
+                if not key:
+                    continue
+                usage = entries.get(key)
+                if usage is None:
+                    usage = entries[key] = _Usage()
+                    if len(entries) > self.max_keys:
+                        evicted, _ = entries.popitem(last=False)
+                        self._by_model[scope].pop(evicted, None)
+                else:
+                    entries.move_to_end(key)
+                usage.add(prompt_tokens, completion_tokens, minute)
+
+                models = self._by_model[scope].setdefault(key, {})
+                model_usage = models.setdefault(model, [0, 0, 0])
+                model_usage[0] += prompt_tokens
+                model_usage[1] += completion_tokens
+                model_usage[2] += 1
+
+                if not self._persist:
+                    continue
+                pending = self._pending.setdefault((scope, key, model), [0, 0, 0])
+                pending[0] += prompt_tokens
+                pending[1] += completion_tokens
+                pending[2] += 1
+
+    def window_usage(self, scope, key):
+        """Tokens used by `key` inside the rolling budget window."""
+        minute = int(time.time() // 60)
+        with self._lock:
+            usage = self._totals[scope].get(key)
+            return usage.window_total(minute, self.window_minutes) if usage else 0
+
+    def check(self, conversation=None, client=None):
+        """
+        Budget verdict for a call: (OK | DOWNGRADE | THROTTLE, retry_after_seconds).
+        Defaults to the current attribution context. The strictest scope wins.
+        """
+        labels = current_attribution()
+        targets = {'conversation': conversation or labels.get('conversation'),
+                   'client': client or labels.get('client')}
+        verdict, scope_hit = OK, None
+        for scope, key in targets.items():
+            if not key:
+                continue
+            used = self.window_usage(scope, key)
+            limits = self.budgets.get(scope, {})
+            if limits.get('throttle') and used >= limits['throttle']:
+                verdict, scope_hit = THROTTLE, scope
+                break
+            if limits.get('downgrade') and used >= limits['downgrade']:
+                verdict, scope_hit = DOWNGRADE, scope
+        if verdict != OK:
+            BUDGET_ACTIONS.inc(scope_hit, verdict)
+        # Tokens leave the window minute by minute; the oldest bucket frees first
+        retry_after = 60 if verdict == THROTTLE else 0
+        return verdict, retry_after
+
+    def should_downgrade(self, conversation=None, client=None):
+        return self.check(conversation, client)[0] != OK
+
+    def report(self, scope, key=None, limit=20):
+        """Totals for one key, or the top `limit` keys by window usage."""
+        minute = int(time.time() // 60)
+        with self._lock:
+            entries = self._totals[scope]
+            keys = [key] if key else list(entries)
+            rows = []
+            for k in keys:
+                usage = entries.get(k)
+                if usage is None:
+                    continue
+                rows.append({
+                    scope: k,
+                    **usage.as_dict(),
+                    'window_tokens': usage.window_total(minute, self.window_minutes),
+                    'models': {m: {'prompt_tokens': p, 'completion_tokens': c, 'calls': n}
+                               for m, (p, c, n) in self._by_model[scope].get(k, {}).items()},
+                })
+        rows.sort(key=lambda row: row['window_tokens'], reverse=True)
+        return rows[:limit]
+
+    def flush(self):
+        """Append usage since the last flush to the ledger file (one JSON line per scope/key/model)."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        now = time.time()
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a') as f:
+                for (scope, key, model), (prompt, completion, calls) in pending.items():
+                    f.write(json.dumps({'ts': round(now, 3), 'scope': scope, 'key': key, 'model': model,
+                                        'prompt_tokens': prompt, 'completion_tokens': completion,
+                                        'calls': calls}) + '\n')
+        except OSError as e:
+            logger.error("Token ledger flush failed", extra={'error': str(e)})
+            return 0
+        return len(pending)
+
+    def _flush_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_token_ledger():
+    """Get or create the process-wide ledger."""
+    global _ledger
+    if _ledger is None:
+        with _ledger_lock:
+            if _ledger is None:
+                _ledger = TokenLedger()
+    return _ledger
+
+
+def _record_tokens(provider, model, prompt_tokens, completion_tokens):
+    get_token_ledger().record(model, prompt_tokens, completion_tokens)
+
+
+telemetry.add_usage_hook(_record_tokens)
@@ -0,0 +1,140 @@
+import re
+import hashlib
+import numpy as np
+
+# Readings considered for a single insight (matches the prompt window)
+WINDOW = 10
+
+# Reference ranges keyed on normalised unit. Units not listed get no range flags.
+REFERENCE_RANGES = {
+    'mg/dl': (70.0, 140.0),
+    'mmol/l': (3.9, 7.8),
+    'mmhg': (90.0, 140.0),
+    'bpm': (60.0, 100.0),
+    'kg/m2': (18.5, 25.0),
+    'spo2': (95.0, 100.0),
+}
+
+_NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?')
+
+
+def _parse_value(raw):
+    """Pull the leading number out of a reading ('120/80' -> 120.0, '7.1 %' -> 7.1)."""
+    if isinstance(raw, (int, float)):
+        return float(raw)
+    match = _NUMBER_RE.search(str(raw or ''))
+    return float(match.group()) if match else np.nan
+
+
+def _normalise_unit(unit):
+    return str(unit or '').lower().replace(' ', '').replace('²', '2')
+
+
+def compute_trend_features(metrics):
+    """
+    Deterministic trend features over the insight window, computed with numpy.
+    Returns a plain dict so it can be cached, fingerprinted and put in a prompt.
+    """
+    window = (metrics or [])[:WINDOW]
+    values = np.array([_parse_value(m.get('value')) for m in window], dtype=float)
+    values = values[~np.isnan(values)]
+    unit = _normalise_unit(window[0].get('unit')) if window else ''
+
+    features = {
+        'count': int(values.size),
+        'unit': unit,
+        'latest': None,
+        'mean': None,
+        'slope': 0.0,
+        'variance': 0.0,
+        'percent_change': 0.0,
+        'out_of_range': 0,
+        'high_flags': [],
+        'low_flags': [],
+    }
+    if values.size == 0:
+        return features
+
+    features['latest'] = float(values[-1])
+    features['mean'] = float(values.mean())
+    features['variance'] = float(values.var())
+
+    if values.size > 1:
+        # Least-squares slope per reading
+        x = np.arange(values.size, dtype=float)
+        x -= x.mean()
+        features['slope'] = float((x * (values - values.mean())).sum() / (x * x).sum())
+        if values[0] != 0:
+            features['percent_change'] = float((values[-1] - values[0]) / abs(values[0]) * 100.0)
+
+    bounds = REFERENCE_RANGES.get(unit)
+    if bounds:
+        low, high = bounds
+        high_mask = values > high
+        low_mask = values < low
+        features['high_flags'] = np.flatnonzero(high_mask).tolist()
+        features['low_flags'] = np.flatnonzero(low_mask).tolist()
+        features['out_of_range'] = int(high_mask.sum() + low_mask.sum())
+
+    return features
+
+
+def _quantize(value, step):
+    if value is None:
+        return None
+    return round(round(value / step) * step, 6)
+
+
+def fingerprint(disease_name, features, relative_step=0.05):
+    """
+    Stable cache key for a disease and its quantized features.
+    Readings that differ by less than `relative_step` of the mean land on the same key.
+    """
+    mean = features.get('mean') or 0.0
+    step = max(abs(mean) * relative_step, 1e-6)
+    parts = [
+        str(disease_name or '').lower().strip(),
+        features.get('unit', ''),
+        str(features.get('count', 0)),
+        str(_quantize(features.get('mean'), step)),
+        str(_quantize(features.get('latest'), step)),
+        str(_quantize(features.get('slope'), step)),
+        str(int(np.sign(features.get('slope') or 0.0))),
+        str(features.get('out_of_range', 0)),
+    ]
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def features_moved(previous, current, threshold=0.1):
+    """True when the new features differ enough from the cached ones to need a fresh insight."""
+    if previous is None:
+        return True
+    if previous.get('unit') != current.get('unit'):
+        return True
+    if previous.get('out_of_range') != current.get('out_of_range'):
+        return True
+    if np.sign(previous.get('slope') or 0.0) != np.sign(current.get('slope') or 0.0):
+        return True
+
+    scale = max(abs(previous.get('mean') or 0.0), 1e-6)
+    for key in ('mean', 'latest', 'slope'):
+        prev_val = previous.get(key) or 0.0
+        cur_val = current.get(key) or 0.0
+        if abs(cur_val - prev_val) / scale > threshold:
+            return True
+    return abs((current.get('percent_change') or 0.0) - (previous.get('percent_change') or 0.0)) > threshold * 100.0
+
+
+def describe_features(features):
+    """Compact prompt block so the model starts from the locally computed numbers."""
+    if not features.get('count'):
+        return "Computed Trend Features: no numeric readings."
+    return (
+        "Computed Trend Features:\n"
+        f"- Readings: {features['count']} ({features['unit'] or 'unitless'})\n"
+        f"- Latest: {features['latest']:.2f}, Mean: {features['mean']:.2f}\n"
+        f"- Slope per reading: {features['slope']:+.3f}\n"
+        f"- Variance: {features['variance']:.3f}\n"
+        f"- Change first->latest: {features['percent_change']:+.1f}%\n"
+        f"- Out-of-range readings: {features['out_of_range']}\n"
+    )
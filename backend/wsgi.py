@@ -0,0 +1,19 @@
+import time
+
+_started = time.perf_counter()
+
+from app import create_app
+from app.warmup import WARMUP_ENABLED, record_phase, warm_shared
+
+# Production entry point: `gunicorn -c gunicorn.conf.py wsgi:app`.
+# With preload_app this module runs once in the master, so the imports and
+# shared warmup below are inherited copy-on-write by every worker.
+
+record_phase('import', time.perf_counter() - _started)
+
+_created = time.perf_counter()
+app = create_app()
+record_phase('create_app', time.perf_counter() - _created)
+
+if WARMUP_ENABLED:
+    warm_shared()
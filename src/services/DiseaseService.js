@@ -47,6 +47,28 @@ export const DiseaseService = {
         }
     },
 
+    /**
+     * Fetch insights for several conditions in a single request.
+     * @param {Array<{disease: object, metrics: Array}>} items
+     * @returns {Promise<Array>} - Per-item results in input order ({ success, insight } or { success, error })
+     */
+    async getDiseaseInsights(items) {
+        try {
+            const response = await fetch(`${API_BASE_URL}/api/disease-insight/batch`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ items })
+            });
+
+            if (!response.ok) throw new Error("Failed to get AI insights");
+            const data = await response.json();
+            return data.results;
+        } catch (error) {
+            console.error("AI Insight Batch Error:", error);
+            return items.map((_, index) => ({ index, success: false, error: error.message }));
+        }
+    },
+
     /**
      * Initialize a new disease or return existing one if name matches (De-duplication).
      * @param {string} userId - Auth UID